@@ -0,0 +1,132 @@
+"""Проверка и бенчмарк записи сумм прописью
+
+Сверяет таблицы с прежней реализацией там, где она была верна (до миллиарда,
+без женского рода тысяч), проверяет миллиарды и округление копеек,
+затем замеряет форматирование сумм с кэшем и без него.
+Запуск: python benchmarks/bench_amount_words.py
+"""
+import random
+import time
+
+import synthetic  # noqa: F401 - добавляет корень проекта в sys.path
+from src.utils.amount_words import amount_to_words, number_to_words
+
+PROPERTY_SAMPLES = 200_000
+AMOUNTS = 200_000
+DISTINCT_AMOUNTS = 5_000
+
+
+def reference_number_to_words(n):
+    """Прежняя реализация: списки строятся заново при каждом вызове"""
+    if n == 0:
+        return "ноль"
+
+    ones = ["", "один", "два", "три", "четыре", "пять", "шесть", "семь", "восемь", "девять",
+            "десять", "одиннадцать", "двенадцать", "тринадцать", "четырнадцать", "пятнадцать",
+            "шестнадцать", "семнадцать", "восемнадцать", "девятнадцать"]
+    tens = ["", "", "двадцать", "тридцать", "сорок", "пятьдесят", "шестьдесят", "семьдесят", "восемьдесят", "девяносто"]
+    hundreds = ["", "сто", "двести", "триста", "четыреста", "пятьсот", "шестьсот", "семьсот", "восемьсот", "девятьсот"]
+
+    def convert_hundreds(num):
+        result = []
+        if num >= 100:
+            result.append(hundreds[num // 100])
+            num %= 100
+        if num >= 20:
+            result.append(tens[num // 10])
+            num %= 10
+        if num > 0:
+            result.append(ones[num])
+        return " ".join(result)
+
+    def with_group(part, forms):
+        if part % 10 == 1 and part % 100 != 11:
+            return f"{convert_hundreds(part)} {forms[0]}"
+        if part % 10 in [2, 3, 4] and part % 100 not in [12, 13, 14]:
+            return f"{convert_hundreds(part)} {forms[1]}"
+        return f"{convert_hundreds(part)} {forms[2]}"
+
+    parts = []
+    millions, rest = divmod(n, 1_000_000)
+    thousands, units = divmod(rest, 1000)
+    if millions:
+        parts.append(with_group(millions, ("миллион", "миллиона", "миллионов")))
+    if thousands:
+        parts.append(with_group(thousands, ("тысяча", "тысячи", "тысяч")))
+    if units:
+        parts.append(convert_hundreds(units))
+    return " ".join(parts)
+
+
+def reference_amount_to_words(amount):
+    rubles = int(amount)
+    kopecks = int(round((amount - rubles) * 100))
+    forms = {0: "рубль", 1: "рубля", 2: "рублей"}
+    kopeck_forms = {0: "копейка", 1: "копейки", 2: "копеек"}
+
+    def index(n):
+        if n % 10 == 1 and n % 100 != 11:
+            return 0
+        if n % 10 in [2, 3, 4] and n % 100 not in [12, 13, 14]:
+            return 1
+        return 2
+
+    return f"{reference_number_to_words(rubles)} {forms[index(rubles)]} {kopecks:02d} {kopeck_forms[index(kopecks)]}"
+
+
+def check_properties():
+    rng = random.Random(42)
+    numbers = list(range(2000)) + [rng.randrange(1_000_000_000) for _ in range(PROPERTY_SAMPLES)]
+    checked = 0
+    for n in numbers:
+        thousands = n // 1000 % 1000
+        # Прежняя версия писала «один тысяча», «два тысячи» - эти случаи сверяем отдельно
+        if thousands % 10 in (1, 2) and thousands % 100 not in (11, 12):
+            continue
+        assert number_to_words(n) == reference_number_to_words(n), (n, number_to_words(n))
+        checked += 1
+
+    assert number_to_words(1000) == "одна тысяча"
+    assert number_to_words(22_000) == "двадцать две тысячи"
+    assert number_to_words(1_001_000) == "один миллион одна тысяча"
+    assert number_to_words(2_000_000_001) == "два миллиарда один"
+    assert number_to_words(15_300_000_000) == "пятнадцать миллиардов триста миллионов"
+
+    assert amount_to_words(1.999) == "два рубля 00 копеек"
+    assert amount_to_words(21.01) == "двадцать один рубль 01 копейка"
+    assert amount_to_words(1_234_567_890.12).startswith("один миллиард двести тридцать четыре миллиона")
+    for _ in range(10_000):
+        amount = round(rng.uniform(0, 999_999), 2)
+        assert amount_to_words(amount).split()[-2] == f"{amount:.2f}"[-2:], amount
+
+    print(f"Свойства проверены: {checked} чисел совпали с прежней реализацией")
+
+
+def bench():
+    rng = random.Random(0)
+    distinct = [round(rng.uniform(100, 50_000_000), 2) for _ in range(DISTINCT_AMOUNTS)]
+    amounts = [rng.choice(distinct) for _ in range(AMOUNTS)]
+
+    start = time.perf_counter()
+    for amount in amounts:
+        reference_amount_to_words(amount)
+    print(f"прежняя реализация, {AMOUNTS} сумм: {time.perf_counter() - start:.3f} с")
+
+    number_to_words.cache_clear()
+    amount_to_words.cache_clear()
+    start = time.perf_counter()
+    for amount in amounts:
+        amount_to_words.__wrapped__(amount)
+    print(f"таблицы без кэша сумм, {AMOUNTS} сумм: {time.perf_counter() - start:.3f} с")
+
+    number_to_words.cache_clear()
+    amount_to_words.cache_clear()
+    start = time.perf_counter()
+    for amount in amounts:
+        amount_to_words(amount)
+    print(f"таблицы с кэшем, {AMOUNTS} сумм ({DISTINCT_AMOUNTS} различных): {time.perf_counter() - start:.3f} с")
+
+
+if __name__ == '__main__':
+    check_properties()
+    bench()
@@ -0,0 +1,62 @@
+"""Бенчмарк расчета пени в замкнутой форме на миллионе позиций
+
+Сверка с прежним подневным циклом - в tests/test_penalty.py.
+Запуск: python benchmarks/bench_penalty.py
+"""
+import time
+
+import numpy as np
+
+import synthetic  # noqa: F401 - добавляет корень проекта в sys.path
+from src.utils.penalty import calculate_penalties, calculate_penalties_exact
+
+POSITIONS = 1_000_000
+
+
+def reference_penalty(amount, days_overdue):
+    """Прежний расчет: цикл по каждому дню просрочки"""
+    if days_overdue <= 0:
+        return 0
+
+    penalty = 0
+    remaining_days = days_overdue
+    current_amount = float(amount)
+
+    days_first_period = min(remaining_days, 14)
+    for day in range(days_first_period):
+        daily_penalty = current_amount * 0.001
+        penalty += daily_penalty
+        current_amount += daily_penalty
+    remaining_days -= days_first_period
+
+    for day in range(remaining_days):
+        daily_penalty = current_amount * 0.005
+        penalty += daily_penalty
+        current_amount += daily_penalty
+
+    return penalty
+
+
+def bench():
+    rng = np.random.default_rng(0)
+    amounts = np.round(rng.uniform(100, 1_000_000, POSITIONS), 2)
+    days = rng.integers(0, 1500, POSITIONS)
+
+    start = time.perf_counter()
+    calculate_penalties(amounts, days)
+    print(f"float, {POSITIONS} позиций: {time.perf_counter() - start:.3f} с")
+
+    start = time.perf_counter()
+    calculate_penalties_exact(amounts.tolist(), days.tolist())
+    print(f"Decimal, {POSITIONS} позиций: {time.perf_counter() - start:.3f} с")
+
+    sample = 20_000
+    start = time.perf_counter()
+    for amount, day in zip(amounts[:sample].tolist(), days[:sample].tolist()):
+        reference_penalty(amount, day)
+    elapsed = time.perf_counter() - start
+    print(f"цикл по дням, оценка на {POSITIONS} позиций: {elapsed * POSITIONS / sample:.1f} с")
+
+
+if __name__ == '__main__':
+    bench()
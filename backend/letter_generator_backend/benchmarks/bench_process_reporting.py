@@ -0,0 +1,29 @@
+"""Бенчмарк колоночной обработки отчетности (process_reporting_frames)
+
+Запуск: python benchmarks/bench_process_reporting.py
+"""
+import time
+from datetime import datetime
+
+from synthetic import make_orders, make_reporting_frame, make_sed_frame
+from src.utils.letter_generator_utils import process_reporting_frames
+
+SIZES = [10000, 50000, 100000, 200000]
+POSITIONS_PER_ORDER = 5
+
+
+def main():
+    print(f"{'строк':>8} {'писем':>7} {'время, с':>9} {'строк/с':>10}")
+    for size in SIZES:
+        orders = make_orders(size // POSITIONS_PER_ORDER)
+        reporting_df = make_reporting_frame(orders, positions_per_order=POSITIONS_PER_ORDER)
+        sed_df = make_sed_frame(orders)
+
+        start = time.perf_counter()
+        letters = process_reporting_frames(reporting_df, sed_df, datetime(2025, 9, 1))
+        elapsed = time.perf_counter() - start
+        print(f"{size:>8} {len(letters):>7} {elapsed:>9.2f} {size / elapsed:>10.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,37 @@
+"""Бенчмарк генерации писем и приложений в пуле процессов
+
+Запуск: python benchmarks/bench_rendering.py [количество писем]
+"""
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from synthetic import make_orders, make_reporting_frame, make_sed_frame
+from src.utils.letter_generator_utils import process_reporting_frames
+from src.utils.rendering import render_letters
+
+
+def main():
+    letters_count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    orders = make_orders(letters_count * 2)
+    letters_data = process_reporting_frames(
+        make_reporting_frame(orders, overdue_ratio=0.9), make_sed_frame(orders), datetime(2025, 9, 1)
+    )[:letters_count]
+
+    worker_counts = sorted({1, 2, 4, os.cpu_count() or 1})
+    baseline = None
+    print(f"{'процессов':>10} {'время, с':>9} {'писем/с':>8} {'ускорение':>10}")
+    for workers in worker_counts:
+        with tempfile.TemporaryDirectory() as output_folder:
+            start = time.perf_counter()
+            generated_files, errors = render_letters(letters_data, output_folder, workers=workers)
+            elapsed = time.perf_counter() - start
+        assert not errors, errors[:3]
+        baseline = baseline or elapsed
+        print(f"{workers:>10} {elapsed:>9.2f} {len(letters_data) / elapsed:>8.1f} {baseline / elapsed:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
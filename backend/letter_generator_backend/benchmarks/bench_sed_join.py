@@ -0,0 +1,46 @@
+"""Бенчмарк поиска записей СЭД: полный просмотр таблицы против хеш-индекса
+
+Запуск: python benchmarks/bench_sed_join.py
+"""
+import time
+
+from synthetic import make_orders, make_sed_frame
+from src.utils.sed_index import SedIndex
+
+SIZES = [1000, 2000, 4000, 8000, 16000]
+# Полный просмотр квадратичен, поэтому ограничиваем его размер
+SCAN_LIMIT = 4000
+
+
+def bench_scan(sed_df, lookups):
+    start = time.perf_counter()
+    for order_number in lookups:
+        sed_row = sed_df[sed_df.iloc[:, 5] == order_number]
+        if not sed_row.empty:
+            sed_row.iloc[0, 2]
+    return time.perf_counter() - start
+
+
+def bench_index(sed_df, lookups):
+    start = time.perf_counter()
+    sed_index = SedIndex(sed_df)
+    for order_number in lookups:
+        sed_index.get(order_number)
+    return time.perf_counter() - start
+
+
+def main():
+    print(f"{'строк':>8} {'просмотр, с':>12} {'индекс, с':>10} {'мкс/строка':>11}")
+    for size in SIZES:
+        orders = make_orders(size)
+        sed_df = make_sed_frame(orders)
+        # Каждая строка отчетности ищет заказ; четыре строки на заказ
+        lookups = orders * 4
+
+        scan_time = bench_scan(sed_df, lookups) if size <= SCAN_LIMIT else float('nan')
+        index_time = bench_index(sed_df, lookups)
+        print(f"{size:>8} {scan_time:>12.3f} {index_time:>10.4f} {index_time / len(lookups) * 1e6:>11.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,294 @@
+"""Воспроизводимый набор бенчмарков на синтетических выгрузках робота и СЭД
+
+Генерирует .xlsb отчетности и .xlsx СЭД заданного масштаба, замеряет основные этапы
+и сквозной сценарий API (загрузка → обработка → /download_all) и сохраняет результат в JSON,
+который можно сравнить с результатом другого коммита.
+
+Запуск:
+    python benchmarks/run_benchmarks.py --orders 2000 --positions 5 --output before.json
+    python benchmarks/run_benchmarks.py --orders 2000 --positions 5 --output after.json --compare before.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+
+from synthetic import make_dataset
+
+AS_OF_DATE = datetime(2025, 9, 1)
+JOB_POLL_INTERVAL = 0.05
+# Изменения быстрее или медленнее порога выделяются при сравнении
+COMPARE_THRESHOLD = 0.10
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Бенчмарки генерации писем на синтетических данных')
+    parser.add_argument('--orders', type=int, default=1000, help='количество заказов')
+    parser.add_argument('--positions', type=int, default=5, help='позиций в заказе')
+    parser.add_argument('--overdue-ratio', type=float, default=0.5, help='доля просроченных позиций')
+    parser.add_argument('--suppliers', type=int, default=100, help='количество поставщиков')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--letters', type=int, default=100, help='писем для замера генерации документов')
+    parser.add_argument('--repeat', type=int, default=3, help='повторов каждого замера (берется лучший)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='процессов генерации в API')
+    parser.add_argument('--consolidate', action='store_true', help='сводные письма по поставщикам')
+    parser.add_argument('--skip-api', action='store_true', help='не замерять сквозной сценарий API')
+    parser.add_argument('--keep-data', help='папка для сгенерированных файлов (иначе временная)')
+    parser.add_argument('--output', help='файл для результата в JSON')
+    parser.add_argument('--compare', help='JSON предыдущего запуска для сравнения')
+    return parser.parse_args()
+
+
+def git_revision():
+    """Коммит и признак незакоммиченных изменений рабочего дерева"""
+    root = os.path.dirname(os.path.abspath(__file__))
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=root, capture_output=True, text=True, check=True)
+        status = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'],
+                                cwd=root, capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return commit.stdout.strip(), bool(status.stdout.strip())
+
+
+def measure(function, repeat, items=None):
+    """Лучшее время из repeat запусков; items - число обработанных элементов за запуск"""
+    runs = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        runs.append(time.perf_counter() - start)
+    seconds = min(runs)
+    entry = {'seconds': round(seconds, 6), 'runs': [round(run, 6) for run in runs]}
+    if items is not None:
+        entry['items'] = items
+        entry['items_per_second'] = round(items / seconds, 2) if seconds else None
+    return entry, result
+
+
+def bench_pipeline(reporting_path, sed_path, args, results):
+    from src.utils.letter_generator_utils import process_reporting_data
+
+    stats = {}
+
+    def run():
+        stats.clear()
+        return process_reporting_data(
+            reporting_path, sed_path, stats=stats, current_date=AS_OF_DATE, consolidate=args.consolidate
+        )
+
+    results['process_reporting_data'], letters_data = measure(run, args.repeat, args.orders * args.positions)
+    results['process_reporting_data']['stage_seconds'] = stats.get('stage_seconds')
+    return letters_data
+
+
+def bench_penalty(letters_data, args, results):
+    from src.utils.letter_generator_utils import calculate_penalty
+    from src.utils.penalty import calculate_penalties
+
+    positions = [position for letter in letters_data for position in letter['positions']]
+    amounts = np.array([position['amount'] for position in positions], dtype=float)
+    days = np.array([position['days_overdue'] for position in positions], dtype=np.int64)
+
+    results['calculate_penalty'], _ = measure(
+        lambda: [calculate_penalty(amount, day) for amount, day in zip(amounts.tolist(), days.tolist())],
+        args.repeat, len(positions)
+    )
+    results['calculate_penalties'], _ = measure(lambda: calculate_penalties(amounts, days), args.repeat, len(positions))
+
+
+def bench_documents(letters_data, args, results, folder):
+    from src.utils.letter_generator_utils import generate_appendix_document, generate_letter_document
+
+    sample = letters_data[:args.letters]
+    results['generate_letter_document'], _ = measure(
+        lambda: [generate_letter_document(letter, os.path.join(folder, f"letter_{i}.docx"), AS_OF_DATE)
+                 for i, letter in enumerate(sample)],
+        args.repeat, len(sample)
+    )
+    results['generate_appendix_document'], _ = measure(
+        lambda: [generate_appendix_document(letter, os.path.join(folder, f"appendix_{i}.docx"))
+                 for i, letter in enumerate(sample)],
+        args.repeat, len(sample)
+    )
+
+
+def create_app(folder):
+    """Приложение с блюпринтом писем, отдельной БД и рабочими папками во временной папке"""
+    os.environ['WORKSPACES_FOLDER'] = os.path.join(folder, 'workspaces')
+    os.environ['PARSE_CACHE_FOLDER'] = os.path.join(folder, 'parse_cache')
+
+    from flask import Flask
+    from src.models.user import db
+    from src.routes.letter_generator import letter_bp
+
+    app = Flask(__name__)
+    app.config['SECRET_KEY'] = 'benchmark'
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(folder, 'benchmark.db')}"
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.register_blueprint(letter_bp, url_prefix='/api/letters')
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+def run_api_scenario(client, reporting_path, sed_path, consolidate=False):
+    """Загрузка, обработка и скачивание архива; возвращает время этапов и ответ задачи"""
+    timings = {}
+    start = time.perf_counter()
+    with open(reporting_path, 'rb') as reporting, open(sed_path, 'rb') as sed:
+        response = client.post('/api/letters/upload', data={
+            'reporting_file': (reporting, os.path.basename(reporting_path)),
+            'sed_file': (sed, os.path.basename(sed_path)),
+        }, content_type='multipart/form-data')
+    assert response.status_code == 200, response.get_json()
+    timings['upload'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    response = client.post('/api/letters/process', json={'consolidate': consolidate})
+    assert response.status_code == 202, response.get_json()
+    job_id = response.get_json()['job_id']
+    while True:
+        job = client.get(f'/api/letters/jobs/{job_id}').get_json()
+        if job['status'] in ('done', 'failed'):
+            break
+        time.sleep(JOB_POLL_INTERVAL)
+    assert job['status'] == 'done', job.get('error')
+    timings['process'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    response = client.get('/api/letters/download_all')
+    size = sum(len(chunk) for chunk in response.response)
+    assert response.status_code == 200
+    timings['download_all'] = time.perf_counter() - start
+    timings['total'] = sum(timings.values())
+    return timings, job, size
+
+
+def bench_api(reporting_path, sed_path, args, results, folder):
+    os.makedirs(folder, exist_ok=True)
+    os.environ['LETTER_RENDER_WORKERS'] = str(args.workers)
+    app = create_app(folder)
+    import src.routes.letter_generator as routes
+    from src.utils.parse_cache import ParseCache
+
+    runs = []
+    job = size = None
+    for i in range(args.repeat):
+        # Каждый повтор - новая сессия и пустой кэш разбора, как при первой обработке файлов
+        routes.parse_cache = ParseCache(os.path.join(folder, f'parse_cache_{i}'), routes.PARSE_CACHE_MAX_BYTES)
+        client = app.test_client()
+        timings, job, size = run_api_scenario(client, reporting_path, sed_path, args.consolidate)
+        runs.append(timings)
+
+    best = min(runs, key=lambda timings: timings['total'])
+    letters_count = job['result']['letters_count']
+    results['end_to_end'] = {
+        'seconds': round(best['total'], 6),
+        'runs': [round(timings['total'], 6) for timings in runs],
+        'items': letters_count,
+        'items_per_second': round(letters_count / best['total'], 2),
+        'stage_seconds': {name: round(value, 6) for name, value in best.items() if name != 'total'},
+        'archive_bytes': size,
+        'workers': args.workers,
+    }
+
+    # Повторная обработка тех же файлов той же сессией: кэш разбора и переиспользование писем
+    timings, job, _ = run_api_scenario(client, reporting_path, sed_path, args.consolidate)
+    results['end_to_end_reprocess'] = {
+        'seconds': round(timings['total'], 6),
+        'items': letters_count,
+        'letters_reused': job['result'].get('letters_reused'),
+        'stage_seconds': {name: round(value, 6) for name, value in timings.items() if name != 'total'},
+    }
+
+
+def compare(previous, current):
+    """Таблица изменения времени этапов относительно предыдущего запуска"""
+    if previous['params'] != current['params']:
+        print("Внимание: параметры запусков различаются, сравнение может быть некорректным")
+    print(f"{'этап':<28} {'было, с':>10} {'стало, с':>10} {'изменение':>10}")
+    for name, entry in current['results'].items():
+        before = previous['results'].get(name)
+        if before is None:
+            print(f"{name:<28} {'-':>10} {entry['seconds']:>10.4f} {'-':>10}")
+            continue
+        change = entry['seconds'] / before['seconds'] - 1 if before['seconds'] else 0.0
+        mark = ''
+        if change <= -COMPARE_THRESHOLD:
+            mark = ' быстрее'
+        elif change >= COMPARE_THRESHOLD:
+            mark = ' медленнее'
+        print(f"{name:<28} {before['seconds']:>10.4f} {entry['seconds']:>10.4f} {change:>+10.1%}{mark}")
+
+
+def main():
+    args = parse_args()
+    commit, dirty = git_revision()
+    params = {
+        'orders': args.orders,
+        'positions': args.positions,
+        'overdue_ratio': args.overdue_ratio,
+        'suppliers': args.suppliers,
+        'seed': args.seed,
+        'letters': args.letters,
+        'consolidate': args.consolidate,
+        'as_of_date': AS_OF_DATE.date().isoformat(),
+    }
+    results = {}
+
+    with tempfile.TemporaryDirectory() as folder:
+        data_folder = args.keep_data or folder
+        os.makedirs(data_folder, exist_ok=True)
+        start = time.perf_counter()
+        reporting_path, sed_path = make_dataset(
+            data_folder, args.orders, args.positions, args.overdue_ratio, args.suppliers, args.seed
+        )
+        print(f"Данные: {args.orders} заказов × {args.positions} позиций за {time.perf_counter() - start:.1f} с "
+              f"({os.path.getsize(reporting_path) / 1024 ** 2:.1f} МБ xlsb)")
+
+        letters_data = bench_pipeline(reporting_path, sed_path, args, results)
+        params['letters_total'] = len(letters_data)
+        bench_penalty(letters_data, args, results)
+        documents_folder = os.path.join(folder, 'documents')
+        os.makedirs(documents_folder)
+        bench_documents(letters_data, args, results, documents_folder)
+        if not args.skip_api:
+            bench_api(reporting_path, sed_path, args, results, os.path.join(folder, 'api'))
+
+    report = {
+        'commit': commit,
+        'dirty': dirty,
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+        },
+        'params': params,
+        'results': results,
+    }
+
+    for name, entry in results.items():
+        rate = f" ({entry['items_per_second']:.1f}/с)" if entry.get('items_per_second') else ''
+        print(f"{name:<28} {entry['seconds']:>10.4f} с{rate}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            compare(json.load(f), report)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
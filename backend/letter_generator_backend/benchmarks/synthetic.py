@@ -0,0 +1,81 @@
+"""Синтетические таблицы отчетности и СЭД для бенчмарков"""
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+REPORTING_COLUMNS = 25
+SED_COLUMNS = 16
+
+
+def make_sed_frame(orders, seed=0):
+    """Таблица СЭД: по одной строке на номер заказа"""
+    rng = np.random.default_rng(seed)
+    n = len(orders)
+    data = {i: np.full(n, None, dtype=object) for i in range(SED_COLUMNS)}
+    data[2] = np.array([f"БЕ {i % 7}" for i in range(n)], dtype=object)
+    data[5] = np.asarray(orders, dtype=object)
+    data[7] = np.array([f"ДП-{i:06d}" for i in range(n)], dtype=object)
+    data[15] = pd.Timestamp('2024-01-01') + pd.to_timedelta(rng.integers(0, 365, n), unit='D')
+    return pd.DataFrame(data)
+
+
+def make_reporting_frame(orders, positions_per_order=5, overdue_ratio=0.5, suppliers=100, seed=0):
+    """Таблица отчетности в разрезе колонок выгрузки робота"""
+    rng = np.random.default_rng(seed)
+    n = len(orders) * positions_per_order
+    order_numbers = np.repeat(np.asarray(orders, dtype=object), positions_per_order)
+    supplier_ids = np.repeat(rng.integers(0, suppliers, len(orders)), positions_per_order)
+
+    planned = pd.Timestamp('2025-01-01') + pd.to_timedelta(rng.integers(0, 200, n), unit='D')
+    delay = rng.integers(1, 120, n)
+    overdue = rng.random(n) < overdue_ratio
+    delivered = rng.random(n) < 0.5
+    actual = planned + pd.to_timedelta(np.where(overdue, delay, -1), unit='D')
+    actual = actual.where(delivered | ~overdue)
+
+    data = {i: np.full(n, None, dtype=object) for i in range(REPORTING_COLUMNS)}
+    data[5] = order_numbers
+    data[9] = np.array([f"M{i:08d}" for i in range(n)], dtype=object)
+    data[10] = np.array([f"Материал {i % 1000}" for i in range(n)], dtype=object)
+    data[11] = np.array([f"ППЗ-{i % 50}" for i in range(n)], dtype=object)
+    data[13] = rng.integers(1, 100, n)
+    data[15] = np.round(rng.uniform(100, 100000, n), 2)
+    data[16] = np.array([f"{7700000000 + s} ООО \"Поставщик {s}\"" for s in supplier_ids], dtype=object)
+    data[19] = planned
+    data[24] = actual
+    return pd.DataFrame(data)
+
+
+def make_orders(count):
+    return [f"45{i:08d}" for i in range(count)]
+
+
+def write_reporting_file(df, path, row_numbers=None):
+    """Выгрузка робота в .xlsb: даты - серийными номерами Excel, как в настоящей выгрузке
+
+    row_numbers - номера строк листа (с 0) для строк таблицы, см. write_xlsb.
+    """
+    from xlsb_writer import write_xlsb
+    write_xlsb(df, path, row_numbers=row_numbers)
+
+
+def write_sed_file(df, path):
+    """Выгрузка СЭД в .xlsx с заголовком в первой строке"""
+    df.to_excel(path, index=False, header=[f"Колонка {i + 1}" for i in range(len(df.columns))])
+
+
+def make_dataset(folder, orders=1000, positions_per_order=5, overdue_ratio=0.5, suppliers=100, seed=0):
+    """Пара файлов отчетности и СЭД заданного масштаба; возвращает пути (отчетность, СЭД)"""
+    # В выгрузках номер заказа - число
+    order_numbers = [int(order) for order in make_orders(orders)]
+    reporting_path = os.path.join(folder, 'reporting.xlsb')
+    sed_path = os.path.join(folder, 'sed.xlsx')
+    write_reporting_file(
+        make_reporting_frame(order_numbers, positions_per_order, overdue_ratio, suppliers, seed), reporting_path
+    )
+    write_sed_file(make_sed_frame(order_numbers, seed), sed_path)
+    return reporting_path, sed_path
@@ -0,0 +1,158 @@
+"""Минимальная запись таблицы в формате .xlsb (BIFF12) для синтетических выгрузок робота
+
+Пишется один лист с таблицей общих строк: строки - BrtCellIsst, числа и даты - BrtCellReal
+(даты - серийными номерами Excel, как в выгрузке). Файл читается pyxlsb так же,
+как настоящая выгрузка; стили и прочие части книги не создаются.
+"""
+import math
+import struct
+import zipfile
+
+import numpy as np
+import pandas as pd
+
+EXCEL_EPOCH = pd.Timestamp('1899-12-30')
+
+# Номера записей BIFF12 (MS-XLSB)
+BRT_ROW_HDR = 0x0000
+BRT_CELL_REAL = 0x0005
+BRT_CELL_ISST = 0x0007
+BRT_SST_ITEM = 0x0013
+BRT_BEGIN_SHEET = 0x0181
+BRT_END_SHEET = 0x0182
+BRT_BEGIN_BOOK = 0x0183
+BRT_END_BOOK = 0x0184
+BRT_BEGIN_BUNDLE_SHS = 0x018F
+BRT_END_BUNDLE_SHS = 0x0190
+BRT_BEGIN_SHEET_DATA = 0x0191
+BRT_END_SHEET_DATA = 0x0192
+BRT_WS_DIM = 0x0194
+BRT_BUNDLE_SH = 0x019C
+BRT_BEGIN_SST = 0x019F
+BRT_END_SST = 0x01A0
+
+_CELL_REAL = struct.Struct('<IId')
+_CELL_ISST = struct.Struct('<III')
+_ROW_HDR = struct.Struct('<IIHHBI')
+
+CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="bin" ContentType="application/vnd.ms-excel.sheet.binary.macroEnabled.main"/>'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Override PartName="/xl/workbook.bin" ContentType="application/vnd.ms-excel.sheet.binary.macroEnabled.main"/>'
+    '<Override PartName="/xl/worksheets/sheet1.bin" ContentType="application/vnd.ms-excel.worksheet"/>'
+    '<Override PartName="/xl/sharedStrings.bin" ContentType="application/vnd.ms-excel.sharedStrings"/>'
+    '</Types>'
+)
+ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.bin"/>'
+    '</Relationships>'
+)
+WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.bin"/>'
+    '<Relationship Id="rId2" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/sharedStrings" Target="sharedStrings.bin"/>'
+    '</Relationships>'
+)
+
+
+def _record(record_type, payload=b''):
+    """Запись BIFF12: тип и длина кодируются по 7 бит с флагом продолжения"""
+    header = bytearray([record_type & 0xFF]) if record_type < 0x80 else bytearray([record_type & 0xFF, record_type >> 8])
+    size = len(payload)
+    while True:
+        byte = size & 0x7F
+        size >>= 7
+        header.append(byte | 0x80 if size else byte)
+        if not size:
+            break
+    return bytes(header) + payload
+
+
+def _wide_string(text):
+    encoded = text.encode('utf-16-le')
+    return struct.pack('<I', len(encoded) // 2) + encoded
+
+
+def _column_cells(values, strings):
+    """Значения колонки для записи: ('s', индекс строки), ('r', число) или None"""
+    series = pd.Series(values)
+    if pd.api.types.is_datetime64_any_dtype(series):
+        serials = (series - EXCEL_EPOCH) / pd.Timedelta(days=1)
+        return [None if math.isnan(value) else ('r', value) for value in serials.tolist()]
+    if pd.api.types.is_numeric_dtype(series):
+        return [None if value is None or (isinstance(value, float) and math.isnan(value)) else ('r', float(value))
+                for value in series.tolist()]
+
+    cells = []
+    for value in series.tolist():
+        if value is None or (isinstance(value, float) and math.isnan(value)) or value is pd.NaT:
+            cells.append(None)
+        elif isinstance(value, pd.Timestamp):
+            cells.append(('r', (value - EXCEL_EPOCH) / pd.Timedelta(days=1)))
+        elif isinstance(value, (int, float, np.integer, np.floating)) and not isinstance(value, bool):
+            cells.append(('r', float(value)))
+        else:
+            cells.append(('s', strings.setdefault(str(value), len(strings))))
+    return cells
+
+
+def _row_records(row, cells):
+    parts = [_record(BRT_ROW_HDR, _ROW_HDR.pack(row, 0, 300, 0, 0, 0))]
+    for col, cell in enumerate(cells):
+        if cell is None:
+            continue
+        kind, value = cell
+        if kind == 's':
+            parts.append(_record(BRT_CELL_ISST, _CELL_ISST.pack(col, 0, value)))
+        else:
+            parts.append(_record(BRT_CELL_REAL, _CELL_REAL.pack(col, 0, value)))
+    return b''.join(parts)
+
+
+def write_xlsb(df, path, header=None, row_numbers=None):
+    """Записывает таблицу на первый лист .xlsb; первая строка - заголовок
+
+    row_numbers - номера строк листа (с 0) для строк таблицы; пропуски между ними
+    дают пустые строки, как в выгрузках с пустыми строками между данными.
+    """
+    if row_numbers is None:
+        row_numbers = range(1, len(df) + 1)
+    header = header or [f"Колонка {i + 1}" for i in range(len(df.columns))]
+    strings = {}
+    header_cells = [('s', strings.setdefault(title, len(strings))) for title in header]
+    columns = [_column_cells(df[label].to_numpy(), strings) for label in df.columns]
+
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as package:
+        package.writestr('[Content_Types].xml', CONTENT_TYPES)
+        package.writestr('_rels/.rels', ROOT_RELS)
+        package.writestr('xl/_rels/workbook.bin.rels', WORKBOOK_RELS)
+        package.writestr('xl/workbook.bin', b''.join([
+            _record(BRT_BEGIN_BOOK),
+            _record(BRT_BEGIN_BUNDLE_SHS),
+            _record(BRT_BUNDLE_SH, struct.pack('<II', 0, 1) + _wide_string('rId1') + _wide_string('Лист1')),
+            _record(BRT_END_BUNDLE_SHS),
+            _record(BRT_END_BOOK),
+        ]))
+
+        with package.open('xl/worksheets/sheet1.bin', 'w', force_zip64=True) as sheet:
+            sheet.write(_record(BRT_BEGIN_SHEET))
+            last_row = max(row_numbers, default=0)
+            sheet.write(_record(BRT_WS_DIM, struct.pack('<IIII', 0, last_row, 0, len(df.columns) - 1)))
+            sheet.write(_record(BRT_BEGIN_SHEET_DATA))
+            sheet.write(_row_records(0, header_cells))
+            for row, cells in zip(row_numbers, zip(*columns)):
+                sheet.write(_row_records(row, cells))
+            sheet.write(_record(BRT_END_SHEET_DATA))
+            sheet.write(_record(BRT_END_SHEET))
+
+        ordered = sorted(strings, key=strings.get)
+        package.writestr('xl/sharedStrings.bin', b''.join(
+            [_record(BRT_BEGIN_SST, struct.pack('<II', len(ordered), len(ordered)))]
+            + [_record(BRT_SST_ITEM, b'\x00' + _wide_string(text)) for text in ordered]
+            + [_record(BRT_END_SST)]
+        ))
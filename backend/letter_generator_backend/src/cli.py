@@ -0,0 +1,210 @@
+"""Пакетная генерация писем без веб-сервера
+
+Запуск из папки backend/letter_generator_backend:
+    python -m src.cli reporting.xlsb sed.xlsx --output letters/ --workers 8
+    python -m src.cli reporting.xlsb sed.xlsx --output letters.zip --as-of-date 2025-09-01
+    python -m src.cli reporting.xlsb sed.xlsx --output letters.zip --consolidate
+    python -m src.cli reporting.xlsb sed.xlsx --output letters/ --rejections rejections.xlsx
+
+Код возврата: 0 - все письма сгенерированы, 1 - ошибка обработки, 2 - часть писем не сгенерирована.
+"""
+import argparse
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+# DON'T CHANGE THIS !!!
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from src.utils.letter_generator_utils import process_reporting_data
+from src.utils.rendering import render_letters, letter_output_files
+from src.utils.letter_store import write_letter_store
+from src.utils.zip_stream import iter_zip
+from src.utils.metrics import StageClock, RssSampler
+from src.utils.rejections import RejectionReport, REJECTION_TITLES
+
+logger = logging.getLogger('src.cli')
+
+# Приложения с большим числом позиций выводятся в XLSX (0 - всегда в DOCX), как в веб-версии
+APPENDIX_XLSX_THRESHOLD = int(os.environ.get('APPENDIX_XLSX_THRESHOLD', 0))
+# Количество процессов генерации по умолчанию
+RENDER_WORKERS = int(os.environ.get('LETTER_RENDER_WORKERS', os.cpu_count() or 1))
+
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_RENDER_ERRORS = 2
+
+
+def parse_date(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d')
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Дата должна быть в формате ГГГГ-ММ-ДД: {value}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m src.cli',
+        description='Генерация претензионных писем по файлам отчетности и СЭД'
+    )
+    parser.add_argument('reporting', help='файл отчетности (.xlsb, .xlsx, .xls)')
+    parser.add_argument('sed', help='файл СЭД (.xlsx, .xls)')
+    parser.add_argument('-o', '--output', required=True,
+                        help='папка для писем или путь к .zip-архиву')
+    parser.add_argument('-w', '--workers', type=int, default=RENDER_WORKERS,
+                        help=f'количество процессов генерации (по умолчанию {RENDER_WORKERS})')
+    parser.add_argument('--as-of-date', type=parse_date, default=None,
+                        help='дата писем и расчета просрочки, ГГГГ-ММ-ДД (по умолчанию - сегодня)')
+    parser.add_argument('--xlsx-threshold', type=int, default=APPENDIX_XLSX_THRESHOLD,
+                        help='выводить перечень позиций в XLSX, если позиций больше (0 - никогда)')
+    parser.add_argument('--exact-penalty', action='store_true',
+                        help='точный расчет пени в Decimal с округлением до копеек')
+    parser.add_argument('--consolidate', action='store_true',
+                        help='сводные письма: одно на поставщика и БЕ вместо письма на каждый заказ')
+    parser.add_argument('--rejections', help='отчет об отброшенных строках с причинами (.csv или .xlsx)')
+    parser.add_argument('--stats', help='файл для показателей запуска в JSON')
+    parser.add_argument('-q', '--quiet', action='store_true', help='выводить только ошибки')
+    return parser.parse_args(argv)
+
+
+def write_zip(folder, files, zip_path):
+    """Архив из файлов писем: так же, как /download_all, но сразу в файл
+
+    Письма генерируются процессами пула в файлы, поэтому архив собирается потоком iter_zip
+    из временной папки рядом с архивом, а не из памяти.
+    """
+    tmp_path = zip_path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        for chunk in iter_zip([(filename, os.path.join(folder, filename)) for filename in files]):
+            f.write(chunk)
+    os.replace(tmp_path, zip_path)
+
+
+def run(reporting_path, sed_path, output, workers=1, as_of_date=None, xlsx_threshold=None, stats=None,
+        consolidate=False, rejections_path=None, exact_penalty=False):
+    """Обработка файлов и генерация писем в папку или .zip-архив
+
+    Возвращает результат в том же виде, что и фоновая задача веб-версии.
+    Если задан rejections_path, туда записывается отчет об отброшенных строках.
+    Папки для результата и отчета создаются до чтения файлов, чтобы ошибка пути не обнаружилась
+    только после обработки.
+    При exact_penalty=True пени считаются в Decimal с округлением до копеек.
+    """
+    if stats is None:
+        stats = {}
+    if as_of_date is None:
+        as_of_date = datetime.now()
+    to_zip = output.lower().endswith('.zip')
+    os.makedirs(os.path.dirname(os.path.abspath(output)) if to_zip else output, exist_ok=True)
+    if rejections_path:
+        os.makedirs(os.path.dirname(os.path.abspath(rejections_path)), exist_ok=True)
+
+    rejections = RejectionReport()
+    letters_data = process_reporting_data(
+        reporting_path, sed_path, stats=stats, current_date=as_of_date, consolidate=consolidate,
+        rejections=rejections, exact_penalty=exact_penalty
+    )
+    if rejections_path:
+        rejections.write(rejections_path)
+    stats['letters_total'] = len(letters_data)
+    clock = StageClock(stats)
+
+    if to_zip:
+        output_folder = tempfile.mkdtemp(prefix='letters_', dir=os.path.dirname(os.path.abspath(output)))
+    else:
+        output_folder = output
+
+    try:
+        _, render_errors = render_letters(
+            letters_data, output_folder, workers=workers, xlsx_threshold=xlsx_threshold, as_of_date=as_of_date
+        )
+        stats['render_failures'] = len(render_errors)
+        clock.lap('render')
+
+        failed = {error['letter_number'] - 1 for error in render_errors}
+        files_by_letter = {
+            i: letter_output_files(i + 1, letter_data, xlsx_threshold)
+            for i, letter_data in enumerate(letters_data)
+            if i not in failed
+        }
+        if to_zip:
+            write_zip(output_folder, [filename for files in files_by_letter.values() for filename in files], output)
+        else:
+            # Сводки и позиции писем рядом с письмами, как в рабочей папке веб-версии
+            write_letter_store(output_folder, letters_data, files_by_letter, render_errors, as_of_date=as_of_date)
+        clock.lap('store')
+    finally:
+        if to_zip:
+            shutil.rmtree(output_folder, ignore_errors=True)
+
+    return {
+        'message': f'Обработано и сгенерировано {len(letters_data)} писем',
+        'letters_count': len(letters_data),
+        'files_count': sum(len(files) for files in files_by_letter.values()),
+        'consolidated': consolidate,
+        'exact_penalty': exact_penalty,
+        'rows_rejected': stats.get('rows_rejected', {}),
+        'render_errors': render_errors
+    }
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(
+        level=logging.ERROR if args.quiet else logging.INFO,
+        format='%(asctime)s %(levelname)s %(name)s: %(message)s'
+    )
+
+    for path in (args.reporting, args.sed):
+        if not os.path.isfile(path):
+            logger.error("Файл не найден: %s", path)
+            return EXIT_FAILED
+    if args.rejections and os.path.isdir(args.rejections):
+        logger.error("Для отчета об отброшенных строках указана папка, а не файл: %s", args.rejections)
+        return EXIT_FAILED
+
+    stats = {}
+    started = time.perf_counter()
+    rss_sampler = RssSampler().start()
+    try:
+        result = run(
+            args.reporting, args.sed, args.output, workers=max(1, args.workers), as_of_date=args.as_of_date,
+            xlsx_threshold=args.xlsx_threshold, stats=stats, consolidate=args.consolidate,
+            rejections_path=args.rejections, exact_penalty=args.exact_penalty
+        )
+    except Exception as e:
+        logger.error("%s", e)
+        return EXIT_FAILED
+    finally:
+        peak_rss = rss_sampler.stop()
+    total_seconds = time.perf_counter() - started
+
+    for error in result['render_errors']:
+        logger.error("Письмо %s (заказ %s, %s): %s", error['letter_number'], error['order_number'],
+                     error['contractor_name'], error['error'])
+    logger.info("%s за %.1f с, файлов: %d, ошибок: %d -> %s", result['message'], total_seconds,
+                result['files_count'], len(result['render_errors']), args.output)
+    rejected = {reason: count for reason, count in result['rows_rejected'].items() if count}
+    if rejected:
+        logger.warning("Отброшено строк: %s", ', '.join(f"{REJECTION_TITLES[reason]} - {count}" for reason, count in rejected.items()))
+    logger.info("Этапы: %s", ', '.join(f"{name} {seconds:.2f} с" for name, seconds in stats.get('stage_seconds', {}).items()))
+
+    if args.stats:
+        with open(args.stats, 'w', encoding='utf-8') as f:
+            json.dump({
+                **stats,
+                'total_seconds': total_seconds,
+                'workers': args.workers,
+                'peak_rss_bytes': peak_rss,
+                'result': result
+            }, f, ensure_ascii=False, indent=2, default=str)
+
+    return EXIT_RENDER_ERRORS if result['render_errors'] else EXIT_OK
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,16 +1,25 @@
 import os
 import sys
+import logging
 # DON'T CHANGE THIS !!!
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
 from flask import Flask, send_from_directory
 from flask_cors import CORS
 from src.models.user import db
+from src.models.job import Job
+from src.models.letter_fingerprint import LetterFingerprint
+from src.models.pipeline_run import PipelineRun, PipelineStage
+from src.models.letter import Letter, Position
 from src.routes.user import user_bp
-from src.routes.letter_generator import letter_bp
+from src.routes.letter_generator import letter_bp, fail_abandoned_jobs
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
 
 app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
 app.config['SECRET_KEY'] = 'asdf#FGSgvasgf$5$WGT'
+# За nginx/Apache файлы писем отдает веб-сервер по заголовку X-Sendfile, не занимая поток приложения
+app.config['USE_X_SENDFILE'] = os.environ.get('USE_X_SENDFILE') == '1'
 
 # Включаем CORS для всех доменов
 CORS(app)
@@ -24,6 +33,8 @@ app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 db.init_app(app)
 with app.app_context():
     db.create_all()
+    # Задачи, оставшиеся в статусе running после остановки сервера, завершаются с ошибкой
+    fail_abandoned_jobs()
 
 @app.route('/', defaults={'path': ''})
 @app.route('/<path:path>')
@@ -0,0 +1,36 @@
+import json
+from datetime import datetime
+
+from src.models.user import db
+
+class Job(db.Model):
+    id = db.Column(db.String(32), primary_key=True)
+    workspace_id = db.Column(db.String(32), index=True)
+    status = db.Column(db.String(16), nullable=False, default='queued')
+    rows_parsed = db.Column(db.Integer, nullable=False, default=0)
+    letters_total = db.Column(db.Integer, nullable=False, default=0)
+    letters_rendered = db.Column(db.Integer, nullable=False, default=0)
+    failures = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.Text)
+    result = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.now, onupdate=datetime.now)
+
+    def __repr__(self):
+        return f'<Job {self.id} {self.status}>'
+
+    def to_dict(self, with_result=True):
+        data = {
+            'id': self.id,
+            'status': self.status,
+            'rows_parsed': self.rows_parsed,
+            'letters_total': self.letters_total,
+            'letters_rendered': self.letters_rendered,
+            'failures': self.failures,
+            'error': self.error,
+            'created_at': self.created_at.isoformat(),
+            'updated_at': self.updated_at.isoformat()
+        }
+        if with_result and self.result:
+            data['result'] = json.loads(self.result)
+        return data
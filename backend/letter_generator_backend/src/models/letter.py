@@ -0,0 +1,96 @@
+import json
+
+from src.models.user import db
+
+class Letter(db.Model):
+    """Письмо, сформированное задачей обработки: сводка без позиций"""
+    id = db.Column(db.Integer, primary_key=True)
+    job_id = db.Column(db.String(32), db.ForeignKey('job.id'), nullable=False)
+    number = db.Column(db.Integer, nullable=False)
+    # Для сводного письма - номера всех его заказов через запятую
+    order_number = db.Column(db.Text, nullable=False)
+    contractor_name = db.Column(db.String(512), nullable=False)
+    contractor_short_name = db.Column(db.String(512))
+    contractor_full_form = db.Column(db.String(128))
+    be_name = db.Column(db.String(255))
+    reg_number = db.Column(db.Text)
+    reg_date = db.Column(db.Text)
+    planned_date = db.Column(db.String(10))
+    total_amount = db.Column(db.Float, nullable=False)
+    total_penalty = db.Column(db.Float, nullable=False)
+    total_positions = db.Column(db.Integer, nullable=False)
+    max_days_overdue = db.Column(db.Integer, nullable=False)
+    category = db.Column(db.String(32), nullable=False)
+    files = db.Column(db.Text, nullable=False, default='[]')
+    error = db.Column(db.Text)
+
+    # Фильтры списка писем всегда идут в пределах одной задачи
+    __table_args__ = (
+        db.UniqueConstraint('job_id', 'number'),
+        db.Index('ix_letter_job_contractor', 'job_id', 'contractor_name'),
+        db.Index('ix_letter_job_order', 'job_id', 'order_number'),
+        db.Index('ix_letter_job_category', 'job_id', 'category'),
+        db.Index('ix_letter_job_days', 'job_id', 'max_days_overdue'),
+    )
+
+    def __repr__(self):
+        return f'<Letter {self.job_id} {self.number}>'
+
+    def to_dict(self):
+        data = {
+            'number': self.number,
+            'order_number': self.order_number,
+            'contractor_name': self.contractor_name,
+            'contractor_short_name': self.contractor_short_name,
+            'contractor_full_form': self.contractor_full_form,
+            'be_name': self.be_name,
+            'reg_number': self.reg_number,
+            'reg_date': self.reg_date,
+            'planned_date': self.planned_date,
+            'total_amount': self.total_amount,
+            'total_penalty': self.total_penalty,
+            'total_positions': self.total_positions,
+            'max_days_overdue': self.max_days_overdue,
+            'category': self.category,
+            'files': json.loads(self.files)
+        }
+        if self.error is not None:
+            data['error'] = self.error
+        return data
+
+class Position(db.Model):
+    """Просроченная позиция письма"""
+    id = db.Column(db.Integer, primary_key=True)
+    job_id = db.Column(db.String(32), db.ForeignKey('job.id'), nullable=False)
+    letter_number = db.Column(db.Integer, nullable=False)
+    order_number = db.Column(db.String(64), nullable=False)
+    material = db.Column(db.String(128))
+    material_name = db.Column(db.String(512))
+    order_quantity = db.Column(db.Float)
+    price_without_vat = db.Column(db.Float)
+    ppz = db.Column(db.String(128))
+    amount = db.Column(db.Float, nullable=False)
+    days_overdue = db.Column(db.Integer, nullable=False)
+    penalty = db.Column(db.Float, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_position_job_letter', 'job_id', 'letter_number'),
+        db.Index('ix_position_job_days', 'job_id', 'days_overdue'),
+    )
+
+    def __repr__(self):
+        return f'<Position {self.job_id} {self.letter_number} {self.material}>'
+
+    def to_dict(self):
+        return {
+            'letter_number': self.letter_number,
+            'order_number': self.order_number,
+            'material': self.material,
+            'material_name': self.material_name,
+            'order_quantity': self.order_quantity,
+            'price_without_vat': self.price_without_vat,
+            'ppz': self.ppz,
+            'amount': self.amount,
+            'days_overdue': self.days_overdue,
+            'penalty': self.penalty
+        }
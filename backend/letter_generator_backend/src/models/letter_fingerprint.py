@@ -0,0 +1,21 @@
+import json
+from datetime import datetime
+
+from src.models.user import db
+
+class LetterFingerprint(db.Model):
+    """Отпечаток входных данных письма и файлы, сгенерированные по ним в рабочей папке"""
+    id = db.Column(db.Integer, primary_key=True)
+    workspace_id = db.Column(db.String(32), nullable=False, index=True)
+    letter_key = db.Column(db.String(255), nullable=False)
+    fingerprint = db.Column(db.String(64), nullable=False)
+    files = db.Column(db.Text, nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.now, onupdate=datetime.now)
+
+    __table_args__ = (db.UniqueConstraint('workspace_id', 'letter_key'),)
+
+    def __repr__(self):
+        return f'<LetterFingerprint {self.workspace_id} {self.letter_key}>'
+
+    def file_list(self):
+        return json.loads(self.files)
@@ -0,0 +1,57 @@
+from datetime import datetime
+
+from src.models.user import db
+
+class PipelineRun(db.Model):
+    """Показатели одного запуска обработки: для сравнения производительности между версиями"""
+    id = db.Column(db.Integer, primary_key=True)
+    job_id = db.Column(db.String(32), index=True)
+    version = db.Column(db.String(64), nullable=False, index=True)
+    status = db.Column(db.String(16), nullable=False)
+    rows_parsed = db.Column(db.Integer, nullable=False, default=0)
+    rows_invalid = db.Column(db.Integer, nullable=False, default=0)
+    rows_unmatched_sed = db.Column(db.Integer, nullable=False, default=0)
+    letters_total = db.Column(db.Integer, nullable=False, default=0)
+    letters_reused = db.Column(db.Integer, nullable=False, default=0)
+    render_failures = db.Column(db.Integer, nullable=False, default=0)
+    parse_cache_hits = db.Column(db.Integer, nullable=False, default=0)
+    total_seconds = db.Column(db.Float, nullable=False, default=0.0)
+    rows_per_second = db.Column(db.Float)
+    letters_per_second = db.Column(db.Float)
+    peak_rss_bytes = db.Column(db.BigInteger)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.now, index=True)
+    stages = db.relationship('PipelineStage', backref='run', cascade='all, delete-orphan', lazy='selectin')
+
+    def __repr__(self):
+        return f'<PipelineRun {self.id} {self.status}>'
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'job_id': self.job_id,
+            'version': self.version,
+            'status': self.status,
+            'rows_parsed': self.rows_parsed,
+            'rows_invalid': self.rows_invalid,
+            'rows_unmatched_sed': self.rows_unmatched_sed,
+            'letters_total': self.letters_total,
+            'letters_reused': self.letters_reused,
+            'render_failures': self.render_failures,
+            'parse_cache_hits': self.parse_cache_hits,
+            'total_seconds': self.total_seconds,
+            'rows_per_second': self.rows_per_second,
+            'letters_per_second': self.letters_per_second,
+            'peak_rss_bytes': self.peak_rss_bytes,
+            'stage_seconds': {stage.name: stage.seconds for stage in self.stages},
+            'created_at': self.created_at.isoformat()
+        }
+
+class PipelineStage(db.Model):
+    """Время одного этапа запуска обработки"""
+    id = db.Column(db.Integer, primary_key=True)
+    run_id = db.Column(db.Integer, db.ForeignKey('pipeline_run.id'), nullable=False, index=True)
+    name = db.Column(db.String(32), nullable=False)
+    seconds = db.Column(db.Float, nullable=False)
+
+    def __repr__(self):
+        return f'<PipelineStage {self.name} {self.seconds:.3f}>'
@@ -1,95 +1,131 @@
-from flask import Blueprint, request, jsonify, send_file
+from flask import Blueprint, request, jsonify, send_file, current_app, Response, session
 from werkzeug.utils import secure_filename
+from werkzeug.security import safe_join
+from werkzeug.exceptions import HTTPException
 import os
 import pandas as pd
 import openpyxl
 from datetime import datetime, timedelta
-import zipfile
-import tempfile
 import shutil
 from docx import Document
 from docx.shared import Inches
 import re
+import io
+import json
+import time
+import uuid
+import threading
+import logging
+import math
+from itertools import islice
 from src.utils.letter_generator_utils import (
     process_reporting_data, 
-    generate_letter_document, 
-    generate_appendix_document,
-    format_amount_in_words
+    forecast_reporting_data,
+    render_letter_preview,
+    read_reporting_file,
+    read_sed_file
 )
+from src.utils.rendering import render_letters, letter_output_files
+from src.utils.incremental import letter_key, letter_fingerprint, reuse_letter_files
+from src.utils.zip_stream import iter_zip
+from src.utils.workspace import Workspace, cleanup_workspaces, UploadOffsetError, UploadChecksumError, UPLOAD_ROLES
+from src.utils.parse_cache import ParseCache
+from src.utils.letter_store import LetterStore, write_letter_store
+from src.utils.html_preview import PreviewCache
+from src.utils.file_etag import FileETags
+from src.utils.rejections import RejectionReport, REJECTIONS_FILENAME, REPORT_FORMATS
+from src.utils.metrics import StageClock, RssSampler, format_prometheus
+from src.models.user import db
+from src.models.job import Job
+from src.models.letter_fingerprint import LetterFingerprint
+from src.models.pipeline_run import PipelineRun, PipelineStage
+from src.models.letter import Letter, Position
 
 letter_bp = Blueprint('letter', __name__)
+logger = logging.getLogger(__name__)
 
-UPLOAD_FOLDER = os.path.join(os.path.dirname(__file__), 'uploads')
-GENERATED_FOLDER = os.path.join(os.path.dirname(__file__), 'generated_letters')
+# Рабочие папки сессий: у каждой свои загрузки и сгенерированные письма
+WORKSPACES_FOLDER = os.environ.get('WORKSPACES_FOLDER', os.path.join(os.path.dirname(__file__), 'workspaces'))
+# Рабочие папки, не использовавшиеся дольше TTL, удаляются, секунды
+WORKSPACE_TTL = int(os.environ.get('WORKSPACE_TTL', 24 * 60 * 60))
+# Минимальный интервал между очистками рабочих папок, секунды
+WORKSPACE_CLEANUP_INTERVAL = 10 * 60
+# Количество процессов для генерации документов (1 - без пула)
+RENDER_WORKERS = int(os.environ.get('LETTER_RENDER_WORKERS', os.cpu_count() or 1))
+# Приложения с большим числом позиций выводятся в XLSX (0 - всегда в DOCX)
+APPENDIX_XLSX_THRESHOLD = int(os.environ.get('APPENDIX_XLSX_THRESHOLD', 0))
+# Точный расчет пени в Decimal по умолчанию для /process (1 - включен)
+EXACT_PENALTY = os.environ.get('EXACT_PENALTY', '0') == '1'
+# Минимальный интервал записи прогресса фоновой задачи в БД, секунды
+JOB_PROGRESS_INTERVAL = 1.0
+
+# Кэш прочитанных колонок Excel-файлов по хешу содержимого
+PARSE_CACHE_FOLDER = os.environ.get('PARSE_CACHE_FOLDER', os.path.join(os.path.dirname(__file__), 'parse_cache'))
+PARSE_CACHE_MAX_BYTES = int(os.environ.get('PARSE_CACHE_MAX_BYTES', 2 * 1024 ** 3))
+
+# Максимальный размер одной части при загрузке файла по частям, байты
+UPLOAD_CHUNK_MAX_BYTES = int(os.environ.get('UPLOAD_CHUNK_MAX_BYTES', 16 * 1024 ** 2))
+
+# Чтение колонок загруженных файлов для прогрева кэша по типу файла
+FILE_READERS = {'reporting': read_reporting_file, 'sed': read_sed_file}
+
+# Размер страницы списка писем по умолчанию и максимальный
+LETTERS_PAGE_SIZE = 100
+LETTERS_PAGE_MAX = 1000
+
+# Сколько дней письма и позиции задач хранятся в БД
+LETTER_RETENTION_DAYS = int(os.environ.get('LETTER_RETENTION_DAYS', 30))
+# Размер пачки при массовой вставке строк в БД
+DB_INSERT_BATCH = 10_000
+
+# Версия приложения, с которой связываются показатели запусков
+APP_VERSION = os.environ.get('APP_VERSION', 'dev')
+
+# Прогноз пени: горизонт по умолчанию и наибольшее число дат в одном запросе
+FORECAST_DAYS = 90
+FORECAST_MAX_DATES = int(os.environ.get('FORECAST_MAX_DATES', 366))
+
+# Кэш HTML-просмотра писем по отпечатку письма, байты
+PREVIEW_CACHE_MAX_BYTES = int(os.environ.get('PREVIEW_CACHE_MAX_BYTES', 64 * 1024 ** 2))
+
+# Сколько файлов помнят свой хеш для ETag без повторного чтения
+FILE_ETAGS_MAX_ENTRIES = int(os.environ.get('FILE_ETAGS_MAX_ENTRIES', 100_000))
 
 # Создаем папки если их нет
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-os.makedirs(GENERATED_FOLDER, exist_ok=True)
+os.makedirs(WORKSPACES_FOLDER, exist_ok=True)
+
+parse_cache = ParseCache(PARSE_CACHE_FOLDER, PARSE_CACHE_MAX_BYTES)
+preview_cache = PreviewCache(PREVIEW_CACHE_MAX_BYTES)
+file_etags = FileETags(FILE_ETAGS_MAX_ENTRIES)
+
+_last_cleanup = [0.0]
 
 def allowed_file(filename):
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in {'xlsx', 'xls'}
-
-def clean_contractor_name(name):
-    """Удаляет первые 10 цифр из названия контрагента"""
-    if isinstance(name, str):
-        # Удаляем первые 10 цифр если они есть в начале
-        cleaned = re.sub(r'^\d{10}', '', name).strip()
-        return cleaned
-    return name
-
-def calculate_penalty(amount, days_overdue):
-    """Расчет пени с учетом сложного процента"""
-    if days_overdue <= 0:
-        return 0
-    
-    penalty = 0
-    remaining_days = days_overdue
-    current_amount = amount
-    
-    # Первые 14 дней - 0.1% в день
-    if remaining_days > 0:
-        days_first_period = min(remaining_days, 14)
-        for day in range(days_first_period):
-            daily_penalty = current_amount * 0.001  # 0.1%
-            penalty += daily_penalty
-            current_amount += daily_penalty
-        remaining_days -= days_first_period
-    
-    # После 14 дней - 0.5% в день
-    if remaining_days > 0:
-        for day in range(remaining_days):
-            daily_penalty = current_amount * 0.005  # 0.5%
-            penalty += daily_penalty
-            current_amount += daily_penalty
-    
-    return penalty
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() in {'xlsx', 'xls', 'xlsb'}
 
-def number_to_words_russian(number):
-    """Преобразование числа в слова на русском языке"""
-    # Упрощенная версия для демонстрации
-    # В реальном проекте следует использовать библиотеку num2words
+def current_workspace(create=False):
+    """Рабочая папка текущей сессии; при create=True создается, если ее еще нет"""
+    workspace_id = session.get('workspace_id')
+    if not Workspace.is_valid_id(workspace_id):
+        if not create:
+            return None
+        workspace_id = Workspace.new_id()
+        session['workspace_id'] = workspace_id
     
-    units = ['', 'один', 'два', 'три', 'четыре', 'пять', 'шесть', 'семь', 'восемь', 'девять']
-    teens = ['десять', 'одиннадцать', 'двенадцать', 'тринадцать', 'четырнадцать', 
-             'пятнадцать', 'шестнадцать', 'семнадцать', 'восемнадцать', 'девятнадцать']
-    tens = ['', '', 'двадцать', 'тридцать', 'сорок', 'пятьдесят', 'шестьдесят', 'семьдесят', 'восемьдесят', 'девяносто']
-    hundreds = ['', 'сто', 'двести', 'триста', 'четыреста', 'пятьсот', 'шестьсот', 'семьсот', 'восемьсот', 'девятьсот']
-    
-    if number == 0:
-        return 'ноль'
-    
-    # Для простоты возвращаем строковое представление
-    # В реальном проекте нужна полная реализация
-    return str(number)
-
-def format_amount_in_words(amount):
-    """Форматирование суммы прописью"""
-    rubles = int(amount)
-    kopecks = int((amount - rubles) * 100)
-    
-    rubles_words = number_to_words_russian(rubles)
-    
-    return f"{rubles_words} рублей {kopecks:02d} копеек"
+    workspace = Workspace(WORKSPACES_FOLDER, workspace_id)
+    if create:
+        workspace.ensure()
+    else:
+        workspace.touch()
+    return workspace
+
+def cleanup_expired_workspaces():
+    """Периодическое удаление устаревших рабочих папок"""
+    now = time.time()
+    if now - _last_cleanup[0] < WORKSPACE_CLEANUP_INTERVAL:
+        return
+    _last_cleanup[0] = now
+    cleanup_workspaces(WORKSPACES_FOLDER, WORKSPACE_TTL, now)
 
 @letter_bp.route('/upload', methods=['POST'])
 def upload_files():
@@ -105,108 +141,947 @@ def upload_files():
             return jsonify({'error': 'Файлы не выбраны'}), 400
         
         if not (allowed_file(reporting_file.filename) and allowed_file(sed_file.filename)):
-            return jsonify({'error': 'Разрешены только Excel файлы (.xlsx, .xls)'}), 400
+            return jsonify({'error': 'Разрешены только Excel файлы (.xlsx, .xls, .xlsb)'}), 400
         
-        # Сохраняем файлы
-        reporting_filename = secure_filename('reporting.xlsx')
-        sed_filename = secure_filename('sed.xlsx')
+        cleanup_expired_workspaces()
         
-        reporting_path = os.path.join(UPLOAD_FOLDER, reporting_filename)
-        sed_path = os.path.join(UPLOAD_FOLDER, sed_filename)
-        
-        reporting_file.save(reporting_path)
-        sed_file.save(sed_path)
+        # Сохраняем файлы в рабочую папку сессии под именами по хешу содержимого
+        workspace = current_workspace(create=True)
+        reporting_entry = workspace.save_upload('reporting', reporting_file)
+        sed_entry = workspace.save_upload('sed', sed_file)
         
         return jsonify({
             'message': 'Файлы успешно загружены',
-            'reporting_file': reporting_filename,
-            'sed_file': sed_filename
+            'reporting_file': secure_filename(reporting_file.filename),
+            'sed_file': secure_filename(sed_file.filename),
+            'reporting_sha256': reporting_entry['sha256'],
+            'sed_sha256': sed_entry['sha256']
         })
         
     except Exception as e:
         return jsonify({'error': f'Ошибка при загрузке файлов: {str(e)}'}), 500
 
+def _warm_parse_cache(role, path, sha256):
+    """Чтение колонок только что загруженного файла в кэш, пока пользователь не запустил обработку"""
+    try:
+        parse_cache.load_or_read(role, path, FILE_READERS[role], sha256)
+    except Exception:
+        logger.exception("Не удалось прочитать загруженный файл %s", path)
+
+def _upload_response(state):
+    return {
+        'upload_id': state['upload_id'],
+        'role': state['role'],
+        'filename': state['filename'],
+        'size': state['size'],
+        'offset': state['offset'],
+        'complete': state['complete'],
+        'chunk_size': UPLOAD_CHUNK_MAX_BYTES
+    }
+
+@letter_bp.route('/uploads', methods=['POST'])
+def start_chunked_upload():
+    """Начало загрузки файла по частям
+    
+    Тело: {"role": "reporting" | "sed", "filename": ..., "size": байты, "sha256": хеш файла (необязательно)}.
+    Части отправляются через PUT /uploads/<upload_id> с заголовком Upload-Offset.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        role = data.get('role')
+        filename = data.get('filename') or ''
+        size = data.get('size')
+        
+        if role not in FILE_READERS:
+            return jsonify({'error': 'Тип файла должен быть reporting или sed'}), 400
+        if not allowed_file(filename):
+            return jsonify({'error': 'Разрешены только Excel файлы (.xlsx, .xls, .xlsb)'}), 400
+        if not isinstance(size, int) or size <= 0:
+            return jsonify({'error': 'Не указан размер файла'}), 400
+        
+        cleanup_expired_workspaces()
+        workspace = current_workspace(create=True)
+        state = workspace.start_upload(role, secure_filename(filename) or f'{role}.xlsx', size, data.get('sha256'))
+        return jsonify(_upload_response(state)), 201
+        
+    except Exception as e:
+        return jsonify({'error': f'Ошибка при загрузке файлов: {str(e)}'}), 500
+
+@letter_bp.route('/uploads/<upload_id>', methods=['GET'])
+def get_chunked_upload(upload_id):
+    """Состояние загрузки: offset - с какого байта продолжать после обрыва"""
+    workspace = current_workspace()
+    state = workspace.upload_state(upload_id) if workspace else None
+    if state is None:
+        return jsonify({'error': 'Загрузка не найдена'}), 404
+    return jsonify(_upload_response(state))
+
+@letter_bp.route('/uploads/<upload_id>', methods=['PUT'])
+def upload_chunk(upload_id):
+    """Прием части файла: тело запроса пишется на диск по мере чтения
+    
+    Заголовки: Upload-Offset - смещение части в файле, X-Chunk-SHA256 - хеш части (обязательно).
+    После последней части файл проверяется, связывается с ролью и сразу читается в кэш колонок.
+    """
+    try:
+        workspace = current_workspace()
+        if workspace is None or workspace.upload_state(upload_id) is None:
+            return jsonify({'error': 'Загрузка не найдена'}), 404
+        
+        try:
+            offset = int(request.headers.get('Upload-Offset', ''))
+        except ValueError:
+            return jsonify({'error': 'Не указан заголовок Upload-Offset'}), 400
+        chunk_sha256 = request.headers.get('X-Chunk-SHA256')
+        if not chunk_sha256:
+            return jsonify({'error': 'Не указан заголовок X-Chunk-SHA256'}), 400
+        if request.content_length is not None and request.content_length > UPLOAD_CHUNK_MAX_BYTES:
+            return jsonify({'error': f'Часть больше {UPLOAD_CHUNK_MAX_BYTES} байт'}), 413
+        
+        try:
+            state = workspace.append_upload_chunk(
+                upload_id, offset, request.stream, chunk_sha256, UPLOAD_CHUNK_MAX_BYTES
+            )
+            if state['offset'] == state['size']:
+                state, entry = workspace.finish_upload(upload_id)
+                threading.Thread(
+                    target=_warm_parse_cache,
+                    args=(state['role'], workspace.input_path(state['role']), entry['sha256']),
+                    daemon=True
+                ).start()
+                return jsonify({**_upload_response(state), 'sha256': entry['sha256']})
+        except UploadOffsetError as e:
+            return jsonify({'error': str(e), 'offset': e.expected}), 409
+        except UploadChecksumError as e:
+            return jsonify({'error': str(e)}), 422
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        return jsonify(_upload_response(state))
+        
+    except Exception as e:
+        return jsonify({'error': f'Ошибка при загрузке файлов: {str(e)}'}), 500
+
+@letter_bp.route('/uploads/<upload_id>', methods=['DELETE'])
+def abort_chunked_upload(upload_id):
+    """Отмена незавершенной загрузки"""
+    workspace = current_workspace()
+    if workspace is None or workspace.upload_state(upload_id) is None:
+        return jsonify({'error': 'Загрузка не найдена'}), 404
+    workspace.abort_upload(upload_id)
+    return jsonify({'message': 'Загрузка отменена'})
+
+def _input_hashes(workspace):
+    """Хеши загруженных файлов из манифеста: файлы хранятся под хешем, пересчитывать его не нужно"""
+    return {role: workspace.input_hash(role) for role in UPLOAD_ROLES}
+
+# Статусы задачи, пока она не завершена
+ACTIVE_JOB_STATUSES = ('queued', 'running')
+
+def _fail_abandoned_jobs(jobs):
+    """Помечает failed незавершенные задачи, процесс которых уже не работает
+    
+    Задачи выполняются в потоках процесса сервера; если процесс завершился, статус running
+    остался бы навсегда. Живая задача держит блокировку рабочей папки (Workspace.lock_job),
+    поэтому задача без блокировки брошена.
+    """
+    abandoned = [
+        job for job in jobs
+        if job.status in ACTIVE_JOB_STATUSES and not Workspace(WORKSPACES_FOLDER, job.workspace_id).job_active()
+    ]
+    for job in abandoned:
+        job.status = 'failed'
+        job.error = 'Обработка прервана: процесс сервера завершился до окончания задачи'
+    if abandoned:
+        db.session.commit()
+    return len(abandoned)
+
+def fail_abandoned_jobs():
+    """Проверка незавершенных задач при запуске сервера"""
+    jobs = Job.query.filter(Job.status.in_(ACTIVE_JOB_STATUSES), Job.workspace_id.isnot(None)).all()
+    count = _fail_abandoned_jobs(jobs)
+    if count:
+        logger.warning("Прерванных задач обработки: %d, помечены как завершенные с ошибкой", count)
+    return count
+
 @letter_bp.route('/process', methods=['POST'])
 def process_files():
-    """Обработка файлов и генерация писем"""
+    """Постановка обработки файлов и генерации писем в фоновую задачу"""
     try:
         # Проверяем наличие файлов
-        reporting_path = os.path.join(UPLOAD_FOLDER, 'reporting.xlsx')
-        sed_path = os.path.join(UPLOAD_FOLDER, 'sed.xlsx')
+        workspace = current_workspace()
+        reporting_path = workspace.input_path('reporting') if workspace else None
+        sed_path = workspace.input_path('sed') if workspace else None
         
-        if not (os.path.exists(reporting_path) and os.path.exists(sed_path)):
+        if not (reporting_path and sed_path):
             return jsonify({'error': 'Файлы не найдены. Загрузите файлы сначала.'}), 400
         
-        # Обрабатываем данные
-        letters_data = process_reporting_data(reporting_path, sed_path)
+        options = request.get_json(silent=True) or {}
+        # Сводные письма: одно на поставщика и БЕ вместо письма на каждый заказ
+        consolidate = bool(options.get('consolidate'))
+        # Точный расчет пени в Decimal с округлением до копеек; по умолчанию - EXACT_PENALTY
+        exact_penalty = bool(options.get('exact_penalty', EXACT_PENALTY))
+        
+        # Одна задача на рабочую папку: иначе задачи гонятся за отпечатки писем и публикацию результата
+        job_lock = workspace.lock_job()
+        if job_lock is None:
+            active = Job.query.filter(
+                Job.workspace_id == workspace.id, Job.status.in_(ACTIVE_JOB_STATUSES)
+            ).order_by(Job.created_at.desc()).first()
+            if active is None:
+                # Блокировку еще держит только что завершившаяся задача
+                return jsonify({'error': 'Предыдущая обработка завершается, повторите запуск'}), 409
+            return jsonify({'error': 'Обработка уже выполняется, дождитесь ее завершения', 'job_id': active.id}), 409
+        
+        try:
+            job = Job(id=uuid.uuid4().hex, workspace_id=workspace.id)
+            db.session.add(job)
+            db.session.commit()
+            
+            app = current_app._get_current_object()
+            threading.Thread(
+                target=run_processing_job,
+                args=(app, job.id, workspace, reporting_path, sed_path, consolidate, exact_penalty,
+                      _input_hashes(workspace), job_lock),
+                daemon=True
+            ).start()
+        except Exception:
+            job_lock.close()
+            raise
         
-        # Очищаем папку с сгенерированными письмами
-        if os.path.exists(GENERATED_FOLDER):
-            shutil.rmtree(GENERATED_FOLDER)
-        os.makedirs(GENERATED_FOLDER, exist_ok=True)
+        return jsonify({
+            'message': 'Обработка запущена',
+            'job_id': job.id,
+            'status': job.status
+        }), 202
+        
+    except Exception as e:
+        return jsonify({'error': f'Ошибка при обработке файлов: {str(e)}'}), 500
+
+@letter_bp.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Прогресс и результат фоновой обработки"""
+    try:
+        workspace = current_workspace()
+        job = db.session.get(Job, job_id)
+        if job is None or workspace is None or job.workspace_id != workspace.id:
+            return jsonify({'error': 'Задача не найдена'}), 404
+        _fail_abandoned_jobs([job])
+        
+        return jsonify(job.to_dict())
         
-        # Генерируем письма и приложения
-        generated_files = []
+    except Exception as e:
+        return jsonify({'error': f'Ошибка при получении задачи: {str(e)}'}), 500
+
+def _update_job(job_id, **fields):
+    job = db.session.get(Job, job_id)
+    for name, value in fields.items():
+        setattr(job, name, value)
+    db.session.commit()
+
+def _record_run(job_id, status, stats, total_seconds):
+    """Сохраняет показатели запуска в БД; ошибка записи не влияет на результат задачи"""
+    try:
+        rows_parsed = stats.get('rows_parsed', 0)
+        letters_total = stats.get('letters_total', 0)
+        run = PipelineRun(
+            job_id=job_id,
+            version=APP_VERSION,
+            status=status,
+            rows_parsed=rows_parsed,
+            rows_invalid=stats.get('rows_invalid', 0),
+            rows_unmatched_sed=stats.get('rows_unmatched_sed', 0),
+            letters_total=letters_total,
+            letters_reused=stats.get('letters_reused', 0),
+            render_failures=stats.get('render_failures', 0),
+            parse_cache_hits=stats.get('parse_cache_hits', 0),
+            total_seconds=total_seconds,
+            rows_per_second=rows_parsed / total_seconds if total_seconds > 0 else None,
+            letters_per_second=letters_total / total_seconds if total_seconds > 0 else None,
+            peak_rss_bytes=stats.get('peak_rss_bytes'),
+            stages=[PipelineStage(name=name, seconds=seconds) for name, seconds in stats.get('stage_seconds', {}).items()]
+        )
+        db.session.add(run)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        logger.exception("Не удалось сохранить показатели запуска %s", job_id)
+
+def _reuse_unchanged_letters(workspace, letters_data, fingerprints, output_folder):
+    """Переносит файлы писем, отпечаток которых не изменился с прошлого запуска
+
+    Возвращает словарь «индекс письма → список файлов» для перенесенных писем.
+    """
+    previous = {
+        row.letter_key: row
+        for row in LetterFingerprint.query.filter_by(workspace_id=workspace.id)
+    }
+    reused = {}
+    for i, letter_data in enumerate(letters_data):
+        row = previous.get(letter_key(letter_data))
+        if row is None or row.fingerprint != fingerprints[i]:
+            continue
+        files = reuse_letter_files(
+            row.file_list(), workspace.output_folder, i + 1, letter_data, output_folder, APPENDIX_XLSX_THRESHOLD
+        )
+        if files is not None:
+            reused[i] = files
+    return reused
+
+def _store_fingerprints(workspace, letters_data, fingerprints, files_by_letter):
+    """Заменяет отпечатки писем рабочей папки отпечатками текущего результата"""
+    db.session.bulk_insert_mappings(LetterFingerprint, [
+        {
+            'workspace_id': workspace.id,
+            'letter_key': letter_key(letters_data[i]),
+            'fingerprint': fingerprints[i],
+            'files': json.dumps(files, ensure_ascii=False)
+        }
+        for i, files in files_by_letter.items()
+    ])
+
+def _text(value):
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return None
+    return str(value)
+
+def _number(value):
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return None if math.isnan(number) else number
+
+def _bulk_insert(model, rows):
+    """Массовая вставка пачками, без построения объектов моделей"""
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, DB_INSERT_BATCH))
+        if not batch:
+            break
+        db.session.bulk_insert_mappings(model, batch)
+
+def _store_letters(job_id, letters_data, files_by_letter, render_errors):
+    """Сохраняет письма и позиции задачи в БД для выборок без повторной обработки файлов"""
+    errors = {error['letter_number']: error['error'] for error in render_errors}
+    
+    def letter_rows():
         for i, letter_data in enumerate(letters_data):
-            try:
-                # Генерируем основное письмо
-                letter_filename = f"letter_{i+1}_{letter_data['contractor_short_name']}_{letter_data['order_number']}.docx"
-                letter_path = os.path.join(GENERATED_FOLDER, letter_filename)
-                generate_letter_document(letter_data, letter_path)
-                
-                # Генерируем приложение
-                appendix_filename = f"appendix_{i+1}_{letter_data['contractor_short_name']}_{letter_data['order_number']}.docx"
-                appendix_path = os.path.join(GENERATED_FOLDER, appendix_filename)
-                generate_appendix_document(letter_data, appendix_path)
-                
-                generated_files.extend([letter_filename, appendix_filename])
-                
-            except Exception as e:
-                print(f"Ошибка генерации письма {i+1}: {str(e)}")
-                continue
+            yield {
+                'job_id': job_id,
+                'number': i + 1,
+                'order_number': str(letter_data['order_number']),
+                'contractor_name': str(letter_data['contractor_name']),
+                'contractor_short_name': _text(letter_data['contractor_short_name']),
+                'contractor_full_form': _text(letter_data['contractor_full_form']),
+                'be_name': _text(letter_data['be_name']),
+                'reg_number': _text(letter_data['reg_number']),
+                'reg_date': _text(letter_data['reg_date']),
+                'planned_date': _text(letter_data['planned_date']),
+                'total_amount': letter_data['total_amount'],
+                'total_penalty': letter_data['total_penalty'],
+                'total_positions': letter_data['total_positions'],
+                'max_days_overdue': max(position['days_overdue'] for position in letter_data['positions']),
+                'category': letter_data['category'],
+                'files': json.dumps(files_by_letter.get(i, []), ensure_ascii=False),
+                'error': errors.get(i + 1)
+            }
+    
+    def position_rows():
+        for i, letter_data in enumerate(letters_data):
+            order_number = str(letter_data['order_number'])
+            for position in letter_data['positions']:
+                yield {
+                    'job_id': job_id,
+                    'letter_number': i + 1,
+                    # В сводном письме у позиции свой заказ
+                    'order_number': str(position.get('order_number', order_number)),
+                    'material': _text(position['material']),
+                    'material_name': _text(position['material_name']),
+                    'order_quantity': _number(position['order_quantity']),
+                    'price_without_vat': _number(position['price_without_vat']),
+                    'ppz': _text(position['ppz']),
+                    'amount': position['amount'],
+                    'days_overdue': position['days_overdue'],
+                    'penalty': position['penalty']
+                }
+    
+    _bulk_insert(Letter, letter_rows())
+    _bulk_insert(Position, position_rows())
+
+def _purge_old_letters():
+    """Удаляет письма и позиции задач старше LETTER_RETENTION_DAYS"""
+    old_jobs = db.select(Job.id).where(Job.created_at < datetime.now() - timedelta(days=LETTER_RETENTION_DAYS))
+    Position.query.filter(Position.job_id.in_(old_jobs)).delete(synchronize_session=False)
+    Letter.query.filter(Letter.job_id.in_(old_jobs)).delete(synchronize_session=False)
+
+def run_processing_job(app, job_id, workspace, reporting_path, sed_path, consolidate=False, exact_penalty=False,
+                       input_hashes=None, job_lock=None):
+    """Фоновая обработка файлов и генерация писем с сохранением прогресса в БД
+    
+    Письма, входные данные которых не изменились с прошлого запуска, не генерируются
+    заново: их файлы переносятся из прежнего результата. При consolidate=True
+    формируются сводные письма по поставщикам, при exact_penalty=True пени считаются в Decimal.
+    input_hashes - хеши файлов по ролям для кэша чтения (см. read_input_frames).
+    job_lock - блокировка рабочей папки из Workspace.lock_job, снимается по завершении задачи.
+    """
+    with app.app_context():
+        output_folder = None
+        started = time.perf_counter()
+        stats = {}
+        rss_sampler = RssSampler().start()
+        try:
+            _update_job(job_id, status='running')
+            
+            # Обрабатываем данные; дата письма и расчета просрочки одна на весь запуск
+            as_of_date = datetime.now()
+            rejections = RejectionReport()
+            letters_data = process_reporting_data(
+                reporting_path, sed_path, stats=stats, parse_cache=parse_cache, current_date=as_of_date,
+                consolidate=consolidate, rejections=rejections, exact_penalty=exact_penalty,
+                input_hashes=input_hashes
+            )
+            stats['letters_total'] = len(letters_data)
+            _update_job(job_id, rows_parsed=stats['rows_parsed'], letters_total=len(letters_data))
+            clock = StageClock(stats)
+            
+            # Письма задачи пишутся в отдельную папку и заменяют прежние только по готовности
+            output_folder = workspace.new_output_folder(job_id)
+            
+            fingerprints = [
+                letter_fingerprint(i + 1, letter_data, as_of_date, APPENDIX_XLSX_THRESHOLD)
+                for i, letter_data in enumerate(letters_data)
+            ]
+            files_by_letter = _reuse_unchanged_letters(workspace, letters_data, fingerprints, output_folder)
+            letters_reused = len(files_by_letter)
+            stats['letters_reused'] = letters_reused
+            to_render = [i for i in range(len(letters_data)) if i not in files_by_letter]
+            _update_job(job_id, letters_rendered=letters_reused)
+            clock.lap('reuse')
+            
+            # Прогресс пишем в БД не чаще раза в JOB_PROGRESS_INTERVAL секунд
+            last_update = [0.0]
+            
+            def progress(rendered, failed):
+                now = time.monotonic()
+                if now - last_update[0] >= JOB_PROGRESS_INTERVAL:
+                    last_update[0] = now
+                    _update_job(job_id, letters_rendered=letters_reused + rendered, failures=failed)
+            
+            # Генерируем письма и приложения, входные данные которых изменились
+            _, render_errors = render_letters(
+                letters_data, output_folder, workers=RENDER_WORKERS, xlsx_threshold=APPENDIX_XLSX_THRESHOLD,
+                progress=progress, as_of_date=as_of_date, only=to_render
+            )
+            stats['render_failures'] = len(render_errors)
+            clock.lap('render')
+            failed = {error['letter_number'] - 1 for error in render_errors}
+            for i in to_render:
+                if i not in failed:
+                    files_by_letter[i] = letter_output_files(i + 1, letters_data[i], APPENDIX_XLSX_THRESHOLD)
+            files_by_letter = dict(sorted(files_by_letter.items()))
+            
+            # Сводки и позиции писем сохраняются вместе с письмами и отдаются через /letters
+            write_letter_store(
+                output_folder, letters_data, files_by_letter, render_errors,
+                fingerprints=fingerprints, as_of_date=as_of_date
+            )
+            # Отброшенные строки с причинами - рядом с письмами, отдаются через /rejections
+            rejections.write(os.path.join(output_folder, REJECTIONS_FILENAME))
+            
+            # Прежние отпечатки удаляем до публикации, чтобы они не указывали на чужие файлы
+            LetterFingerprint.query.filter_by(workspace_id=workspace.id).delete()
+            db.session.commit()
+            workspace.publish_output(output_folder)
+            _store_fingerprints(workspace, letters_data, fingerprints, files_by_letter)
+            clock.lap('store')
+            
+            # Письма и позиции в БД фиксируются вместе с завершением задачи
+            _purge_old_letters()
+            _store_letters(job_id, letters_data, files_by_letter, render_errors)
+            clock.lap('db')
+            
+            result = {
+                'message': f'Обработано и сгенерировано {len(letters_data)} писем',
+                'letters_count': len(letters_data),
+                'letters_reused': letters_reused,
+                'consolidated': consolidate,
+                'exact_penalty': exact_penalty,
+                'files_count': sum(len(files) for files in files_by_letter.values()),
+                'rows_rejected': stats.get('rows_rejected', {}),
+                'render_errors': render_errors
+            }
+            stats['peak_rss_bytes'] = rss_sampler.stop()
+            _record_run(job_id, 'done', stats, time.perf_counter() - started)
+            # Итоговый статус - последнее действие перед снятием блокировки рабочей папки
+            _update_job(
+                job_id,
+                status='done',
+                letters_rendered=len(letters_data) - len(render_errors),
+                failures=len(render_errors),
+                result=json.dumps(result, ensure_ascii=False, default=str)
+            )
+            
+        except Exception as e:
+            logger.exception("Ошибка фоновой обработки %s", job_id)
+            if output_folder is not None:
+                shutil.rmtree(output_folder, ignore_errors=True)
+            db.session.rollback()
+            stats['peak_rss_bytes'] = rss_sampler.stop()
+            _record_run(job_id, 'failed', stats, time.perf_counter() - started)
+            _update_job(job_id, status='failed', error=f'Ошибка при обработке файлов: {str(e)}')
+        finally:
+            db.session.remove()
+            if job_lock is not None:
+                job_lock.close()
+
+def current_letter_store():
+    """Результат последней обработки в рабочей папке сессии или None"""
+    workspace = current_workspace()
+    if workspace is None:
+        return None
+    store = LetterStore(workspace.output_folder)
+    return store if store.exists() else None
+
+@letter_bp.route('/letters', methods=['GET'])
+def list_letters():
+    """Список писем без позиций: страницами или потоком NDJSON (format=ndjson)"""
+    try:
+        store = current_letter_store()
+        if store is None:
+            return jsonify({'error': 'Нет обработанных писем'}), 404
+        
+        if request.args.get('format') == 'ndjson':
+            # Строки отдаются с диска как есть, без сборки всего ответа в памяти
+            return Response(store.iter_lines(), mimetype='application/x-ndjson')
         
+        offset = max(request.args.get('offset', 0, type=int), 0)
+        limit = min(max(request.args.get('limit', LETTERS_PAGE_SIZE, type=int), 1), LETTERS_PAGE_MAX)
         return jsonify({
-            'message': f'Обработано и сгенерировано {len(letters_data)} писем',
-            'letters_count': len(letters_data),
-            'files_generated': generated_files,
-            'letters_data': letters_data
+            'total': store.count(),
+            'offset': offset,
+            'limit': limit,
+            'letters': store.summaries(offset, limit)
         })
         
     except Exception as e:
-        return jsonify({'error': f'Ошибка при обработке файлов: {str(e)}'}), 500
+        return jsonify({'error': f'Ошибка при получении списка писем: {str(e)}'}), 500
+
+@letter_bp.route('/letters/<int:number>/positions', methods=['GET'])
+def get_letter_positions(number):
+    """Позиции одного письма по его номеру"""
+    try:
+        store = current_letter_store()
+        positions = store.positions(number) if store else None
+        if positions is None:
+            return jsonify({'error': 'Письмо не найдено'}), 404
+        
+        return jsonify({'number': number, 'positions': positions})
+        
+    except Exception as e:
+        return jsonify({'error': f'Ошибка при получении позиций письма: {str(e)}'}), 500
+
+@letter_bp.route('/letters/<int:number>/preview', methods=['GET'])
+def preview_letter(number):
+    """HTML-просмотр письма и приложения без генерации .docx"""
+    try:
+        store = current_letter_store()
+        summary = store.summary(number) if store else None
+        if summary is None:
+            return jsonify({'error': 'Письмо не найдено'}), 404
+        
+        # Отпечаток меняется вместе с любыми данными письма, поэтому годится и как ключ кэша, и как ETag
+        fingerprint = summary.get('fingerprint')
+        html = preview_cache.get(fingerprint) if fingerprint else None
+        if html is None:
+            letter_data = dict(summary, positions=store.positions(number))
+            html = render_letter_preview(letter_data, store.as_of_date())
+            if fingerprint:
+                preview_cache.put(fingerprint, html)
+        
+        response = Response(html, mimetype='text/html')
+        if fingerprint:
+            response.set_etag(fingerprint)
+            response.headers['Cache-Control'] = 'private, no-cache'
+        return response.make_conditional(request)
+        
+    except Exception as e:
+        return jsonify({'error': f'Ошибка при подготовке просмотра письма: {str(e)}'}), 500
+
+def _rejections_path():
+    workspace = current_workspace()
+    path = os.path.join(workspace.output_folder, REJECTIONS_FILENAME) if workspace else None
+    return path if path is not None and os.path.isfile(path) else None
+
+@letter_bp.route('/rejections', methods=['GET'])
+def list_rejections():
+    """Строки отчетности, отброшенные последней обработкой: число по причинам и строки по страницам (offset, limit)"""
+    try:
+        path = _rejections_path()
+        if path is None:
+            return jsonify({'error': 'Нет результатов обработки'}), 404
+        
+        report = RejectionReport.read(path)
+        offset, limit = _page_args()
+        return jsonify({
+            'counts': report.counts(),
+            'total': len(report),
+            'offset': offset,
+            'limit': limit,
+            'rows': report.frame.iloc[offset:offset + limit].to_dict(orient='records')
+        })
+        
+    except Exception as e:
+        return jsonify({'error': f'Ошибка при получении отброшенных строк: {str(e)}'}), 500
+
+@letter_bp.route('/rejections/download', methods=['GET'])
+def download_rejections():
+    """Отчет об отброшенных строках: format=csv (по умолчанию) или xlsx"""
+    try:
+        path = _rejections_path()
+        if path is None:
+            return jsonify({'error': 'Нет результатов обработки'}), 404
+        report_format = request.args.get('format', 'csv').lower()
+        if report_format not in REPORT_FORMATS:
+            return jsonify({'error': f'Неизвестный формат отчета: {report_format}'}), 400
+        
+        if report_format == 'csv':
+            response = send_file(
+                path, mimetype='text/csv', as_attachment=True, download_name=REJECTIONS_FILENAME,
+                etag=file_etags.get(path), conditional=True
+            )
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+        
+        # XLSX строится из CSV по запросу: отчет нужен редко, а CSV пишется быстрее
+        buffer = io.BytesIO()
+        RejectionReport.read(path).frame.to_excel(buffer, index=False, sheet_name='Отброшенные строки')
+        buffer.seek(0)
+        return send_file(
+            buffer, as_attachment=True, download_name='rejections.xlsx',
+            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        return jsonify({'error': f'Ошибка при скачивании отчета: {str(e)}'}), 500
+
+def _forecast_dates(data):
+    """Даты прогноза из запроса: список dates или days дат с шагом step дней, начиная со start (по умолчанию - сегодня)"""
+    if data.get('dates') is not None:
+        if not isinstance(data['dates'], list):
+            raise ValueError('dates должен быть списком дат в формате ГГГГ-ММ-ДД')
+        dates = [datetime.strptime(str(value), '%Y-%m-%d') for value in data['dates']]
+    else:
+        start = datetime.strptime(str(data['start']), '%Y-%m-%d') if data.get('start') else datetime.now()
+        days = int(data.get('days', FORECAST_DAYS))
+        step = int(data.get('step', 1))
+        if days < 1 or step < 1:
+            raise ValueError('days и step должны быть положительными')
+        dates = [start + timedelta(days=offset) for offset in range(0, days, step)]
+    if not dates:
+        raise ValueError('Не указаны даты прогноза')
+    if len(dates) > FORECAST_MAX_DATES:
+        raise ValueError(f'Слишком много дат прогноза: {len(dates)}, допускается не больше {FORECAST_MAX_DATES}')
+    return dates
+
+@letter_bp.route('/forecast', methods=['POST'])
+def forecast_penalties():
+    """Прогноз начисленных пени по загруженным файлам на ряд дат
+    
+    Тело JSON: dates - список дат ГГГГ-ММ-ДД или days (по умолчанию 90), step и start - ряд дат;
+    consolidate - сводные письма по поставщику и БЕ, positions - добавить матрицу по позициям.
+    Ответ - матрица пени письма × даты и итоги по датам, письма не генерируются.
+    """
+    try:
+        workspace = current_workspace()
+        reporting_path = workspace.input_path('reporting') if workspace else None
+        sed_path = workspace.input_path('sed') if workspace else None
+        
+        if not (reporting_path and sed_path):
+            return jsonify({'error': 'Файлы не найдены. Загрузите файлы сначала.'}), 400
+        
+        data = request.get_json(silent=True) or {}
+        try:
+            dates = _forecast_dates(data)
+        except (TypeError, ValueError) as e:
+            return jsonify({'error': f'Некорректные даты прогноза: {str(e)}'}), 400
+        
+        stats = {}
+        started = time.perf_counter()
+        result = forecast_reporting_data(
+            reporting_path, sed_path, dates, stats=stats, parse_cache=parse_cache,
+            consolidate=bool(data.get('consolidate')), with_positions=bool(data.get('positions')),
+            input_hashes=_input_hashes(workspace)
+        )
+        result['consolidated'] = bool(data.get('consolidate'))
+        result['stats'] = {
+            'rows_parsed': stats.get('rows_parsed', 0),
+            'parse_cache_hits': stats.get('parse_cache_hits', 0),
+            'total_seconds': round(time.perf_counter() - started, 3)
+        }
+        return jsonify(result)
+        
+    except Exception as e:
+        return jsonify({'error': f'Ошибка при расчете прогноза пени: {str(e)}'}), 500
+
+def _page_args():
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    limit = min(max(request.args.get('limit', LETTERS_PAGE_SIZE, type=int), 1), LETTERS_PAGE_MAX)
+    return offset, limit
+
+def _completed_job(job_id):
+    """Завершенная задача рабочей папки текущей сессии; задачи других сессий не видны"""
+    workspace = current_workspace()
+    job = db.session.get(Job, job_id)
+    if job is None or workspace is None or job.workspace_id != workspace.id or job.status != 'done':
+        return None
+    return job
+
+@letter_bp.route('/runs', methods=['GET'])
+def list_runs():
+    """Завершенные задачи сессии за последние days дней (по умолчанию 7), письма которых хранятся в БД"""
+    try:
+        workspace = current_workspace()
+        if workspace is None:
+            return jsonify({'runs': []})
+        
+        days = min(max(request.args.get('days', 7, type=int), 1), LETTER_RETENTION_DAYS)
+        jobs = (
+            Job.query
+            .filter(
+                Job.workspace_id == workspace.id,
+                Job.status == 'done',
+                Job.created_at >= datetime.now() - timedelta(days=days)
+            )
+            .order_by(Job.created_at.desc())
+            .limit(LETTERS_PAGE_MAX)
+            .all()
+        )
+        return jsonify({'runs': [job.to_dict(with_result=False) for job in jobs]})
+        
+    except Exception as e:
+        return jsonify({'error': f'Ошибка при получении списка задач: {str(e)}'}), 500
+
+@letter_bp.route('/runs/<job_id>/letters', methods=['GET'])
+def list_run_letters(job_id):
+    """Письма задачи из БД с фильтрами по индексированным полям
+    
+    Параметры: contractor, order_number, category (точное совпадение),
+    min_days_overdue / max_days_overdue - по наибольшей просрочке позиции письма, offset, limit.
+    """
+    try:
+        if _completed_job(job_id) is None:
+            return jsonify({'error': 'Задача не найдена'}), 404
+        
+        query = Letter.query.filter(Letter.job_id == job_id)
+        if request.args.get('contractor'):
+            query = query.filter(Letter.contractor_name == request.args['contractor'])
+        if request.args.get('order_number'):
+            query = query.filter(Letter.order_number == request.args['order_number'])
+        if request.args.get('category'):
+            query = query.filter(Letter.category == request.args['category'])
+        min_days = request.args.get('min_days_overdue', type=int)
+        if min_days is not None:
+            query = query.filter(Letter.max_days_overdue >= min_days)
+        max_days = request.args.get('max_days_overdue', type=int)
+        if max_days is not None:
+            query = query.filter(Letter.max_days_overdue <= max_days)
+        
+        offset, limit = _page_args()
+        letters = query.order_by(Letter.number).offset(offset).limit(limit).all()
+        return jsonify({
+            'job_id': job_id,
+            'total': query.order_by(None).count(),
+            'offset': offset,
+            'limit': limit,
+            'letters': [letter.to_dict() for letter in letters]
+        })
+        
+    except Exception as e:
+        return jsonify({'error': f'Ошибка при получении списка писем: {str(e)}'}), 500
+
+@letter_bp.route('/runs/<job_id>/positions', methods=['GET'])
+def list_run_positions(job_id):
+    """Позиции задачи из БД: letter_number - позиции одного письма, min_days_overdue / max_days_overdue - по просрочке"""
+    try:
+        if _completed_job(job_id) is None:
+            return jsonify({'error': 'Задача не найдена'}), 404
+        
+        query = Position.query.filter(Position.job_id == job_id)
+        letter_number = request.args.get('letter_number', type=int)
+        if letter_number is not None:
+            query = query.filter(Position.letter_number == letter_number)
+        min_days = request.args.get('min_days_overdue', type=int)
+        if min_days is not None:
+            query = query.filter(Position.days_overdue >= min_days)
+        max_days = request.args.get('max_days_overdue', type=int)
+        if max_days is not None:
+            query = query.filter(Position.days_overdue <= max_days)
+        
+        offset, limit = _page_args()
+        positions = query.order_by(Position.id).offset(offset).limit(limit).all()
+        return jsonify({
+            'job_id': job_id,
+            'total': query.order_by(None).count(),
+            'offset': offset,
+            'limit': limit,
+            'positions': [position.to_dict() for position in positions]
+        })
+        
+    except Exception as e:
+        return jsonify({'error': f'Ошибка при получении позиций: {str(e)}'}), 500
+
+@letter_bp.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Показатели запусков обработки в текстовом формате Prometheus"""
+    try:
+        run_counts = db.session.query(
+            PipelineRun.version, PipelineRun.status, db.func.count(PipelineRun.id)
+        ).group_by(PipelineRun.version, PipelineRun.status).all()
+        totals = db.session.query(
+            PipelineRun.version,
+            db.func.sum(PipelineRun.rows_parsed),
+            db.func.sum(PipelineRun.rows_invalid),
+            db.func.sum(PipelineRun.rows_unmatched_sed),
+            db.func.sum(PipelineRun.letters_total),
+            db.func.sum(PipelineRun.letters_reused),
+            db.func.sum(PipelineRun.render_failures),
+            db.func.sum(PipelineRun.total_seconds)
+        ).group_by(PipelineRun.version).all()
+        stage_totals = db.session.query(
+            PipelineRun.version, PipelineStage.name, db.func.sum(PipelineStage.seconds)
+        ).join(PipelineStage.run).group_by(PipelineRun.version, PipelineStage.name).all()
+        last_run = PipelineRun.query.order_by(PipelineRun.id.desc()).first()
+        
+        def by_version(index):
+            return [({'version': row[0]}, row[index] or 0) for row in totals]
+        
+        metrics = [
+            ('letter_pipeline_runs_total', 'counter', 'Количество запусков обработки',
+             [({'version': version, 'status': status}, count) for version, status, count in run_counts]),
+            ('letter_pipeline_rows_total', 'counter', 'Прочитано строк отчетности', by_version(1)),
+            ('letter_pipeline_row_failures_total', 'counter', 'Отброшенные строки отчетности по причинам',
+             [({'version': row[0], 'reason': 'invalid'}, row[2] or 0) for row in totals]
+             + [({'version': row[0], 'reason': 'sed_unmatched'}, row[3] or 0) for row in totals]),
+            ('letter_pipeline_letters_total', 'counter', 'Сформировано писем', by_version(4)),
+            ('letter_pipeline_letters_reused_total', 'counter', 'Писем перенесено без генерации', by_version(5)),
+            ('letter_pipeline_render_failures_total', 'counter', 'Ошибки генерации писем', by_version(6)),
+            ('letter_pipeline_seconds_total', 'counter', 'Суммарное время запусков, с', by_version(7)),
+            ('letter_pipeline_stage_seconds_total', 'counter', 'Суммарное время этапов, с',
+             [({'version': version, 'stage': name}, seconds) for version, name, seconds in stage_totals]),
+        ]
+        if last_run is not None:
+            labels = {'version': last_run.version, 'status': last_run.status}
+            metrics += [
+                ('letter_pipeline_last_run_seconds', 'gauge', 'Время последнего запуска, с',
+                 [(labels, last_run.total_seconds)]),
+                ('letter_pipeline_last_run_stage_seconds', 'gauge', 'Время этапов последнего запуска, с',
+                 [(dict(labels, stage=stage.name), stage.seconds) for stage in last_run.stages]),
+                ('letter_pipeline_last_run_rows_per_second', 'gauge', 'Строк в секунду в последнем запуске',
+                 [(labels, last_run.rows_per_second)]),
+                ('letter_pipeline_last_run_letters_per_second', 'gauge', 'Писем в секунду в последнем запуске',
+                 [(labels, last_run.letters_per_second)]),
+                ('letter_pipeline_last_run_peak_rss_bytes', 'gauge', 'Пиковый RSS процесса во время последнего запуска, байты',
+                 [(labels, last_run.peak_rss_bytes)]),
+            ]
+        
+        return Response(format_prometheus(metrics), mimetype='text/plain; version=0.0.4')
+        
+    except Exception as e:
+        return jsonify({'error': f'Ошибка при получении показателей: {str(e)}'}), 500
+
+def _output_file(workspace, filename):
+    """Путь к сгенерированному файлу сессии или None, если такого файла нет"""
+    file_path = safe_join(workspace.output_folder, filename) if workspace else None
+    return file_path if file_path is not None and os.path.isfile(file_path) else None
+
+def _zip_response(files, download_name):
+    """Архив файлов потоком с ETag по составу файлов: повторный запрос с If-None-Match получает 304 без тела
+    
+    ETag слабый: он строится по размерам и времени изменения файлов, а не по содержимому.
+    """
+    response = Response(
+        iter_zip(files),
+        mimetype='application/zip',
+        headers={'Content-Disposition': f'attachment; filename={download_name}'}
+    )
+    response.set_etag(FileETags.combined(files), weak=True)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response.make_conditional(request)
 
 @letter_bp.route('/download/<filename>', methods=['GET'])
 def download_single_file(filename):
-    """Скачивание одного файла"""
+    """Скачивание одного файла
+    
+    ETag - SHA-256 содержимого, поэтому неизмененный файл при повторном запросе отдается
+    ответом 304; заголовок Range позволяет докачать файл с места обрыва.
+    """
     try:
-        file_path = os.path.join(GENERATED_FOLDER, filename)
-        if not os.path.exists(file_path):
+        file_path = _output_file(current_workspace(), filename)
+        if file_path is None:
             return jsonify({'error': 'Файл не найден'}), 404
         
-        return send_file(file_path, as_attachment=True, download_name=filename)
+        response = send_file(
+            file_path, as_attachment=True, download_name=filename, etag=file_etags.get(file_path), conditional=True
+        )
+        response.headers['Cache-Control'] = 'private, no-cache'
+        response.headers['Accept-Ranges'] = 'bytes'
+        return response
         
+    except HTTPException:
+        raise
     except Exception as e:
         return jsonify({'error': f'Ошибка при скачивании файла: {str(e)}'}), 500
 
+@letter_bp.route('/download_selected', methods=['GET', 'POST'])
+def download_selected_files():
+    """Скачивание выбранных файлов одним ZIP-архивом
+    
+    Имена файлов - в параметрах file (GET) или в списке files тела JSON (POST).
+    """
+    try:
+        workspace = current_workspace()
+        if request.method == 'POST':
+            filenames = (request.get_json(silent=True) or {}).get('files')
+        else:
+            filenames = request.args.getlist('file')
+        if not filenames or not isinstance(filenames, list):
+            return jsonify({'error': 'Не выбраны файлы для скачивания'}), 400
+        
+        files = []
+        missing = []
+        for filename in dict.fromkeys(str(filename) for filename in filenames):
+            file_path = _output_file(workspace, filename)
+            if file_path is None:
+                missing.append(filename)
+            else:
+                files.append((filename, file_path))
+        if missing:
+            return jsonify({'error': 'Файлы не найдены', 'files': missing}), 404
+        
+        return _zip_response(files, 'selected_letters.zip')
+        
+    except Exception as e:
+        return jsonify({'error': f'Ошибка при создании архива: {str(e)}'}), 500
+
 @letter_bp.route('/download_all', methods=['GET'])
 def download_all_letters():
     """Скачивание всех писем в ZIP архиве"""
     try:
-        if not os.path.exists(GENERATED_FOLDER) or not os.listdir(GENERATED_FOLDER):
+        workspace = current_workspace()
+        if workspace is None or not os.path.exists(workspace.output_folder) or not os.listdir(workspace.output_folder):
             return jsonify({'error': 'Нет сгенерированных файлов для скачивания'}), 404
         
-        # Создаем временную папку для ZIP архива
-        temp_dir = tempfile.mkdtemp()
-        zip_path = os.path.join(temp_dir, 'all_letters.zip')
-        
-        with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            # Добавляем все сгенерированные файлы в архив
-            for filename in os.listdir(GENERATED_FOLDER):
-                if filename.endswith('.docx'):
-                    file_path = os.path.join(GENERATED_FOLDER, filename)
-                    zipf.write(file_path, filename)
+        # Архив собирается на лету по мере чтения клиентом
+        files = [
+            (filename, os.path.join(workspace.output_folder, filename))
+            for filename in sorted(os.listdir(workspace.output_folder))
+            if filename.endswith(('.docx', '.xlsx'))
+        ]
         
-        return send_file(zip_path, as_attachment=True, download_name='all_letters.zip')
+        return _zip_response(files, 'all_letters.zip')
         
     except Exception as e:
         return jsonify({'error': f'Ошибка при создании архива: {str(e)}'}), 500
@@ -215,10 +1090,13 @@ def download_all_letters():
 def get_status():
     """Получение статуса системы"""
     try:
-        reporting_exists = os.path.exists(os.path.join(UPLOAD_FOLDER, 'reporting.xlsx'))
-        sed_exists = os.path.exists(os.path.join(UPLOAD_FOLDER, 'sed.xlsx'))
+        workspace = current_workspace()
+        reporting_exists = workspace is not None and workspace.input_path('reporting') is not None
+        sed_exists = workspace is not None and workspace.input_path('sed') is not None
         
-        generated_count = len([f for f in os.listdir(GENERATED_FOLDER) if f.endswith('.docx')])
+        generated_count = 0
+        if workspace is not None and os.path.exists(workspace.output_folder):
+            generated_count = len([f for f in os.listdir(workspace.output_folder) if f.endswith('.docx')])
         
         return jsonify({
             'reporting_file_uploaded': reporting_exists,
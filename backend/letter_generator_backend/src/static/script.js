@@ -1,11 +1,23 @@
 // Конфигурация API
 const API_BASE_URL = '/api/letters';
+// Интервал опроса фоновой задачи, мс
+const JOB_POLL_INTERVAL = 1000;
+// Размер страницы списка писем
+const LETTERS_PAGE_SIZE = 100;
+// Сколько позиций письма показывать в списке
+const POSITIONS_PREVIEW_LIMIT = 200;
+// Размер части при загрузке файлов (сервер может ограничить его меньшим значением)
+const UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024;
+// Сколько раз подряд повторять отправку части после сбоя
+const UPLOAD_MAX_RETRIES = 5;
 
 // Элементы DOM
 const reportingFileInput = document.getElementById('reporting-file');
 const sedFileInput = document.getElementById('sed-file');
 const uploadBtn = document.getElementById('upload-btn');
 const processBtn = document.getElementById('process-btn');
+const consolidateCheckbox = document.getElementById('consolidate-checkbox');
+const exactPenaltyCheckbox = document.getElementById('exact-penalty-checkbox');
 const downloadAllBtn = document.getElementById('download-all-btn');
 
 const reportingStatus = document.getElementById('reporting-status');
@@ -30,9 +42,21 @@ let appState = {
     sedFileSelected: false,
     filesUploaded: false,
     dataProcessed: false,
-    lettersData: []
+    letters: {
+        total: 0,
+        loaded: 0,
+        loading: false
+    }
 };
 
+// Подгрузка следующей страницы писем, когда конец списка становится видимым
+const lettersSentinel = document.createElement('div');
+const lettersObserver = new IntersectionObserver(function(entries) {
+    if (entries.some(entry => entry.isIntersecting)) {
+        loadNextLettersPage();
+    }
+});
+
 // Инициализация
 document.addEventListener('DOMContentLoaded', function() {
     initializeEventListeners();
@@ -50,6 +74,10 @@ function initializeEventListeners() {
     uploadBtn.addEventListener('click', handleUpload);
     processBtn.addEventListener('click', handleProcess);
     downloadAllBtn.addEventListener('click', handleDownloadAll);
+    lettersList.addEventListener('click', handleLettersListClick);
+    resultsSummary.addEventListener('click', handleResultsSummaryClick);
+    lettersList.after(lettersSentinel);
+    lettersObserver.observe(lettersSentinel);
     
     // Модальные окна
     closeErrorModal.addEventListener('click', hideErrorModal);
@@ -109,27 +137,32 @@ async function handleUpload() {
         return;
     }
     
-    const formData = new FormData();
-    formData.append('reporting_file', reportingFileInput.files[0]);
-    formData.append('sed_file', sedFileInput.files[0]);
+    const files = [
+        { role: 'reporting', file: reportingFileInput.files[0] },
+        { role: 'sed', file: sedFileInput.files[0] }
+    ];
+    const totalBytes = files.reduce((sum, item) => sum + item.file.size, 0);
+    let doneBytes = 0;
     
     showLoading('Загрузка файлов...');
     
     try {
-        const response = await fetch(`${API_BASE_URL}/upload`, {
-            method: 'POST',
-            body: formData
-        });
-        
-        const data = await response.json();
-        
-        if (response.ok) {
-            appState.filesUploaded = true;
-            updateStatus('Файлы успешно загружены', 'success');
-            showSuccess('Файлы успешно загружены!');
+        if (!(window.crypto && window.crypto.subtle)) {
+            // Без Web Crypto (страница открыта не по HTTPS) хеш частей не посчитать - файлы отправляются целиком
+            await uploadFilesWhole(files);
         } else {
-            throw new Error(data.error || 'Ошибка при загрузке файлов');
+            for (const { role, file } of files) {
+                await uploadFileInChunks(role, file, function(offset) {
+                    const percent = totalBytes ? Math.floor((doneBytes + offset) / totalBytes * 100) : 100;
+                    loadingText.textContent = `Загрузка файлов... ${percent}%`;
+                });
+                doneBytes += file.size;
+            }
         }
+        
+        appState.filesUploaded = true;
+        updateStatus('Файлы успешно загружены', 'success');
+        showSuccess('Файлы успешно загружены!');
     } catch (error) {
         showError('Ошибка при загрузке файлов: ' + error.message);
         updateStatus('Ошибка загрузки файлов', 'error');
@@ -139,27 +172,136 @@ async function handleUpload() {
     }
 }
 
+// Загрузка обоих файлов одним запросом
+async function uploadFilesWhole(files) {
+    const formData = new FormData();
+    for (const { role, file } of files) {
+        formData.append(`${role}_file`, file);
+    }
+    const response = await fetch(`${API_BASE_URL}/upload`, { method: 'POST', body: formData });
+    const data = await response.json();
+    if (!response.ok) {
+        throw new Error(data.error || 'Ошибка при загрузке файлов');
+    }
+}
+
+// Загрузка файла по частям с продолжением после обрыва связи или перезагрузки страницы
+async function uploadFileInChunks(role, file, onProgress) {
+    const storageKey = `upload:${role}:${file.name}:${file.size}:${file.lastModified}`;
+    let upload = await resumeUpload(localStorage.getItem(storageKey));
+    
+    if (!upload) {
+        const response = await fetch(`${API_BASE_URL}/uploads`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ role: role, filename: file.name, size: file.size })
+        });
+        upload = await response.json();
+        if (!response.ok) {
+            throw new Error(upload.error || 'Ошибка при загрузке файла');
+        }
+        localStorage.setItem(storageKey, upload.upload_id);
+    }
+    
+    const chunkSize = Math.min(UPLOAD_CHUNK_SIZE, upload.chunk_size);
+    let retries = 0;
+    onProgress(upload.offset);
+    
+    while (!upload.complete) {
+        const chunk = file.slice(upload.offset, upload.offset + chunkSize);
+        const headers = {
+            'Content-Type': 'application/octet-stream',
+            'Upload-Offset': String(upload.offset),
+            'X-Chunk-SHA256': await sha256Hex(chunk)
+        };
+        
+        let response;
+        try {
+            response = await fetch(`${API_BASE_URL}/uploads/${upload.upload_id}`, {
+                method: 'PUT',
+                headers: headers,
+                body: chunk
+            });
+        } catch (error) {
+            response = null;
+        }
+        const data = response ? await response.json().catch(() => ({})) : {};
+        
+        if (response && response.ok) {
+            upload = data;
+            retries = 0;
+            onProgress(upload.offset);
+            continue;
+        }
+        if (response && response.status === 409) {
+            // Сервер уже принял другую часть: продолжаем с его смещения
+            upload.offset = data.offset;
+            continue;
+        }
+        // Обрыв связи, поврежденная часть или сбой сервера - повторяем с принятого смещения
+        const retriable = !response || response.status === 422 || response.status >= 500;
+        if (!retriable || ++retries > UPLOAD_MAX_RETRIES) {
+            localStorage.removeItem(storageKey);
+            throw new Error(data.error || 'Не удалось загрузить файл');
+        }
+        await new Promise(resolve => setTimeout(resolve, 1000 * retries));
+        upload = (await resumeUpload(upload.upload_id)) || upload;
+    }
+    
+    localStorage.removeItem(storageKey);
+    return upload;
+}
+
+// Состояние незавершенной загрузки на сервере или null
+async function resumeUpload(uploadId) {
+    if (!uploadId) {
+        return null;
+    }
+    try {
+        const response = await fetch(`${API_BASE_URL}/uploads/${uploadId}`);
+        return response.ok ? await response.json() : null;
+    } catch (error) {
+        return null;
+    }
+}
+
+// SHA-256 части файла для заголовка X-Chunk-SHA256; вызывается только при наличии Web Crypto (HTTPS или localhost),
+// без него handleUpload отправляет файлы целиком через /upload
+async function sha256Hex(blob) {
+    const digest = await window.crypto.subtle.digest('SHA-256', await blob.arrayBuffer());
+    return Array.from(new Uint8Array(digest), byte => byte.toString(16).padStart(2, '0')).join('');
+}
+
 // Обработчик обработки данных
 async function handleProcess() {
     showLoading('Обработка данных и генерация писем...');
     
     try {
         const response = await fetch(`${API_BASE_URL}/process`, {
-            method: 'POST'
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({
+                consolidate: consolidateCheckbox.checked,
+                exact_penalty: exactPenaltyCheckbox.checked
+            })
         });
         
         const data = await response.json();
         
-        if (response.ok) {
-            appState.dataProcessed = true;
-            appState.lettersData = data.letters_data || [];
-            
-            updateStatus(`Обработано ${data.letters_count} писем`, 'success');
-            displayResults(data);
-            showSuccess(`Успешно сгенерировано ${data.letters_count} писем!`);
-        } else {
+        // Обработка уже идет (например, запущена до перезагрузки страницы) - ждем ее результата
+        const alreadyRunning = response.status === 409 && data.job_id;
+        if (!response.ok && !alreadyRunning) {
             throw new Error(data.error || 'Ошибка при обработке данных');
         }
+        
+        const job = await waitForJob(data.job_id);
+        const result = job.result;
+        
+        appState.dataProcessed = true;
+        
+        updateStatus(`Обработано ${result.letters_count} писем`, 'success');
+        displayResults(result);
+        showSuccess(`Успешно сгенерировано ${result.letters_count} писем!`);
     } catch (error) {
         showError('Ошибка при обработке данных: ' + error.message);
         updateStatus('Ошибка обработки данных', 'error');
@@ -169,30 +311,53 @@ async function handleProcess() {
     }
 }
 
+// Ожидание завершения фоновой задачи с отображением прогресса
+async function waitForJob(jobId) {
+    while (true) {
+        const response = await fetch(`${API_BASE_URL}/jobs/${jobId}`);
+        const job = await response.json();
+        
+        if (!response.ok) {
+            throw new Error(job.error || 'Ошибка при получении статуса обработки');
+        }
+        if (job.status === 'done') {
+            return job;
+        }
+        if (job.status === 'failed') {
+            throw new Error(job.error || 'Обработка завершилась с ошибкой');
+        }
+        
+        loadingText.textContent = job.letters_total > 0
+            ? `Генерация писем: ${job.letters_rendered} из ${job.letters_total} (ошибок: ${job.failures})`
+            : (job.rows_parsed > 0 ? `Прочитано строк: ${job.rows_parsed}` : 'Обработка данных...');
+        
+        await new Promise(resolve => setTimeout(resolve, JOB_POLL_INTERVAL));
+    }
+}
+
+// Скачивание по ссылке: браузер пишет файл на диск по мере получения, не держа его в памяти,
+// и может докачать его после обрыва. HEAD-запрос заранее проверяет, что файл есть, чтобы показать ошибку
+async function saveFromUrl(url, filename) {
+    const response = await fetch(url, { method: 'HEAD' });
+    if (!response.ok) {
+        const data = await fetch(url).then(r => r.json()).catch(() => ({}));
+        throw new Error(data.error || `HTTP ${response.status}`);
+    }
+    const a = document.createElement('a');
+    a.style.display = 'none';
+    a.href = url;
+    a.download = filename;
+    document.body.appendChild(a);
+    a.click();
+    document.body.removeChild(a);
+}
+
 // Обработчик скачивания всех писем
 async function handleDownloadAll() {
     try {
         updateStatus('Подготовка архива...', 'processing');
-        
-        const response = await fetch(`${API_BASE_URL}/download_all`);
-        
-        if (response.ok) {
-            const blob = await response.blob();
-            const url = window.URL.createObjectURL(blob);
-            const a = document.createElement('a');
-            a.style.display = 'none';
-            a.href = url;
-            a.download = 'all_letters.zip';
-            document.body.appendChild(a);
-            a.click();
-            window.URL.revokeObjectURL(url);
-            document.body.removeChild(a);
-            
-            updateStatus('Архив успешно скачан', 'success');
-        } else {
-            const data = await response.json();
-            throw new Error(data.error || 'Ошибка при скачивании архива');
-        }
+        await saveFromUrl(`${API_BASE_URL}/download_all`, 'all_letters.zip');
+        updateStatus('Скачивание архива начато', 'success');
     } catch (error) {
         showError('Ошибка при скачивании архива: ' + error.message);
         updateStatus('Ошибка скачивания', 'error');
@@ -202,61 +367,261 @@ async function handleDownloadAll() {
 // Скачивание отдельного файла
 async function downloadFile(filename) {
     try {
-        const response = await fetch(`${API_BASE_URL}/download/${filename}`);
-        
-        if (response.ok) {
-            const blob = await response.blob();
-            const url = window.URL.createObjectURL(blob);
-            const a = document.createElement('a');
-            a.style.display = 'none';
-            a.href = url;
-            a.download = filename;
-            document.body.appendChild(a);
-            a.click();
-            window.URL.revokeObjectURL(url);
-            document.body.removeChild(a);
-        } else {
-            const data = await response.json();
-            throw new Error(data.error || 'Ошибка при скачивании файла');
-        }
+        await saveFromUrl(`${API_BASE_URL}/download/${encodeURIComponent(filename)}`, filename);
     } catch (error) {
         showError('Ошибка при скачивании файла: ' + error.message);
     }
 }
 
+// Скачивание нескольких файлов одним архивом
+async function downloadFiles(filenames) {
+    try {
+        const query = filenames.map(filename => `file=${encodeURIComponent(filename)}`).join('&');
+        await saveFromUrl(`${API_BASE_URL}/download_selected?${query}`, 'selected_letters.zip');
+    } catch (error) {
+        showError('Ошибка при скачивании файлов: ' + error.message);
+    }
+}
+
 // Отображение результатов
 function displayResults(data) {
     // Обновляем сводку
     resultsSummary.innerHTML = `
         <h3><i class="fas fa-check-circle"></i> Обработка завершена успешно</h3>
-        <p><strong>Количество писем:</strong> ${data.letters_count}</p>
-        <p><strong>Файлов сгенерировано:</strong> ${data.files_generated ? data.files_generated.length : 0}</p>
+        <p><strong>Количество писем:</strong> ${data.letters_count}${data.consolidated ? ' (сводные по поставщикам)' : ''}</p>
+        <p><strong>Файлов сгенерировано:</strong> ${data.files_count || 0}</p>
+        ${data.letters_reused > 0 ? `<p><strong>Без изменений с прошлой обработки:</strong> ${data.letters_reused}</p>` : ''}
+        ${data.render_errors && data.render_errors.length > 0 ? `<p><strong>Ошибок генерации:</strong> ${data.render_errors.length}</p>` : ''}
+        ${rejectionsSummary(data.rows_rejected)}
         <p><strong>Время обработки:</strong> ${new Date().toLocaleString('ru-RU')}</p>
     `;
     
-    // Отображаем список писем
-    if (appState.lettersData && appState.lettersData.length > 0) {
-        lettersList.innerHTML = appState.lettersData.map((letter, index) => `
-            <div class="letter-item fade-in">
-                <div class="letter-header">
-                    <div class="letter-info">
-                        <h4>${letter.contractor_name}</h4>
-                        <p><strong>Заказ:</strong> ${letter.order_number}</p>
-                        <p><strong>Сумма:</strong> ${formatCurrency(letter.total_amount)}</p>
-                        <p><strong>Пени:</strong> ${formatCurrency(letter.total_penalty)}</p>
-                        <p><strong>Позиций:</strong> ${letter.total_positions}</p>
-                    </div>
-                    <div class="letter-actions">
-                        <button class="btn btn-small btn-primary" onclick="downloadFile('letter_${index + 1}_${letter.contractor_short_name}_${letter.order_number}.docx')">
-                            <i class="fas fa-download"></i> Письмо
-                        </button>
-                        <button class="btn btn-small btn-success" onclick="downloadFile('appendix_${index + 1}_${letter.contractor_short_name}_${letter.order_number}.docx')">
-                            <i class="fas fa-download"></i> Приложение
-                        </button>
-                    </div>
-                </div>
+    // Список писем подгружается страницами
+    resetLettersList();
+}
+
+// Подписи причин отбрасывания строк отчетности
+const REJECTION_TITLES = {
+    missing_order_number: 'нет номера заказа',
+    missing_contractor: 'нет наименования поставщика',
+    missing_planned_date: 'нет даты поставки по спецификации',
+    unparsable_date: 'дата не распознана',
+    non_positive_amount: 'сумма не указана или не больше нуля',
+    no_sed_match: 'заказ не найден в СЭД'
+};
+
+// Отброшенные строки по причинам и скачивание отчета о них
+function rejectionsSummary(counts) {
+    const reasons = Object.entries(counts || {}).filter(([, count]) => count > 0);
+    if (reasons.length === 0) {
+        return '';
+    }
+    const total = reasons.reduce((sum, [, count]) => sum + count, 0);
+    return `
+        <p><strong>Отброшено строк:</strong> ${total}
+            (${reasons.map(([reason, count]) => `${escapeHtml(REJECTION_TITLES[reason] || reason)}: ${count}`).join(', ')})</p>
+        <p>
+            <button class="btn btn-small btn-secondary" data-rejections="xlsx"><i class="fas fa-file-excel"></i> Отчет XLSX</button>
+            <button class="btn btn-small btn-secondary" data-rejections="csv"><i class="fas fa-file-csv"></i> Отчет CSV</button>
+        </p>
+    `;
+}
+
+// Скачивание отчета об отброшенных строках
+async function handleResultsSummaryClick(event) {
+    const button = event.target.closest('button[data-rejections]');
+    if (!button) {
+        return;
+    }
+    const format = button.dataset.rejections;
+    try {
+        await saveFromUrl(`${API_BASE_URL}/rejections/download?format=${format}`, `rejections.${format}`);
+    } catch (error) {
+        showError('Ошибка при скачивании отчета: ' + error.message);
+    }
+}
+
+// Очистка списка писем и загрузка первой страницы
+function resetLettersList() {
+    appState.letters = { total: 0, loaded: 0, loading: false };
+    lettersList.innerHTML = '';
+    loadNextLettersPage(true);
+}
+
+// Загрузка следующей страницы писем
+async function loadNextLettersPage(first = false) {
+    const letters = appState.letters;
+    if (!appState.dataProcessed || letters.loading || (!first && letters.loaded >= letters.total)) {
+        return;
+    }
+    
+    letters.loading = true;
+    try {
+        const response = await fetch(`${API_BASE_URL}/letters?offset=${letters.loaded}&limit=${LETTERS_PAGE_SIZE}`);
+        const data = await response.json();
+        
+        if (!response.ok) {
+            throw new Error(data.error || 'Ошибка при получении списка писем');
+        }
+        if (letters !== appState.letters) {
+            return;
+        }
+        
+        // Добавляем только новую страницу, не перестраивая уже показанные письма
+        const fragment = document.createDocumentFragment();
+        data.letters.forEach(letter => fragment.appendChild(createLetterItem(letter)));
+        lettersList.appendChild(fragment);
+        
+        letters.total = data.total;
+        letters.loaded += data.letters.length;
+    } catch (error) {
+        console.log('Не удалось загрузить список писем:', error.message);
+    } finally {
+        letters.loading = false;
+    }
+    
+    // Если конец списка все еще виден, догружаем следующую страницу
+    if (letters === appState.letters && letters.loaded < letters.total && isElementVisible(lettersSentinel)) {
+        loadNextLettersPage();
+    }
+}
+
+function isElementVisible(element) {
+    const rect = element.getBoundingClientRect();
+    return rect.top < window.innerHeight && rect.bottom >= 0 && element.offsetParent !== null;
+}
+
+// Подписи кнопок скачивания по порядку файлов письма
+const LETTER_FILE_LABELS = ['Письмо', 'Приложение', 'Приложение (XLSX)'];
+
+// Карточка письма в списке
+function createLetterItem(letter) {
+    const item = document.createElement('div');
+    item.className = 'letter-item fade-in';
+    item.dataset.number = letter.number;
+    
+    const buttons = letter.files.map((filename, index) => `
+        <button class="btn btn-small ${index === 0 ? 'btn-primary' : 'btn-success'}" data-download="${escapeHtml(filename)}">
+            <i class="fas fa-download"></i> ${LETTER_FILE_LABELS[index] || 'Файл'}
+        </button>
+    `).join('') + (letter.files.length > 1 ? `
+        <button class="btn btn-small btn-secondary" data-download-files="${escapeHtml(JSON.stringify(letter.files))}">
+            <i class="fas fa-file-archive"></i> Все файлы
+        </button>
+    ` : '');
+    
+    item.innerHTML = `
+        <div class="letter-header">
+            <div class="letter-info">
+                <h4>${escapeHtml(letter.contractor_name)}</h4>
+                ${letter.orders
+                    ? `<p><strong>Заказов:</strong> ${letter.orders.length} (${escapeHtml(letter.order_number)})</p>`
+                    : `<p><strong>Заказ:</strong> ${escapeHtml(letter.order_number)}</p>`}
+                <p><strong>Сумма:</strong> ${formatCurrency(letter.total_amount)}</p>
+                <p><strong>Пени:</strong> ${formatCurrency(letter.total_penalty)}</p>
+                <p><strong>Позиций:</strong> ${letter.total_positions}</p>
+                ${letter.error ? `<p><strong>Ошибка генерации:</strong> ${escapeHtml(letter.error)}</p>` : ''}
+            </div>
+            <div class="letter-actions">
+                ${buttons}
+                <button class="btn btn-small btn-secondary" data-preview="${letter.number}">
+                    <i class="fas fa-eye"></i> Просмотр
+                </button>
+                <button class="btn btn-small btn-secondary" data-positions="${letter.number}">
+                    <i class="fas fa-list"></i> Позиции
+                </button>
             </div>
-        `).join('');
+        </div>
+        <div class="letter-preview" style="display: none;"></div>
+        <div class="letter-positions" style="display: none;"></div>
+    `;
+    return item;
+}
+
+// Кнопки в карточках писем
+function handleLettersListClick(event) {
+    const button = event.target.closest('button');
+    if (!button) {
+        return;
+    }
+    if (button.dataset.download) {
+        downloadFile(button.dataset.download);
+    } else if (button.dataset.downloadFiles) {
+        downloadFiles(JSON.parse(button.dataset.downloadFiles));
+    } else if (button.dataset.preview) {
+        togglePreview(button.closest('.letter-item'), button.dataset.preview);
+    } else if (button.dataset.positions) {
+        togglePositions(button.closest('.letter-item'), button.dataset.positions);
+    }
+}
+
+// Просмотр письма и приложения; HTML готовит сервер, повторные открытия не требуют запроса
+async function togglePreview(item, number) {
+    const container = item.querySelector('.letter-preview');
+    if (container.dataset.loaded) {
+        container.style.display = container.style.display === 'none' ? 'block' : 'none';
+        return;
+    }
+    
+    try {
+        const response = await fetch(`${API_BASE_URL}/letters/${number}/preview`);
+        if (!response.ok) {
+            const data = await response.json();
+            throw new Error(data.error || 'Ошибка при получении просмотра письма');
+        }
+        
+        container.innerHTML = await response.text();
+        container.dataset.loaded = 'true';
+        container.style.display = 'block';
+    } catch (error) {
+        showError('Ошибка при получении просмотра письма: ' + error.message);
+    }
+}
+
+// Показ позиций письма; позиции запрашиваются только при первом открытии
+async function togglePositions(item, number) {
+    const container = item.querySelector('.letter-positions');
+    if (container.dataset.loaded) {
+        container.style.display = container.style.display === 'none' ? 'block' : 'none';
+        return;
+    }
+    
+    try {
+        const response = await fetch(`${API_BASE_URL}/letters/${number}/positions`);
+        const data = await response.json();
+        
+        if (!response.ok) {
+            throw new Error(data.error || 'Ошибка при получении позиций письма');
+        }
+        
+        const shown = data.positions.slice(0, POSITIONS_PREVIEW_LIMIT);
+        // У позиций сводного письма указан их заказ
+        const withOrders = shown.some(position => position.order_number !== undefined);
+        container.innerHTML = `
+            <table class="positions-table">
+                <thead>
+                    <tr>${withOrders ? '<th>Заказ</th>' : ''}<th>Материал</th><th>Наименование</th><th>Кол-во</th><th>Сумма</th><th>Дней просрочки</th><th>Пени</th></tr>
+                </thead>
+                <tbody>
+                    ${shown.map(position => `
+                        <tr>
+                            ${withOrders ? `<td>${escapeHtml(position.order_number)}</td>` : ''}
+                            <td>${escapeHtml(position.material)}</td>
+                            <td>${escapeHtml(position.material_name)}</td>
+                            <td>${escapeHtml(position.order_quantity)}</td>
+                            <td>${formatCurrency(position.amount)}</td>
+                            <td>${position.days_overdue}</td>
+                            <td>${formatCurrency(position.penalty)}</td>
+                        </tr>
+                    `).join('')}
+                </tbody>
+            </table>
+            ${data.positions.length > shown.length ? `<p>Показаны первые ${shown.length} из ${data.positions.length} позиций, полный перечень - в приложении</p>` : ''}
+        `;
+        container.dataset.loaded = 'true';
+        container.style.display = 'block';
+    } catch (error) {
+        showError('Ошибка при получении позиций письма: ' + error.message);
     }
 }
 
@@ -275,6 +640,7 @@ async function checkServerStatus() {
             if (data.generated_letters_count > 0) {
                 appState.dataProcessed = true;
                 updateStatus(`Найдено ${data.generated_letters_count} сгенерированных писем`, 'success');
+                resetLettersList();
             }
         }
     } catch (error) {
@@ -365,6 +731,13 @@ function formatCurrency(amount) {
     }).format(amount);
 }
 
+// Экранирование текста для вставки в HTML
+function escapeHtml(value) {
+    const div = document.createElement('div');
+    div.textContent = value === null || value === undefined ? '' : String(value);
+    return div.innerHTML.replace(/"/g, '&quot;');
+}
+
 // Обработка ошибок глобально
 window.addEventListener('error', function(event) {
     console.error('Глобальная ошибка:', event.error);
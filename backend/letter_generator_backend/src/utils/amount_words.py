@@ -0,0 +1,91 @@
+from functools import lru_cache
+
+# Размер кэша готовых сумм прописью (в письмах суммы часто повторяются)
+AMOUNT_WORDS_CACHE_SIZE = 65536
+
+_ONES = ["", "один", "два", "три", "четыре", "пять", "шесть", "семь", "восемь", "девять",
+         "десять", "одиннадцать", "двенадцать", "тринадцать", "четырнадцать", "пятнадцать",
+         "шестнадцать", "семнадцать", "восемнадцать", "девятнадцать"]
+_ONES_FEMININE = ["", "одна", "две"] + _ONES[3:]
+_TENS = ["", "", "двадцать", "тридцать", "сорок", "пятьдесят", "шестьдесят", "семьдесят", "восемьдесят", "девяносто"]
+_HUNDREDS = ["", "сто", "двести", "триста", "четыреста", "пятьсот", "шестьсот", "семьсот", "восемьсот", "девятьсот"]
+
+# Разряды по три цифры, начиная с тысяч: формы для 1, 2-4 и 5-0, род числительного
+_GROUPS = [
+    (("тысяча", "тысячи", "тысяч"), True),
+    (("миллион", "миллиона", "миллионов"), False),
+    (("миллиард", "миллиарда", "миллиардов"), False),
+    (("триллион", "триллиона", "триллионов"), False),
+]
+
+RUBLE_FORMS = ("рубль", "рубля", "рублей")
+KOPECK_FORMS = ("копейка", "копейки", "копеек")
+
+
+def _build_triads(ones):
+    """Слова для всех чисел 0-999 (для нуля - пустая строка)"""
+    triads = []
+    for n in range(1000):
+        words = []
+        hundreds, rest = divmod(n, 100)
+        if hundreds:
+            words.append(_HUNDREDS[hundreds])
+        if rest >= 20:
+            words.append(_TENS[rest // 10])
+            rest %= 10
+        if rest:
+            words.append(ones[rest])
+        triads.append(" ".join(words))
+    return triads
+
+
+def _plural_index(n):
+    if n % 10 == 1 and n % 100 != 11:
+        return 0
+    if n % 10 in (2, 3, 4) and n % 100 not in (12, 13, 14):
+        return 1
+    return 2
+
+
+_TRIADS = _build_triads(_ONES)
+_TRIADS_FEMININE = _build_triads(_ONES_FEMININE)
+# Форма существительного зависит только от двух последних цифр
+_PLURAL_INDEX = [_plural_index(n) for n in range(100)]
+MAX_NUMBER = 1000 ** (len(_GROUPS) + 1) - 1
+
+
+def plural_form(n, forms):
+    """Форма слова для числа n: forms - формы для 1, 2-4 и 5-0"""
+    return forms[_PLURAL_INDEX[n % 100]]
+
+
+@lru_cache(maxsize=AMOUNT_WORDS_CACHE_SIZE)
+def number_to_words(n):
+    """Целое неотрицательное число прописью (мужской род)"""
+    if n == 0:
+        return "ноль"
+    if n < 0 or n > MAX_NUMBER:
+        raise ValueError(f"Число вне диапазона записи прописью: {n}")
+
+    n, triad = divmod(n, 1000)
+    parts = [_TRIADS[triad]] if triad else []
+    for forms, feminine in _GROUPS:
+        if not n:
+            break
+        n, triad = divmod(n, 1000)
+        if triad:
+            words = _TRIADS_FEMININE[triad] if feminine else _TRIADS[triad]
+            parts.append(f"{words} {plural_form(triad, forms)}")
+    return " ".join(reversed(parts))
+
+
+def _kopecks_to_words(total_kopecks):
+    rubles, kopecks = divmod(total_kopecks, 100)
+    return (f"{number_to_words(rubles)} {plural_form(rubles, RUBLE_FORMS)} "
+            f"{kopecks:02d} {plural_form(kopecks, KOPECK_FORMS)}")
+
+
+@lru_cache(maxsize=AMOUNT_WORDS_CACHE_SIZE)
+def amount_to_words(amount):
+    """Сумма в рублях прописью; копейки округляются так же, как при выводе суммы с двумя знаками"""
+    return _kopecks_to_words(int(round(round(amount, 2) * 100)))
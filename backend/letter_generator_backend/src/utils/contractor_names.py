@@ -0,0 +1,82 @@
+import re
+
+import pandas as pd
+
+# Код контрагента (10 цифр) в начале названия
+_CODE_PREFIX = re.compile(r'^\d{10}\s*')
+
+# Краткое наименование - текст в кавычках после организационно-правовой формы.
+# Сначала ищется ООО, затем АО; шаблон АО покрывает и ЗАО («акционерное общество» входит в полную форму ЗАО)
+_SHORT_NAME_PATTERNS = [
+    re.compile(r'(?:Общество с ограниченной ответственностью|ООО)\s*"([^"]+)"', re.IGNORECASE),
+    re.compile(r'(?:Акционерное общество|АО)\s*"([^"]+)"', re.IGNORECASE),
+]
+
+# Форма организации в творительном падеже по вхождению сокращения или полного названия.
+# Проверяется по порядку, поэтому ЗАО идет раньше АО: «ао» и «акционерное общество» входят и в ЗАО
+_FULL_FORMS = [
+    (re.compile(r'ооо|общество с ограниченной ответственностью', re.IGNORECASE), 'Обществом с ограниченной ответственностью'),
+    (re.compile(r'зао|закрытое акционерное общество', re.IGNORECASE), 'Закрытым акционерным обществом'),
+    (re.compile(r'ао|акционерное общество', re.IGNORECASE), 'Акционерным обществом'),
+]
+DEFAULT_FULL_FORM = 'организацией'
+
+
+def clean_name(name):
+    """Удаляет код контрагента из начала названия"""
+    if isinstance(name, str):
+        return _CODE_PREFIX.sub('', name).strip()
+    return name
+
+
+def short_name(full_name):
+    """Краткое наименование из кавычек или исходное название"""
+    if not full_name:
+        return ""
+    for pattern in _SHORT_NAME_PATTERNS:
+        match = pattern.search(full_name)
+        if match:
+            return match.group(1)
+    return full_name
+
+
+def full_form(name):
+    """Полная форма организации в творительном падеже"""
+    if not name:
+        return ""
+    for pattern, form in _FULL_FORMS:
+        if pattern.search(name):
+            return form
+    return DEFAULT_FULL_FORM
+
+
+class ContractorNames:
+    """Нормализация названий контрагентов с кэшем по исходному названию
+
+    Один экземпляр живет в течение обработки одного файла: поставщики повторяются
+    в тысячах строк, а регулярные выражения выполняются один раз на название.
+    """
+
+    def __init__(self):
+        self._cache = {}
+
+    def __len__(self):
+        return len(self._cache)
+
+    def normalize(self, raw_name):
+        """(очищенное название, краткое наименование, полная форма организации)"""
+        result = self._cache.get(raw_name)
+        if result is None:
+            cleaned = clean_name(raw_name)
+            if isinstance(cleaned, str):
+                result = (cleaned, short_name(cleaned), full_form(cleaned))
+            else:
+                result = (cleaned, "", "")
+            self._cache[raw_name] = result
+        return result
+
+    def clean_column(self, names):
+        """Очищенные названия для колонки; нормализуются только уникальные значения"""
+        codes, uniques = pd.factorize(names, use_na_sentinel=False)
+        cleaned = [self.normalize(name)[0] for name in uniques]
+        return [cleaned[code] for code in codes]
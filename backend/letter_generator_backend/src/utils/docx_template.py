@@ -0,0 +1,164 @@
+import re
+import struct
+import zlib
+import zipfile
+from io import BytesIO
+from xml.sax.saxutils import escape
+
+DOCUMENT_PART = 'word/document.xml'
+PLACEHOLDER_PATTERN = re.compile(r'\{\{(\w+)\}\}')
+# Метка, на место которой выводятся повторяемые строки таблицы
+ROWS_FIELD = 'table_rows'
+
+# Структуры заголовков ZIP (см. APPNOTE.TXT), те же, что использует модуль zipfile
+_LOCAL_HEADER = struct.Struct('<4s2B4HL2L2H')
+_CENTRAL_HEADER = struct.Struct('<4s4B4HL2L5H2L')
+_END_RECORD = struct.Struct('<4s4H2LH')
+_ZIP_VERSION = 20
+
+
+def placeholder(name):
+    """Метка поля шаблона, которая подставляется при рендеринге"""
+    return '{{' + name + '}}'
+
+
+class _Member:
+    """Элемент ZIP-пакета с уже сжатыми данными"""
+
+    def __init__(self, filename, crc, file_size, compressed):
+        self.filename = filename.encode('utf-8')
+        self.crc = crc
+        self.file_size = file_size
+        self.compressed = compressed
+
+    @classmethod
+    def deflate(cls, filename, data):
+        return cls.deflate_chunks(filename, [data])
+
+    @classmethod
+    def deflate_chunks(cls, filename, chunks):
+        """Сжатие по частям: в памяти держится только сжатый результат"""
+        compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+        compressed = []
+        crc = 0
+        size = 0
+        for chunk in chunks:
+            crc = zlib.crc32(chunk, crc)
+            size += len(chunk)
+            compressed.append(compressor.compress(chunk))
+        compressed.append(compressor.flush())
+        return cls(filename, crc, size, b''.join(compressed))
+
+
+class DocxTemplate:
+    """Скомпилированный документ: статичные части пакета сжимаются один раз,
+    при рендеринге в document.xml подставляются только поля-метки
+
+    Если задан row_fields, строка таблицы с метками этих полей становится шаблоном
+    строки и повторяется для каждого элемента rows при рендеринге.
+    """
+
+    def __init__(self, document, row_fields=None):
+        buffer = BytesIO()
+        document.save(buffer)
+
+        self.members = []
+        self.document_index = None
+        with zipfile.ZipFile(buffer) as package:
+            for info in package.infolist():
+                data = package.read(info.filename)
+                if info.filename == DOCUMENT_PART:
+                    self.document_index = len(self.members)
+                    self.members.append(None)
+                    xml = data.decode('utf-8')
+                else:
+                    self.members.append(_Member.deflate(info.filename, data))
+
+        # Подставленные значения могут начинаться или заканчиваться пробелом
+        xml = xml.replace('<w:t>', '<w:t xml:space="preserve">')
+
+        self.row_chunks = None
+        if row_fields:
+            xml, row_xml = _cut_table_row(xml, placeholder(row_fields[0]))
+            row_chunks = PLACEHOLDER_PATTERN.split(row_xml)
+            positions = {field: i for i, field in enumerate(row_fields)}
+            self.row_chunks = row_chunks
+            self.row_slots = [(i, positions[name]) for i, name in enumerate(row_chunks) if i % 2]
+
+        # Нечетные элементы - имена полей, четные - неизменный XML между ними
+        self.chunks = PLACEHOLDER_PATTERN.split(xml)
+        self.fields = set(self.chunks[1::2])
+
+    def iter_xml(self, values, rows=(), batch_size=500):
+        """document.xml по частям; строки таблицы выдаются пачками по batch_size"""
+        parts = []
+        for i, chunk in enumerate(self.chunks):
+            if i % 2 == 0:
+                parts.append(chunk)
+            elif chunk == ROWS_FIELD:
+                yield ''.join(parts)
+                parts = []
+                yield from self._iter_rows(rows, batch_size)
+            else:
+                parts.append(escape(str(values[chunk])))
+        yield ''.join(parts)
+
+    def _iter_rows(self, rows, batch_size):
+        row_chunks = list(self.row_chunks)
+        batch = []
+        for row in rows:
+            for i, position in self.row_slots:
+                row_chunks[i] = escape(row[position])
+            batch.append(''.join(row_chunks))
+            if len(batch) >= batch_size:
+                yield ''.join(batch)
+                batch = []
+        if batch:
+            yield ''.join(batch)
+
+    def render(self, values, rows=()):
+        """Готовый .docx в виде байтов; rows - кортежи строковых значений для повторяемой строки"""
+        document = _Member.deflate_chunks(
+            DOCUMENT_PART, (chunk.encode('utf-8') for chunk in self.iter_xml(values, rows))
+        )
+        members = list(self.members)
+        members[self.document_index] = document
+        return _build_zip(members)
+
+    def save(self, output_path, values, rows=()):
+        with open(output_path, 'wb') as f:
+            f.write(self.render(values, rows))
+
+
+def _cut_table_row(xml, marker):
+    """Вырезает строку таблицы с меткой marker, оставляя на ее месте метку строк"""
+    marker_position = xml.index(marker)
+    start = max(xml.rfind('<w:tr>', 0, marker_position), xml.rfind('<w:tr ', 0, marker_position))
+    end = xml.index('</w:tr>', marker_position) + len('</w:tr>')
+    return xml[:start] + placeholder(ROWS_FIELD) + xml[end:], xml[start:end]
+
+
+def _build_zip(members):
+    # Дата 1980-01-01 00:00, как у zipfile для файлов без даты
+    dos_time, dos_date = 0, (1 << 5) | 1
+    local_parts = []
+    central_parts = []
+    offset = 0
+
+    for member in members:
+        local_header = _LOCAL_HEADER.pack(
+            b'PK\003\004', _ZIP_VERSION, 0, 0, zipfile.ZIP_DEFLATED, dos_time, dos_date,
+            member.crc, len(member.compressed), member.file_size, len(member.filename), 0
+        )
+        local_parts += [local_header, member.filename, member.compressed]
+        central_parts += [_CENTRAL_HEADER.pack(
+            b'PK\001\002', _ZIP_VERSION, 0, _ZIP_VERSION, 0, 0, zipfile.ZIP_DEFLATED, dos_time, dos_date,
+            member.crc, len(member.compressed), member.file_size, len(member.filename), 0, 0, 0, 0, 0, offset
+        ), member.filename]
+        offset += len(local_header) + len(member.filename) + len(member.compressed)
+
+    central_directory = b''.join(central_parts)
+    end_record = _END_RECORD.pack(
+        b'PK\005\006', 0, 0, len(members), len(members), len(central_directory), offset, 0
+    )
+    return b''.join(local_parts) + central_directory + end_record
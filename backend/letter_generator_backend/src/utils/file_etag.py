@@ -0,0 +1,52 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+from src.utils.parse_cache import file_sha256
+
+
+class FileETags:
+    """Сильные ETag файлов по SHA-256 содержимого
+
+    Хеш вычисляется один раз и запоминается по пути, размеру и времени изменения файла,
+    поэтому повторные запросы того же файла не читают его с диска. Хранится не больше
+    max_entries записей, давно не запрошенные вытесняются первыми.
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, path):
+        stat = os.stat(path)
+        key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            etag = self._entries.get(key)
+            if etag is not None:
+                self._entries.move_to_end(key)
+                return etag
+
+        etag = file_sha256(path)
+        with self._lock:
+            self._entries[key] = etag
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return etag
+
+    @staticmethod
+    def combined(files):
+        """ETag набора файлов (архива) по именам, размерам и времени изменения
+
+        Файлы не читаются, поэтому архив начинает отдаваться сразу, каким бы большим он ни был.
+        Изменение любого файла меняет его размер или mtime, а значит и ETag.
+        """
+        digest = hashlib.sha256()
+        for name, path in files:
+            stat = os.stat(path)
+            digest.update(f"{name}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode('utf-8'))
+        return digest.hexdigest()
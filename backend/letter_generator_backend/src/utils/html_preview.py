@@ -0,0 +1,123 @@
+import threading
+from collections import OrderedDict
+from html import escape
+
+from docx.enum.text import WD_ALIGN_PARAGRAPH
+from docx.table import Table
+from docx.text.paragraph import Paragraph
+
+from src.utils.docx_template import PLACEHOLDER_PATTERN, ROWS_FIELD, placeholder
+
+_ALIGNMENTS = {
+    WD_ALIGN_PARAGRAPH.CENTER: 'center',
+    WD_ALIGN_PARAGRAPH.RIGHT: 'right',
+    WD_ALIGN_PARAGRAPH.JUSTIFY: 'justify',
+}
+# Заголовки документа: стиль python-docx → тег
+_HEADING_TAGS = {'Title': 'h3', 'Heading 1': 'h4', 'Heading 2': 'h5'}
+
+
+def _text_html(text):
+    return escape(text, quote=False).replace('\n', '<br>')
+
+
+def _paragraph_html(paragraph):
+    runs = []
+    for run in paragraph.runs:
+        text = _text_html(run.text)
+        runs.append(f"<b>{text}</b>" if run.bold else text)
+    tag = _HEADING_TAGS.get(paragraph.style.name, 'p')
+    alignment = _ALIGNMENTS.get(paragraph.alignment)
+    style = f' style="text-align: {alignment}"' if alignment else ''
+    return f"<{tag}{style}>{''.join(runs)}</{tag}>"
+
+
+def _table_html(table, row_fields):
+    rows = []
+    for index, row in enumerate(table.rows):
+        cells_html = ''.join(f"<td>{_text_html(cell.text)}</td>" for cell in row.cells)
+        if index == 0:
+            rows.append('<thead><tr>' + cells_html.replace('<td>', '<th>').replace('</td>', '</th>') + '</tr></thead><tbody>')
+        elif row_fields and placeholder(row_fields[0]) in cells_html:
+            rows.append(placeholder(ROWS_FIELD))
+        else:
+            rows.append(f"<tr>{cells_html}</tr>")
+    return f"<table>{''.join(rows)}</tbody></table>"
+
+
+class HtmlTemplate:
+    """HTML-фрагмент документа с полями-метками, собранный из того же документа, что и DocxTemplate
+
+    Сохраняются абзацы, выравнивание, жирные фрагменты и таблицы; строка таблицы
+    с метками row_fields повторяется для каждого элемента rows при рендеринге.
+    """
+
+    def __init__(self, document, row_fields=None):
+        parts = []
+        for child in document.element.body.iterchildren():
+            if child.tag.endswith('}p'):
+                parts.append(_paragraph_html(Paragraph(child, document)))
+            elif child.tag.endswith('}tbl'):
+                parts.append(_table_html(Table(child, document), row_fields))
+        html = '\n'.join(parts)
+
+        self.row_chunks = None
+        if row_fields:
+            row_html = '<tr>' + ''.join(f"<td>{placeholder(field)}</td>" for field in row_fields) + '</tr>'
+            self.row_chunks = PLACEHOLDER_PATTERN.split(row_html)
+
+        # Нечетные элементы - имена полей, четные - неизменный HTML между ними
+        self.chunks = PLACEHOLDER_PATTERN.split(html)
+
+    def render(self, values, rows=()):
+        parts = []
+        for i, chunk in enumerate(self.chunks):
+            if i % 2 == 0:
+                parts.append(chunk)
+            elif chunk == ROWS_FIELD:
+                parts.extend(self._render_rows(rows))
+            else:
+                parts.append(_text_html(str(values[chunk])))
+        return ''.join(parts)
+
+    def _render_rows(self, rows):
+        row_chunks = list(self.row_chunks)
+        for row in rows:
+            # Поля строки идут в row_chunks в порядке row_fields
+            for i, value in enumerate(row):
+                row_chunks[2 * i + 1] = _text_html(value)
+            yield ''.join(row_chunks)
+
+
+class PreviewCache:
+    """LRU-кэш готовых HTML-фрагментов по отпечатку письма с ограничением по размеру"""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            html = self._entries.get(key)
+            if html is not None:
+                self._entries.move_to_end(key)
+            return html
+
+    def put(self, key, html):
+        size = len(html)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= len(previous)
+            self._entries[key] = html
+            self._size += size
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
@@ -0,0 +1,60 @@
+import hashlib
+import json
+import os
+import shutil
+
+from src.utils.letter_generator_utils import is_consolidated
+from src.utils.rendering import appendix_xlsx_filename, letter_output_files
+
+# Версия оформления документов: меняется при изменении шаблонов, чтобы сбросить все отпечатки
+RENDER_VERSION = 2
+
+
+def letter_key(letter_data):
+    """Ключ письма между запусками: контрагент и номер заказа, для сводного письма - контрагент и БЕ"""
+    if is_consolidated(letter_data):
+        return f"{letter_data['contractor_name']}_{letter_data['be_name']}_*"
+    return f"{letter_data['contractor_name']}_{letter_data['order_number']}"
+
+
+def letter_fingerprint(number, letter_data, as_of_date, xlsx_threshold=None):
+    """SHA-256 всего, что попадает в документы письма
+
+    Учитываются позиции, данные СЭД, суммы и дата письма. Номер письма влияет на содержимое
+    только через имя XLSX-приложения, поэтому учитывается лишь тогда, когда оно создается.
+
+    Дата письма и зависящие от нее days_overdue и пени входят в отпечаток намеренно: дата
+    печатается в тексте письма («По состоянию на ...»), а дни просрочки и пени - в приложении,
+    так что документы на другую дату отличаются у всех писем. Файлы переиспользуются при
+    повторных запусках на ту же дату, например после исправления части строк отчетности.
+    """
+    payload = {
+        'version': RENDER_VERSION,
+        'letter': letter_data,
+        'as_of_date': as_of_date.strftime('%d.%m.%Y'),
+        'xlsx_filename': appendix_xlsx_filename(number, letter_data, xlsx_threshold)
+    }
+    encoded = json.dumps(payload, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+def reuse_letter_files(previous_files, previous_folder, number, letter_data, output_folder, xlsx_threshold=None):
+    """Переносит файлы неизменившегося письма из прежнего результата под новыми именами
+
+    Файлы связываются жесткими ссылками, при невозможности - копируются.
+    Возвращает список файлов или None, если прежних файлов уже нет.
+    """
+    files = letter_output_files(number, letter_data, xlsx_threshold)
+    if len(files) != len(previous_files):
+        return None
+    sources = [os.path.join(previous_folder, filename) for filename in previous_files]
+    if not all(os.path.isfile(source) for source in sources):
+        return None
+
+    for source, filename in zip(sources, files):
+        target = os.path.join(output_folder, filename)
+        try:
+            os.link(source, target)
+        except OSError:
+            shutil.copyfile(source, target)
+    return files
@@ -0,0 +1,44 @@
+import pandas as pd
+
+# Колонки выгрузки робота (индексы начинаются с 0)
+REPORTING_ORDER_COL = 5  # Номер заказа
+REPORTING_MATERIAL_COL = 9  # Материал
+REPORTING_MATERIAL_NAME_COL = 10  # Наименование материала
+REPORTING_PPZ_COL = 11  # ППЗ
+REPORTING_QUANTITY_COL = 13  # Количество заказа
+REPORTING_AMOUNT_COL = 15  # Сумма (цена) без НДС
+REPORTING_CONTRACTOR_COL = 16  # Наименование поставщика
+REPORTING_PLANNED_DATE_COL = 19  # Дата поставки по спецификации
+REPORTING_ACTUAL_DATE_COL = 24  # Дата оприходования в системе
+
+REPORTING_COLUMNS = [
+    REPORTING_ORDER_COL, REPORTING_MATERIAL_COL, REPORTING_MATERIAL_NAME_COL, REPORTING_PPZ_COL,
+    REPORTING_QUANTITY_COL, REPORTING_AMOUNT_COL, REPORTING_CONTRACTOR_COL, REPORTING_PLANNED_DATE_COL,
+    REPORTING_ACTUAL_DATE_COL
+]
+
+# Колонки файла СЭД
+SED_BE_NAME_COL = 2  # Колонка C: Название БЕ
+SED_ORDER_COL = 5  # Колонка F: Номер заказа
+SED_REG_NUMBER_COL = 7  # Колонка H: Регистрационный номер
+SED_REG_DATE_COL = 15  # Колонка P: Дата регистрации
+
+SED_COLUMNS = [SED_BE_NAME_COL, SED_ORDER_COL, SED_REG_NUMBER_COL, SED_REG_DATE_COL]
+
+# Номер строки листа с первой строкой данных (первая строка - заголовок)
+FIRST_DATA_ROW = 2
+
+
+def select_columns(df, positions):
+    """Оставляет только нужные колонки таблицы; метками колонок становятся их исходные индексы"""
+    present = [position for position in positions if position < df.shape[1]]
+    selected = df.iloc[:, present]
+    selected.columns = present
+    return selected
+
+
+def column(df, position, default=None):
+    """Колонка выбранной таблицы по исходному индексу или колонка значений по умолчанию"""
+    if position in df.columns:
+        return df[position]
+    return pd.Series([default] * len(df), index=df.index, dtype=object)
@@ -1,428 +1,878 @@
+import numpy as np
 import pandas as pd
-import re
 from datetime import datetime, timedelta
+from itertools import islice
+from decimal import Decimal
 from docx import Document
 from docx.shared import Inches
 from docx.enum.text import WD_ALIGN_PARAGRAPH
+from openpyxl import Workbook
 import os
+import logging
+from src.utils.sed_index import SedIndex
+from src.utils.xlsb_reader import read_xlsb_columns
+from src.utils.input_columns import (
+    REPORTING_COLUMNS, SED_COLUMNS, REPORTING_ORDER_COL, REPORTING_MATERIAL_COL, REPORTING_MATERIAL_NAME_COL,
+    REPORTING_PPZ_COL, REPORTING_QUANTITY_COL, REPORTING_AMOUNT_COL, REPORTING_CONTRACTOR_COL,
+    REPORTING_PLANNED_DATE_COL, REPORTING_ACTUAL_DATE_COL, FIRST_DATA_ROW, select_columns, column
+)
+from src.utils.docx_template import DocxTemplate, placeholder
+from src.utils.html_preview import HtmlTemplate
+from src.utils.metrics import StageClock
+from src.utils.rejections import REJECTION_CODES, rejection_counts
+from src.utils.penalty import calculate_penalties, calculate_penalties_exact, calculate_penalty_exact, penalty_factors
+from src.utils.amount_words import number_to_words, amount_to_words
+from src.utils.contractor_names import ContractorNames, clean_name, short_name, full_form
+
+logger = logging.getLogger(__name__)
 
 def clean_contractor_name(name):
     """Удаляет первые 10 цифр из названия контрагента"""
-    if isinstance(name, str):
-        # Удаляем первые 10 значное число в начале
-        cleaned = re.sub(r'^\d{10}\s*', '', name).strip()
-        return cleaned
-    return name
+    return clean_name(name)
 
 def get_contractor_short_name(full_name):
     """Получает сокращенное наименование контрагента"""
-    if not full_name:
-        return ""
-    
-    # Ищем ООО, АО, ЗАО и т.д.
-    patterns = [
-        r'Общество с ограниченной ответственностью\s*"([^"]+)"',
-        r'ООО\s*"([^"]+)"',
-        r'Акционерное общество\s*"([^"]+)"',
-        r'АО\s*"([^"]+)"',
-        r'Закрытое акционерное общество\s*"([^"]+)"',
-        r'ЗАО\s*"([^"]+)"'
-    ]
-    
-    for pattern in patterns:
-        match = re.search(pattern, full_name, re.IGNORECASE)
-        if match:
-            return match.group(1)
-    
-    # Если не найдено, возвращаем исходное название
-    return full_name
+    return short_name(full_name)
 
 def get_contractor_full_form(name):
     """Определяет полную форму организации"""
-    if not name:
-        return ""
-    
-    name_lower = name.lower()
-    if 'ооо' in name_lower or 'общество с ограниченной ответственностью' in name_lower:
-        return 'Обществом с ограниченной ответственностью'
-    elif 'ао' in name_lower or 'акционерное общество' in name_lower:
-        return 'Акционерным обществом'
-    elif 'зао' in name_lower or 'закрытое акционерное общество' in name_lower:
-        return 'Закрытым акционерным обществом'
-    else:
-        return 'организацией'
+    return full_form(name)
 
-def calculate_penalty(amount, days_overdue):
+def calculate_penalty(amount, days_overdue, exact=False):
     """Расчет пени с учетом сложного процента"""
+    if exact:
+        return calculate_penalty_exact(amount, days_overdue)
     if days_overdue <= 0:
         return 0
-    
-    penalty = 0
-    remaining_days = days_overdue
-    current_amount = float(amount)
-    
-    # Первые 14 дней - 0.1% в день
-    if remaining_days > 0:
-        days_first_period = min(remaining_days, 14)
-        for day in range(days_first_period):
-            daily_penalty = current_amount * 0.001  # 0.1%
-            penalty += daily_penalty
-            current_amount += daily_penalty
-        remaining_days -= days_first_period
-    
-    # После 14 дней - 0.5% в день
-    if remaining_days > 0:
-        for day in range(remaining_days):
-            daily_penalty = current_amount * 0.005  # 0.5%
-            penalty += daily_penalty
-            current_amount += daily_penalty
-    
-    return penalty
+    return float(calculate_penalties([amount], [days_overdue])[0])
 
 def number_to_words_russian(number):
     """Преобразование числа в слова на русском языке"""
-    
-    def num_to_words(n):
-        if n == 0:
-            return "ноль"
-        
-        ones = ["", "один", "два", "три", "четыре", "пять", "шесть", "семь", "восемь", "девять",
-                "десять", "одиннадцать", "двенадцать", "тринадцать", "четырнадцать", "пятнадцать",
-                "шестнадцать", "семнадцать", "восемнадцать", "девятнадцать"]
-        
-        tens = ["", "", "двадцать", "тридцать", "сорок", "пятьдесят", "шестьдесят", "семьдесят", "восемьдесят", "девяносто"]
-        
-        hundreds = ["", "сто", "двести", "триста", "четыреста", "пятьсот", "шестьсот", "семьсот", "восемьсот", "девятьсот"]
-        
-        def convert_hundreds(num):
-            result = []
-            if num >= 100:
-                result.append(hundreds[num // 100])
-                num %= 100
-            if num >= 20:
-                result.append(tens[num // 10])
-                num %= 10
-            if num > 0:
-                result.append(ones[num])
-            return " ".join(result)
-        
-        if n < 1000:
-            return convert_hundreds(n)
-        elif n < 1000000:
-            thousands_part = n // 1000
-            remainder = n % 1000
-            result = convert_hundreds(thousands_part)
-            if thousands_part % 10 == 1 and thousands_part % 100 != 11:
-                result += " тысяча"
-            elif thousands_part % 10 in [2, 3, 4] and thousands_part % 100 not in [12, 13, 14]:
-                result += " тысячи"
-            else:
-                result += " тысяч"
-            if remainder > 0:
-                result += " " + convert_hundreds(remainder)
-            return result
-        else:
-            millions_part = n // 1000000
-            remainder = n % 1000000
-            result = convert_hundreds(millions_part)
-            if millions_part % 10 == 1 and millions_part % 100 != 11:
-                result += " миллион"
-            elif millions_part % 10 in [2, 3, 4] and millions_part % 100 not in [12, 13, 14]:
-                result += " миллиона"
-            else:
-                result += " миллионов"
-            if remainder > 0:
-                if remainder >= 1000:
-                    thousands_part = remainder // 1000
-                    hundreds_part = remainder % 1000
-                    result += " " + convert_hundreds(thousands_part)
-                    if thousands_part % 10 == 1 and thousands_part % 100 != 11:
-                        result += " тысяча"
-                    elif thousands_part % 10 in [2, 3, 4] and thousands_part % 100 not in [12, 13, 14]:
-                        result += " тысячи"
-                    else:
-                        result += " тысяч"
-                    if hundreds_part > 0:
-                        result += " " + convert_hundreds(hundreds_part)
-                else:
-                    result += " " + convert_hundreds(remainder)
-            return result
-    
-    return num_to_words(int(number))
+    return number_to_words(int(number))
 
 def format_amount_in_words(amount):
     """Форматирование суммы прописью"""
-    rubles = int(amount)
-    kopecks = int(round((amount - rubles) * 100))
-    
-    rubles_words = number_to_words_russian(rubles)
+    return amount_to_words(amount)
+
+def read_reporting_file(reporting_path):
+    """Чтение нужных колонок файла отчетности из выгрузки робота (формат xlsb)
     
-    # Склонение рублей
-    if rubles % 10 == 1 and rubles % 100 != 11:
-        ruble_form = "рубль"
-    elif rubles % 10 in [2, 3, 4] and rubles % 100 not in [12, 13, 14]:
-        ruble_form = "рубля"
-    else:
-        ruble_form = "рублей"
+    Индекс таблицы - номера строк листа, по ним строки указываются в отчете об отброшенных строках.
+    """
+    if reporting_path.lower().endswith(('.xlsx', '.xls')):
+        # pandas сохраняет пустые строки между данными, поэтому номер строки определяется по позиции
+        df = select_columns(pd.read_excel(reporting_path), REPORTING_COLUMNS)
+        df.index = pd.RangeIndex(FIRST_DATA_ROW, FIRST_DATA_ROW + len(df))
+        return df
     
-    # Склонение копеек
-    if kopecks % 10 == 1 and kopecks % 100 != 11:
-        kopeck_form = "копейка"
-    elif kopecks % 10 in [2, 3, 4] and kopecks % 100 not in [12, 13, 14]:
-        kopeck_form = "копейки"
+    # Выгрузку робота читаем потоково, сразу оставляя только нужные колонки
+    return read_xlsb_columns(
+        reporting_path,
+        REPORTING_COLUMNS,
+        date_columns=(REPORTING_PLANNED_DATE_COL, REPORTING_ACTUAL_DATE_COL),
+        float_columns=(REPORTING_AMOUNT_COL,)
+    )
+
+def read_sed_file(sed_path):
+    """Чтение нужных колонок файла СЭД"""
+    return select_columns(pd.read_excel(sed_path), SED_COLUMNS)
+
+def read_input_frames(reporting_path, sed_path, stats, parse_cache=None, input_hashes=None):
+    """Нужные колонки отчетности и СЭД; с parse_cache - из кэша по хешу содержимого файла
+
+    input_hashes - известные хеши файлов по ролям ('reporting', 'sed'), чтобы не читать файлы ради хеша.
+    """
+    clock = StageClock(stats)
+    if parse_cache is not None:
+        input_hashes = input_hashes or {}
+        reporting_df, reporting_cached = parse_cache.load_or_read(
+            'reporting', reporting_path, read_reporting_file, input_hashes.get('reporting')
+        )
+        clock.lap('read_reporting')
+        sed_df, sed_cached = parse_cache.load_or_read('sed', sed_path, read_sed_file, input_hashes.get('sed'))
+        clock.lap('read_sed')
+        stats['parse_cache_hits'] = int(reporting_cached) + int(sed_cached)
     else:
-        kopeck_form = "копеек"
-    
-    return f"{rubles_words} {ruble_form} {kopecks:02d} {kopeck_form}"
+        reporting_df = read_reporting_file(reporting_path)
+        clock.lap('read_reporting')
+        sed_df = read_sed_file(sed_path)
+        clock.lap('read_sed')
+    return reporting_df, sed_df
 
-def process_reporting_data(reporting_path, sed_path):
-    """Обработка данных из файлов отчетности и СЭД"""
+def process_reporting_data(reporting_path, sed_path, stats=None, parse_cache=None, current_date=None, consolidate=False,
+                           rejections=None, exact_penalty=False, input_hashes=None):
+    """Обработка данных из файлов отчетности и СЭД
+    
+    Если передан parse_cache, прочитанные колонки берутся из кэша по хешу содержимого файла
+    (input_hashes - уже известные хеши, см. read_input_frames).
+    current_date - дата, на которую определяется просрочка (по умолчанию - текущая).
+    При consolidate=True формируется одно сводное письмо на поставщика и БЕ (см. consolidate_letters).
+    В rejections (RejectionReport), если передан, собираются отброшенные строки с причинами.
+    При exact_penalty=True пени считаются в Decimal с округлением до копеек (для писем, уходящих контрагентам).
+    """
     try:
-        # Читаем файл отчетности из выгрузки робота (формат xlsb)
-        reporting_df = pd.read_excel(reporting_path, engine='pyxlsb')
+        if stats is None:
+            stats = {}
+        reporting_df, sed_df = read_input_frames(reporting_path, sed_path, stats, parse_cache, input_hashes)
+        letters = process_selected_frames(
+            reporting_df, sed_df, current_date=current_date, exact_penalty=exact_penalty, stats=stats,
+            rejections=rejections
+        )
+        if consolidate:
+            clock = StageClock(stats)
+            letters = consolidate_letters(letters)
+            clock.lap('consolidate')
+        return letters
         
-        # Читаем файл СЭД
-        sed_df = pd.read_excel(sed_path)
-        
-        current_date = datetime.now()
-        processed_data = {}
+    except Exception as e:
+        raise Exception(f"Ошибка при обработке файлов: {str(e)}")
+
+def _parse_dates(values):
+    """Векторное преобразование колонки в даты, нераспознанные значения становятся NaT"""
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values
+    if pd.api.types.is_numeric_dtype(values):
+        return pd.to_datetime(values, errors='coerce')
+    return pd.to_datetime(values, errors='coerce', format='mixed')
+
+def process_reporting_frames(reporting_df, sed_df, current_date=None, exact_penalty=False, stats=None, rejections=None):
+    """Обработка уже прочитанных таблиц отчетности и СЭД в исходном виде (как из pd.read_excel)"""
+    selected = select_columns(reporting_df, REPORTING_COLUMNS)
+    selected.index = pd.RangeIndex(FIRST_DATA_ROW, FIRST_DATA_ROW + len(selected))
+    return process_selected_frames(
+        selected,
+        select_columns(sed_df, SED_COLUMNS),
+        current_date=current_date,
+        exact_penalty=exact_penalty,
+        stats=stats,
+        rejections=rejections
+    )
+
+def _select_overdue_rows(reporting_df, sed_df, current_date, stats, clock, rejections=None):
+    """Строки, просроченные на current_date и найденные в СЭД
+    
+    Возвращает словарь с индексами строк rows, колонками таблицы и записями СЭД по заказам
+    или None, если таких строк нет. Число отброшенных строк по причинам пишется в stats['rows_rejected'],
+    а сами строки, если передан rejections (RejectionReport), - в отчет.
+    """
+    stats['rows_parsed'] = len(reporting_df)
+    stats['rows_invalid'] = 0
+    stats['rows_unmatched_sed'] = 0
+    
+    # Индекс СЭД строится один раз вместо поиска по всей таблице для каждой строки
+    sed_index = SedIndex(sed_df)
+    if sed_index.duplicates:
+        logger.warning(
+            "В файле СЭД повторяются номера заказов (%d шт.), используется первая запись: %s",
+            len(sed_index.duplicates), ', '.join(map(str, sed_index.duplicates[:10]))
+        )
+    
+    order_number = column(reporting_df, REPORTING_ORDER_COL)
+    contractor_name = column(reporting_df, REPORTING_CONTRACTOR_COL)
+    planned_raw = column(reporting_df, REPORTING_PLANNED_DATE_COL)
+    actual_raw = column(reporting_df, REPORTING_ACTUAL_DATE_COL)
+    amount_raw = column(reporting_df, REPORTING_AMOUNT_COL, 0)
+    
+    # Все вычисления ведутся над колонками целиком
+    planned_date = _parse_dates(planned_raw)
+    actual_date = _parse_dates(actual_raw)
+    amount = pd.to_numeric(amount_raw, errors='coerce').to_numpy(dtype=float)
+    
+    has_actual = actual_raw.notna().to_numpy()
+    order_missing = order_number.isna().to_numpy()
+    contractor_missing = contractor_name.isna().to_numpy()
+    planned_missing = planned_raw.isna().to_numpy()
+    # Нераспознанная фактическая дата делает строку непригодной, как и нераспознанная плановая
+    date_unparsable = (~planned_missing & planned_date.isna().to_numpy()) | (has_actual & actual_date.isna().to_numpy())
+    valid = ~(order_missing | contractor_missing | planned_missing | date_unparsable)
+    stats['rows_invalid'] = int(len(valid) - np.count_nonzero(valid))
+    
+    planned_ns = planned_date.to_numpy(dtype='datetime64[ns]')
+    actual_ns = actual_date.to_numpy(dtype='datetime64[ns]')
+    current_ns = np.datetime64(pd.Timestamp(current_date).to_datetime64(), 'ns')
+    
+    # Нет фактической даты - сравниваем с текущей датой, иначе - с фактической
+    reference_ns = np.where(has_actual, actual_ns, current_ns)
+    overdue_by_date = valid & (reference_ns > planned_ns)
+    is_overdue = overdue_by_date & (amount > 0)
+    
+    # Причина отбрасывания каждой строки (0 - не отброшена); непросроченные строки не отбрасываются
+    codes = np.select(
+        [order_missing, contractor_missing, planned_missing, date_unparsable, overdue_by_date & ~is_overdue],
+        [REJECTION_CODES['missing_order_number'], REJECTION_CODES['missing_contractor'],
+         REJECTION_CODES['missing_planned_date'], REJECTION_CODES['unparsable_date'],
+         REJECTION_CODES['non_positive_amount']],
+        0
+    ).astype(np.int8)
+    
+    rows = np.flatnonzero(is_overdue)
+    clock.lap('prepare')
+    
+    sed_records = {}
+    if len(rows) > 0:
+        # Ищем данные в файле СЭД по индексу
+        matched = order_number.iloc[rows].map(sed_index.positions).notna().to_numpy()
+        rows = rows[matched]
         
-        # Обрабатываем каждую строку отчетности
-        for index, row in reporting_df.iterrows():
+        unique_orders = pd.unique(order_number.iloc[rows])
+        for order in unique_orders:
             try:
-                order_number = row.iloc[5] if len(row) > 5 else None  # Номер заказа
-                contractor_name = row.iloc[16] if len(row) > 16 else None  # Наименование поставщика
-                planned_date = row.iloc[19] if len(row) > 19 else None  # Дата поставки по спецификации
-                actual_date = row.iloc[24] if len(row) > 24 else None  # Дата оприходования в системе
-                amount = row.iloc[15] if len(row) > 15 else 0  # Сумма без НДС
-
-                # Дополнительные поля для приложения
-                material = row.iloc[9] if len(row) > 9 else ""  # Материал
-                material_name = row.iloc[10] if len(row) > 10 else ""  # Наименование материала
-                order_quantity = row.iloc[13] if len(row) > 13 else 0  # Количество заказа
-                price_without_vat = row.iloc[15] if len(row) > 15 else 0  # Цена без НДС
-                ppz = row.iloc[11] if len(row) > 11 else ""  # ППЗ
-                
-                if pd.isna(order_number) or pd.isna(planned_date) or pd.isna(contractor_name):
-                    continue
-                
-                # Преобразуем даты в datetime объекты, обрабатывая NaT
-                planned_date_dt = pd.to_datetime(planned_date)
-                actual_date_dt = pd.to_datetime(actual_date) if pd.notna(actual_date) else None
-
-                if pd.isna(planned_date_dt):
-                    continue # Пропускаем строки без валидной плановой даты
-
-                # Определяем просрочку
-                is_overdue = False
-                days_overdue = 0
-                category = ''
-                
-                if actual_date_dt is None:
-                    # Нет фактической даты - сравниваем с текущей датой
-                    if current_date > planned_date_dt:
-                        is_overdue = True
-                        days_overdue = (current_date - planned_date_dt).days
-                        category = 'просрочено не поставлено'
-                else:
-                    # Есть фактическая дата
-                    if actual_date_dt > planned_date_dt:
-                        is_overdue = True
-                        days_overdue = (actual_date_dt - planned_date_dt).days
-                        category = 'поставленные просрочки'
-                
-                if is_overdue and amount > 0:
-                    # Очищаем название контрагента
-                    clean_contractor = clean_contractor_name(contractor_name)
-                    
-                    # Ищем данные в файле СЭД
-                    sed_row = sed_df[sed_df.iloc[:, 5] == order_number]  # Колонка F (индекс 5)
-                    
-                    if not sed_row.empty:
-                        be_name = sed_row.iloc[0, 2] if len(sed_row.iloc[0]) > 2 else ""  # Колонка C
-                        reg_number = str(sed_row.iloc[0, 7]) if len(sed_row.iloc[0]) > 7 and pd.notna(sed_row.iloc[0, 7]) else ""  # Колонка H
-                        reg_date_raw = sed_row.iloc[0, 15] if len(sed_row.iloc[0]) > 15 else None  # Колонка P
-                        reg_date = pd.to_datetime(reg_date_raw).strftime('%d.%m.%Y') if pd.notna(reg_date_raw) else ""
-                        
-                        # Группируем по контрагенту и заказу
-                        key = f"{clean_contractor}_{order_number}"
-                        
-                        if key not in processed_data:
-                            processed_data[key] = {
-                                'order_number': order_number,
-                                'contractor_name': clean_contractor,
-                                'contractor_short_name': get_contractor_short_name(clean_contractor),
-                                'contractor_full_form': get_contractor_full_form(clean_contractor),
-                                'be_name': be_name,
-                                'reg_number': reg_number,
-                                'reg_date': reg_date,
-                                'planned_date': planned_date_dt.strftime('%d.%m.%Y'),
-                                'total_amount': 0,
-                                'total_penalty': 0,
-                                'total_positions': 0,
-                                'category': category,
-                                'positions': []
-                            }
-                        
-                        # Рассчитываем пени для позиции
-                        penalty = calculate_penalty(amount, days_overdue)
-                        
-                        # Добавляем позицию
-                        position_data = {
-                            'material': material,
-                            'material_name': material_name,
-                            'order_quantity': order_quantity,
-                            'price_without_vat': price_without_vat,
-                            'ppz': ppz,
-                            'amount': amount,
-                            'days_overdue': days_overdue,
-                            'penalty': penalty
-                        }
-                        
-                        processed_data[key]['positions'].append(position_data)
-                        processed_data[key]['total_amount'] += amount
-                        processed_data[key]['total_penalty'] += penalty
-                        processed_data[key]['total_positions'] += 1
-                        
+                sed_records[order] = sed_index.get(order)
             except Exception as e:
-                print(f"Ошибка обработки строки {index}: {str(e)}")
-                continue
-        
-        return list(processed_data.values())
+                logger.warning("Ошибка чтения записи СЭД для заказа %s: %s", order, e)
+        if len(sed_records) < len(unique_orders):
+            rows = rows[order_number.iloc[rows].isin(list(sed_records.keys())).to_numpy()]
+        stats['rows_unmatched_sed'] = int(np.count_nonzero(is_overdue) - len(rows))
+        clock.lap('sed_join')
+    
+    # Просроченные строки, для которых не нашлось записи СЭД
+    codes[is_overdue] = REJECTION_CODES['no_sed_match']
+    codes[rows] = 0
+    stats['rows_rejected'] = rejection_counts(codes)
+    if rejections is not None:
+        rejections.collect(codes, reporting_df.index, order_number, contractor_name, planned_raw, actual_raw, amount_raw)
+    clock.lap('rejections')
+    if len(rows) == 0:
+        return None
+    
+    return {
+        'rows': rows,
+        'order_number': order_number,
+        'contractor_name': contractor_name,
+        'planned_date': planned_date,
+        'planned_ns': planned_ns,
+        'actual_ns': actual_ns,
+        'has_actual': has_actual,
+        'reference_ns': reference_ns,
+        'amount': amount,
+        'sed_records': sed_records
+    }
+
+def _group_rows(selection, consolidate=False):
+    """Группировка отобранных строк по письмам в порядке первого появления ключа
+    
+    Ключ - контрагент и заказ, при consolidate=True - контрагент и БЕ заказа.
+    Возвращает заказы строк, кэш названий поставщиков, номера групп строк и первые строки групп.
+    """
+    rows = selection['rows']
+    orders = selection['order_number'].iloc[rows].tolist()
+    # Названия нормализуются один раз на поставщика, а не на строку
+    contractor_names = ContractorNames()
+    clean_contractors = contractor_names.clean_column(selection['contractor_name'].iloc[rows])
+    
+    if consolidate:
+        sed_records = selection['sed_records']
+        keys = [f"{contractor}_{sed_records[order]['be_name']}" for contractor, order in zip(clean_contractors, orders)]
+    else:
+        keys = [f"{contractor}_{order}" for contractor, order in zip(clean_contractors, orders)]
+    group_codes, _ = pd.factorize(pd.Series(keys, dtype=object))
+    first_rows = np.unique(group_codes, return_index=True)[1]
+    return orders, contractor_names, group_codes, first_rows
+
+def process_selected_frames(reporting_df, sed_df, current_date=None, exact_penalty=False, stats=None, rejections=None):
+    """Обработка таблиц после select_columns (метки колонок - их исходные индексы)
+    
+    При exact_penalty=True пени считаются в Decimal с округлением до копеек.
+    В словарь stats, если он передан, записываются счетчики обработки и время этапов,
+    в rejections (RejectionReport) - строки, не попавшие в письма, с причинами.
+    """
+    if current_date is None:
+        current_date = datetime.now()
+    if stats is None:
+        stats = {}
+    clock = StageClock(stats)
+    selection = _select_overdue_rows(reporting_df, sed_df, current_date, stats, clock, rejections)
+    if selection is None:
+        return []
+    rows = selection['rows']
+    contractor_name = selection['contractor_name']
+    planned_date = selection['planned_date']
+    has_actual = selection['has_actual']
+    amount = selection['amount']
+    sed_records = selection['sed_records']
+    
+    # Разница в целых днях (с округлением вниз), как у timedelta.days
+    days_overdue = ((selection['reference_ns'][rows] - selection['planned_ns'][rows]) // np.timedelta64(1, 'D')).astype(np.int64)
+    category = np.where(has_actual[rows], 'поставленные просрочки', 'просрочено не поставлено')
+    
+    orders, contractor_names, group_codes, first_rows = _group_rows(selection)
+    clock.lap('grouping')
+    
+    # Рассчитываем пени для всех позиций сразу
+    days_list = days_overdue.tolist()
+    amounts = amount[rows].tolist()
+    group_count = len(first_rows)
+    if exact_penalty:
+        exact_penalties = calculate_penalties_exact(amounts, days_list)
+        exact_totals = [Decimal('0.00')] * group_count
+        for group, penalty in zip(group_codes.tolist(), exact_penalties):
+            exact_totals[group] += penalty
+        penalties = [float(penalty) for penalty in exact_penalties]
+        total_penalty = [float(total) for total in exact_totals]
+    else:
+        penalty_values = calculate_penalties(amount[rows], days_overdue)
+        penalties = penalty_values.tolist()
+        total_penalty = np.bincount(group_codes, weights=penalty_values, minlength=group_count).tolist()
+    
+    total_amount = np.bincount(group_codes, weights=amount[rows], minlength=group_count).tolist()
+    total_positions = np.bincount(group_codes, minlength=group_count).tolist()
+    clock.lap('penalties')
+    
+    planned_strings = planned_date.iloc[rows[first_rows]].dt.strftime('%d.%m.%Y').tolist()
+    letters = []
+    for group, first in enumerate(first_rows.tolist()):
+        clean_contractor, contractor_short_name, contractor_full_form = contractor_names.normalize(
+            contractor_name.iat[rows[first]]
+        )
+        sed_record = sed_records[orders[first]]
+        letters.append({
+            'order_number': orders[first],
+            'contractor_name': clean_contractor,
+            'contractor_short_name': contractor_short_name,
+            'contractor_full_form': contractor_full_form,
+            'be_name': sed_record['be_name'],
+            'reg_number': sed_record['reg_number'],
+            'reg_date': sed_record['reg_date'],
+            'planned_date': planned_strings[group],
+            'total_amount': total_amount[group],
+            'total_penalty': total_penalty[group],
+            'total_positions': total_positions[group],
+            'category': str(category[first]),
+            'positions': []
+        })
+    
+    # Добавляем позиции
+    position_columns = zip(
+        group_codes.tolist(),
+        column(reporting_df, REPORTING_MATERIAL_COL, "").iloc[rows].tolist(),
+        column(reporting_df, REPORTING_MATERIAL_NAME_COL, "").iloc[rows].tolist(),
+        column(reporting_df, REPORTING_QUANTITY_COL, 0).iloc[rows].tolist(),
+        amounts,  # Цена без НДС
+        column(reporting_df, REPORTING_PPZ_COL, "").iloc[rows].tolist(),
+        amounts,
+        days_list,
+        penalties
+    )
+    for group, material, material_name, order_quantity, price_without_vat, ppz, position_amount, days, penalty in position_columns:
+        letters[group]['positions'].append({
+            'material': material,
+            'material_name': material_name,
+            'order_quantity': order_quantity,
+            'price_without_vat': price_without_vat,
+            'ppz': ppz,
+            'amount': position_amount,
+            'days_overdue': days,
+            'penalty': penalty
+        })
+    clock.lap('letters')
+    
+    return letters
+
+def forecast_reporting_data(reporting_path, sed_path, dates, stats=None, parse_cache=None, consolidate=False,
+                            with_positions=False, input_hashes=None):
+    """Прогноз начисленных пени по файлам отчетности и СЭД на ряд дат (см. forecast_selected_frames)"""
+    try:
+        if stats is None:
+            stats = {}
+        reporting_df, sed_df = read_input_frames(reporting_path, sed_path, stats, parse_cache, input_hashes)
+        return forecast_selected_frames(
+            reporting_df, sed_df, dates, consolidate=consolidate, with_positions=with_positions, stats=stats
+        )
         
     except Exception as e:
-        raise Exception(f"Ошибка при обработке файлов: {str(e)}")
+        raise Exception(f"Ошибка при расчете прогноза пени: {str(e)}")
 
-def generate_letter_document(letter_data, output_path):
-    """Генерация документа письма"""
+def forecast_selected_frames(reporting_df, sed_df, dates, consolidate=False, with_positions=False, stats=None):
+    """Прогноз начисленных пени на ряд будущих дат за один проход по таблицам
+    
+    На каждую дату просрочка определяется так же, как при формировании писем на эту дату:
+    у поставленных позиций срок фиксирован, у непоставленных растет вместе с датой,
+    а еще не просроченные на дату позиции дают ноль. Письма - все, что будут просрочены
+    к последней дате, сгруппированные как в process_selected_frames (consolidate - по поставщику и БЕ).
+    
+    Возвращает словарь: dates - даты прогноза по возрастанию, letters - сводки писем,
+    penalties - матрица пени письма × даты, totals и positions_overdue - итоги по датам;
+    при with_positions=True также positions - колонки позиций (letter_index - индекс письма в letters)
+    и матрица пени позиции × даты.
+    """
+    if stats is None:
+        stats = {}
+    clock = StageClock(stats)
+    dates = pd.DatetimeIndex(pd.to_datetime(list(dates))).normalize().unique().sort_values()
+    if len(dates) == 0:
+        raise ValueError("Не указаны даты прогноза")
+    
+    result = {
+        'dates': [date.strftime('%Y-%m-%d') for date in dates],
+        'letters': [],
+        'penalties': [],
+        'totals': [0.0] * len(dates),
+        'positions_overdue': [0] * len(dates)
+    }
+    if with_positions:
+        result['positions'] = {'letter_index': [], 'order_number': [], 'material': [], 'amount': [], 'penalties': []}
+    
+    # Отбираем строки один раз - на последнюю дату, к которой просрочено больше всего позиций
+    selection = _select_overdue_rows(reporting_df, sed_df, dates[-1], stats, clock)
+    if selection is None:
+        return result
+    rows = selection['rows']
+    orders, contractor_names, group_codes, first_rows = _group_rows(selection, consolidate)
+    clock.lap('grouping')
+    
+    # Дни просрочки на каждую дату: даты идут с шагом в целые сутки, поэтому срок непоставленной
+    # позиции на дату - срок на первую дату плюс смещение даты
+    day = np.timedelta64(1, 'D')
+    dates_ns = dates.to_numpy(dtype='datetime64[ns]')
+    planned_ns = selection['planned_ns'][rows]
+    offsets = ((dates_ns - dates_ns[0]) // day).astype(np.int64)
+    first_days = ((dates_ns[0] - planned_ns) // day).astype(np.int64)
+    fixed_days = ((selection['reference_ns'][rows] - planned_ns) // day).astype(np.int64)
+    days = np.where(
+        selection['has_actual'][rows][:, None], fixed_days[:, None], first_days[:, None] + offsets[None, :]
+    )
+    np.maximum(days, 0, out=days)
+    
+    # Множители пени считаются один раз на каждый срок, матрица позиций - выборкой из таблицы
+    amounts = selection['amount'][rows]
+    penalties = amounts[:, None] * penalty_factors(days.max())[days]
+    
+    # Суммы по письмам: строки сортируются по группам и складываются отрезками
+    group_count = len(first_rows)
+    order = np.argsort(group_codes, kind='stable')
+    starts = np.searchsorted(group_codes[order], np.arange(group_count))
+    letter_penalties = np.add.reduceat(penalties[order], starts, axis=0)
+    clock.lap('penalties')
+    
+    sed_records = selection['sed_records']
+    total_amount = np.bincount(group_codes, weights=amounts, minlength=group_count).tolist()
+    total_positions = np.bincount(group_codes, minlength=group_count).tolist()
+    group_orders = [[] for _ in range(group_count)]
+    for group, order_number in zip(group_codes.tolist(), orders):
+        group_orders[group].append(order_number)
+    
+    contractor_name = selection['contractor_name']
+    for group, first in enumerate(first_rows.tolist()):
+        clean_contractor, contractor_short_name, _ = contractor_names.normalize(contractor_name.iat[rows[first]])
+        result['letters'].append({
+            'order_number': _join_unique(group_orders[group]) if consolidate else orders[first],
+            'contractor_name': clean_contractor,
+            'contractor_short_name': contractor_short_name,
+            'be_name': sed_records[orders[first]]['be_name'],
+            'total_amount': total_amount[group],
+            'total_positions': total_positions[group]
+        })
+    result['penalties'] = np.round(letter_penalties, 2).tolist()
+    result['totals'] = np.round(penalties.sum(axis=0), 2).tolist()
+    result['positions_overdue'] = np.count_nonzero(days, axis=0).tolist()
+    
+    if with_positions:
+        result['positions'] = {
+            'letter_index': group_codes.tolist(),
+            'order_number': orders,
+            'material': column(reporting_df, REPORTING_MATERIAL_COL, "").iloc[rows].tolist(),
+            'amount': amounts.tolist(),
+            'penalties': np.round(penalties, 2).tolist()
+        }
+    clock.lap('letters')
+    
+    return result
+
+def _join_unique(values):
+    return ', '.join(dict.fromkeys(str(value) for value in values if value not in (None, '')))
+
+def _join_contracts(orders):
+    """Номера и даты договоров заказов для текста «договор № {reg_number} от {reg_date}»
+
+    Для нескольких договоров дата каждого, кроме последнего, указывается в номере:
+    «№ ДП-1 от 01.02.2024, ДП-2 от 05.03.2024».
+    """
+    contracts = list(dict.fromkeys(
+        (order['reg_number'], order['reg_date']) for order in orders if order['reg_number'] or order['reg_date']
+    ))
+    if not contracts:
+        return "", ""
+    numbers = [f"{number} от {date}" for number, date in contracts[:-1]] + [contracts[-1][0]]
+    return ', '.join(numbers), contracts[-1][1]
+
+# Категория сводного письма, в которое вошли и поставленные с просрочкой, и непоставленные позиции
+MIXED_CATEGORY = 'частично поставленные просрочки'
+
+# Состояние товаров в месте поставки по категории письма
+DELIVERY_STATUS = {
+    'поставленные просрочки': 'поступили с просрочкой',
+    'просрочено не поставлено': 'отсутствуют',
+    MIXED_CATEGORY: 'частично поступили с просрочкой, частично отсутствуют',
+}
+
+def is_consolidated(letter_data):
+    """Сводное письмо по нескольким заказам поставщика"""
+    return 'orders' in letter_data
+
+def consolidate_letters(letters):
+    """Сводные письма: одно на поставщика и БЕ вместо письма на каждый заказ
+    
+    Письма заказов объединяются за один проход в порядке первого появления поставщика.
+    Суммы и количество позиций складываются, номера заказов и договоров перечисляются,
+    срок поставки - самый ранний. Позиции получают номер своего заказа, а в orders
+    сохраняются итоги по каждому заказу. Категория берется по всем заказам поставщика:
+    если среди них есть и поставленные с просрочкой, и непоставленные, письмо получает MIXED_CATEGORY.
+    """
+    groups = {}
+    for letter in letters:
+        key = (letter['contractor_name'], letter['be_name'])
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = {
+                **{name: value for name, value in letter.items() if name != 'positions'},
+                'total_amount': 0.0,
+                'total_penalty': 0.0,
+                'total_positions': 0,
+                'orders': [],
+                'positions': []
+            }
+        group['orders'].append({
+            'order_number': letter['order_number'],
+            'reg_number': letter['reg_number'],
+            'reg_date': letter['reg_date'],
+            'planned_date': letter['planned_date'],
+            'category': letter['category'],
+            'total_amount': letter['total_amount'],
+            'total_penalty': letter['total_penalty'],
+            'total_positions': letter['total_positions']
+        })
+        group['total_amount'] += letter['total_amount']
+        group['total_penalty'] += letter['total_penalty']
+        group['total_positions'] += letter['total_positions']
+        order_number = letter['order_number']
+        group['positions'].extend({**position, 'order_number': order_number} for position in letter['positions'])
+    
+    for group in groups.values():
+        orders = group['orders']
+        group['order_number'] = _join_unique(order['order_number'] for order in orders)
+        group['reg_number'], group['reg_date'] = _join_contracts(orders)
+        group['planned_date'] = min(
+            (order['planned_date'] for order in orders), key=lambda date: datetime.strptime(date, '%d.%m.%Y')
+        )
+        categories = {order['category'] for order in orders}
+        group['category'] = categories.pop() if len(categories) == 1 else MIXED_CATEGORY
+    return list(groups.values())
+
+# Поля письма, которые меняются от письма к письму
+LETTER_FIELDS = [
+    'be_name', 'contractor_full_form', 'contractor_name', 'contractor_short_name', 'reg_number', 'reg_date',
+    'order_number', 'planned_date', 'total_amount', 'today', 'total_positions', 'delivery_status',
+    'total_penalty', 'positions_count'
+]
+
+LOGO_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'static', 'logo.png')
+
+_letter_template = None
+
+def letter_fields(letter_data, as_of_date=None):
+    """Значения полей письма в том виде, в котором они попадают в документ"""
+    if as_of_date is None:
+        as_of_date = datetime.now()
+    total_amount = f"{letter_data['total_amount']:.2f} ({format_amount_in_words(letter_data['total_amount'])})"
+    return {
+        'be_name': letter_data['be_name'],
+        'contractor_full_form': letter_data['contractor_full_form'],
+        'contractor_name': letter_data['contractor_name'],
+        'contractor_short_name': letter_data['contractor_short_name'],
+        'reg_number': letter_data['reg_number'],
+        'reg_date': letter_data['reg_date'],
+        'order_number': letter_data['order_number'],
+        'planned_date': letter_data['planned_date'],
+        'total_amount': total_amount,
+        'today': as_of_date.strftime('%d.%m.%Y'),
+        'total_positions': letter_data['total_positions'],
+        'delivery_status': DELIVERY_STATUS[letter_data['category']],
+        'total_penalty': f"{letter_data['total_penalty']:.2f} ({format_amount_in_words(letter_data['total_penalty'])})",
+        'positions_count': len(letter_data['positions'])
+    }
+
+def build_letter_document(fields):
+    """Сборка документа письма по значениям полей"""
+    doc = Document()
+    
+    # Добавляем логотип в верхний колонтитул
+    section = doc.sections[0]
+    header = section.header
+    paragraph = header.paragraphs[0]
+    run = paragraph.add_run()
     try:
-        doc = Document()
-        
-        # Добавляем логотип в верхний колонтитул
-        section = doc.sections[0]
-        header = section.header
-        paragraph = header.paragraphs[0]
-        run = paragraph.add_run()
-        # Предполагаем, что логотип находится в папке static
-        # В реальном проекте нужно будет указать путь к логотипу
-        try:
-            run.add_picture(os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'static', 'logo.png'), width=Inches(1.0))
-        except Exception as e:
-            print(f"Не удалось добавить логотип: {e}")
-        
-        # Заголовок (Номер и Кас) - слева
-        header_paragraph = doc.add_paragraph()
-        header_paragraph.alignment = WD_ALIGN_PARAGRAPH.LEFT
-        header_paragraph.add_run(f"№ ____________\nКас.: Претензионная работа по договору поставки")
-        
-        # Обращение - по центру и жирным
-        salutation = doc.add_paragraph()
-        salutation.alignment = WD_ALIGN_PARAGRAPH.CENTER
-        salutation_run = salutation.add_run("Уважаемый партнер!")
-        salutation_run.bold = True
-        
-        # Основной текст письма с жирным выделением сумм и количества
-        main_text_parts = [
-            f"Настоящим сообщаем, что между «{letter_data['be_name']}» и {letter_data['contractor_full_form']} «{letter_data['contractor_name']}» (далее – «{letter_data['contractor_short_name']}») заключен договор поставки № {letter_data['reg_number']} от {letter_data['reg_date']} (далее – Договор поставки). В соответствии с Договором поставки сторонами подписана Спецификация № ",
-            letter_data['order_number'],
-            f" от 03.03.2025 (далее – спецификация), согласно которой «{letter_data['contractor_short_name']}» обязуется в срок до {letter_data['planned_date']} поставить товары на сумму ",
-            f"{letter_data['total_amount']:.2f} ({format_amount_in_words(letter_data['total_amount'])})",
-            f", а «{letter_data['be_name']}» - оплатить указанные товары в течение 30 (тридцати) календарных дней с момента их передачи (Приложение № 1 к настоящему письму).\n\nПо состоянию на {datetime.now().strftime('%d.%m.%Y')} товары в количестве ",
-            str(letter_data['total_positions']),
-            f" позиций на ",
-            f"{letter_data['total_amount']:.2f} ({format_amount_in_words(letter_data['total_amount'])})",
-            f" в месте поставки {'отсутствуют' if letter_data['category'] == 'просрочено не поставлено' else 'поступили с просрочкой'}, что является нарушением п. 4.1 Договора поставки. На основании п. 8.3. Договора поставки сумма пени на текущий момент по просроченным позициям составляет ",
-            f"{letter_data['total_penalty']:.2f} ({format_amount_in_words(letter_data['total_penalty'])})",
-            " и рассчитывается следующим образом:\n\n0,1 (Ноль целых и одна десятая) % стоимости непоставленного в срок товара, или товара, в отношении которого не выполнены требования, предъявленные Покупателем в соответствии с пунктами 7.5. и 7.10.5. договора, за каждый день просрочки в течение первых двух недель, а в случае дальнейшей просрочки - в размере 0,5 (Ноль целых и пять десятых) % стоимости такого товара за каждый день просрочки.\n\n",
-            f"Обращаем Ваше внимание на то, что в настоящее время имеется перечень критичных для «{letter_data['be_name']}» позиций товара (Приложение № 2 к настоящему письму), поставка которых должна быть осуществлена до {letter_data['planned_date']}, при этом, риски срыва сроков поставки являются недопустимыми.\n\nУчитывая изложенное, убедительно просим Вас ускорить исполнение обязательств, принятых по Договору поставки, в части своевременной отгрузки товаров и поставки товара в целях недопущения увеличения суммы пени по позициям товара согласно Приложению № 1 к настоящему письму и минимизации рисков образования пени по позициям товаров согласно приложению № 2 к письму."
-        ]
-        
-        # Добавляем основной текст с жирным выделением
-        main_paragraph = doc.add_paragraph()
-        bold_indices = [1, 3, 5, 7, 9]  # Индексы элементов, которые нужно выделить жирным
-        
-        for i, part in enumerate(main_text_parts):
-            run = main_paragraph.add_run(part)
-            if i in bold_indices:
-                run.bold = True
-        
-        # Приложения
-        doc.add_paragraph("\nПриложения по тексту:")
-        doc.add_paragraph(f"1) Спецификация № {letter_data['reg_number']} от {letter_data['reg_date']} (на 6 л. в 1 экз.);")
-        doc.add_paragraph(f"2) Спецификация № {letter_data['order_number']} от {datetime.now().strftime('%d.%m.%Y')} (на {len(letter_data['positions'])} л. в 1 экз.)")
-        
-        # Подпись
-        signature = doc.add_paragraph("\n\nС уважением,")
-        signature.add_run("\n\n[_____________________] [_____________]")
-        signature.add_run("\n[_________________________] (подпись) (Ф.И.О. уполномоченного")
-        signature.add_run("\n(наименование должности уполномоченного м.п. лица УК/УО на подписание")
-        signature.add_run("\nлица УК/УО] )")
-        
-        # Исполнитель
-        doc.add_paragraph("\n\nИсп. [______________________________________]")
-        doc.add_paragraph("(Ф.И.О. Отв. Исполнителя УК/УО)")
-        doc.add_paragraph("Контактный т.[_______________________________]")
-        doc.add_paragraph("(контактный номер телефона Отв. Исполнителя УК/УО)")
-        
-        # Сохраняем документ
-        doc.save(output_path)
+        run.add_picture(LOGO_PATH, width=Inches(1.0))
+    except Exception as e:
+        logger.warning("Не удалось добавить логотип: %s", e)
+    
+    # Заголовок (Номер и Кас) - слева
+    header_paragraph = doc.add_paragraph()
+    header_paragraph.alignment = WD_ALIGN_PARAGRAPH.LEFT
+    header_paragraph.add_run(f"№ ____________\nКас.: Претензионная работа по договору поставки")
+    
+    # Обращение - по центру и жирным
+    salutation = doc.add_paragraph()
+    salutation.alignment = WD_ALIGN_PARAGRAPH.CENTER
+    salutation_run = salutation.add_run("Уважаемый партнер!")
+    salutation_run.bold = True
+    
+    # Основной текст письма с жирным выделением сумм и количества
+    main_text_parts = [
+        f"Настоящим сообщаем, что между «{fields['be_name']}» и {fields['contractor_full_form']} «{fields['contractor_name']}» (далее – «{fields['contractor_short_name']}») заключен договор поставки № {fields['reg_number']} от {fields['reg_date']} (далее – Договор поставки). В соответствии с Договором поставки сторонами подписана Спецификация № ",
+        fields['order_number'],
+        f" от 03.03.2025 (далее – спецификация), согласно которой «{fields['contractor_short_name']}» обязуется в срок до {fields['planned_date']} поставить товары на сумму ",
+        fields['total_amount'],
+        f", а «{fields['be_name']}» - оплатить указанные товары в течение 30 (тридцати) календарных дней с момента их передачи (Приложение № 1 к настоящему письму).\n\nПо состоянию на {fields['today']} товары в количестве ",
+        str(fields['total_positions']),
+        f" позиций на ",
+        fields['total_amount'],
+        f" в месте поставки {fields['delivery_status']}, что является нарушением п. 4.1 Договора поставки. На основании п. 8.3. Договора поставки сумма пени на текущий момент по просроченным позициям составляет ",
+        fields['total_penalty'],
+        " и рассчитывается следующим образом:\n\n0,1 (Ноль целых и одна десятая) % стоимости непоставленного в срок товара, или товара, в отношении которого не выполнены требования, предъявленные Покупателем в соответствии с пунктами 7.5. и 7.10.5. договора, за каждый день просрочки в течение первых двух недель, а в случае дальнейшей просрочки - в размере 0,5 (Ноль целых и пять десятых) % стоимости такого товара за каждый день просрочки.\n\n",
+        f"Обращаем Ваше внимание на то, что в настоящее время имеется перечень критичных для «{fields['be_name']}» позиций товара (Приложение № 2 к настоящему письму), поставка которых должна быть осуществлена до {fields['planned_date']}, при этом, риски срыва сроков поставки являются недопустимыми.\n\nУчитывая изложенное, убедительно просим Вас ускорить исполнение обязательств, принятых по Договору поставки, в части своевременной отгрузки товаров и поставки товара в целях недопущения увеличения суммы пени по позициям товара согласно Приложению № 1 к настоящему письму и минимизации рисков образования пени по позициям товаров согласно приложению № 2 к письму."
+    ]
+    
+    # Добавляем основной текст с жирным выделением
+    main_paragraph = doc.add_paragraph()
+    bold_indices = [1, 3, 5, 7, 9]  # Индексы элементов, которые нужно выделить жирным
+    
+    for i, part in enumerate(main_text_parts):
+        run = main_paragraph.add_run(part)
+        if i in bold_indices:
+            run.bold = True
+    
+    # Приложения
+    doc.add_paragraph("\nПриложения по тексту:")
+    doc.add_paragraph(f"1) Спецификация № {fields['reg_number']} от {fields['reg_date']} (на 6 л. в 1 экз.);")
+    doc.add_paragraph(f"2) Спецификация № {fields['order_number']} от {fields['today']} (на {fields['positions_count']} л. в 1 экз.)")
+    
+    # Подпись
+    signature = doc.add_paragraph("\n\nС уважением,")
+    signature.add_run("\n\n[_____________________] [_____________]")
+    signature.add_run("\n[_________________________] (подпись) (Ф.И.О. уполномоченного")
+    signature.add_run("\n(наименование должности уполномоченного м.п. лица УК/УО на подписание")
+    signature.add_run("\nлица УК/УО] )")
+    
+    # Исполнитель
+    doc.add_paragraph("\n\nИсп. [______________________________________]")
+    doc.add_paragraph("(Ф.И.О. Отв. Исполнителя УК/УО)")
+    doc.add_paragraph("Контактный т.[_______________________________]")
+    doc.add_paragraph("(контактный номер телефона Отв. Исполнителя УК/УО)")
+    
+    return doc
+
+def get_letter_template():
+    """Шаблон письма: статичная часть собирается один раз на процесс"""
+    global _letter_template
+    if _letter_template is None:
+        _letter_template = DocxTemplate(build_letter_document({field: placeholder(field) for field in LETTER_FIELDS}))
+    return _letter_template
+
+def generate_letter_document(letter_data, output_path, as_of_date=None):
+    """Генерация документа письма; as_of_date - дата, на которую составлено письмо"""
+    try:
+        # В готовый шаблон подставляются только поля письма
+        get_letter_template().save(output_path, letter_fields(letter_data, as_of_date))
         
         return True
         
     except Exception as e:
         raise Exception(f"Ошибка при генерации документа: {str(e)}")
 
-def generate_appendix_document(letter_data, output_path):
-    """Генерация приложения к письму"""
+APPENDIX_COLUMNS = [
+    'Материал', 'Наименование материала', 'Количество заказа', 'Цена без НДС', 'Сумма без НДС', 'ППЗ', 'Дни просрочки'
+]
+APPENDIX_FIELDS = ['order_number', 'total_positions', 'total_amount']
+APPENDIX_ROW_FIELDS = [
+    'material', 'material_name', 'order_quantity', 'price_without_vat', 'amount', 'ppz', 'days_overdue'
+]
+APPENDIX_ATTACHMENT_FIELD = 'attachment_name'
+# В приложении сводного письма у каждой позиции указывается ее заказ
+APPENDIX_ORDER_COLUMN = 'Номер заказа'
+APPENDIX_ORDER_FIELD = 'position_order_number'
+
+_appendix_templates = {}
+
+def appendix_fields(letter_data):
+    """Значения полей шапки приложения"""
+    return {
+        'order_number': letter_data['order_number'],
+        'total_positions': letter_data['total_positions'],
+        'total_amount': f"{letter_data['total_amount']:.2f} ({format_amount_in_words(letter_data['total_amount'])})"
+    }
+
+def appendix_columns(consolidated=False):
+    return [APPENDIX_ORDER_COLUMN] + APPENDIX_COLUMNS if consolidated else APPENDIX_COLUMNS
+
+def appendix_row_fields(consolidated=False):
+    return [APPENDIX_ORDER_FIELD] + APPENDIX_ROW_FIELDS if consolidated else APPENDIX_ROW_FIELDS
+
+def appendix_rows(positions, consolidated=False):
+    """Строки таблицы приложения в порядке appendix_columns(consolidated)"""
+    for position in positions:
+        row = (
+            str(position['material']),
+            str(position['material_name']),
+            str(position['order_quantity']),
+            f"{position['price_without_vat']:.2f}",
+            f"{position['amount']:.2f}",
+            str(position['ppz']),
+            str(position['days_overdue'])
+        )
+        yield (str(position['order_number']),) + row if consolidated else row
+
+def build_appendix_document(fields, row_fields=None, attachment_name=None, consolidated=False):
+    """Сборка документа приложения: с шаблонной строкой таблицы или ссылкой на XLSX-файл"""
+    doc = Document()
+    columns = appendix_columns(consolidated)
+    
+    # Заголовок приложения
+    doc.add_heading(f'Приложение № 1 к письму', 0)
+    if consolidated:
+        doc.add_heading(f'Спецификация по заказам № {fields["order_number"]}', 1)
+    else:
+        doc.add_heading(f'Спецификация по заказу № {fields["order_number"]}', 1)
+    
+    # Шапка с жирным выделением
+    header_info = doc.add_paragraph()
+    header_info.add_run("Номера заказов: " if consolidated else "Номер заказа: ")
+    run_order = header_info.add_run(str(fields['order_number']))
+    run_order.bold = True
+    header_info.add_run(f"\nКоличество просроченных позиций: ")
+    run_positions = header_info.add_run(str(fields['total_positions']))
+    run_positions.bold = True
+    header_info.add_run(f"\nНа сумму: ")
+    run_amount = header_info.add_run(fields['total_amount'])
+    run_amount.bold = True
+    
+    if attachment_name is not None:
+        # Большой перечень позиций вынесен в отдельный файл
+        doc.add_paragraph(f"Перечень позиций приведен в файле {attachment_name}")
+        return doc
+    
+    # Таблица с позициями
+    table = doc.add_table(rows=1, cols=len(columns))
+    table.style = 'Table Grid'
+    
+    # Заголовки таблицы
+    hdr_cells = table.rows[0].cells
+    for cell, title in zip(hdr_cells, columns):
+        cell.text = title
+    
+    # Строка-образец, которая повторяется для каждой позиции
+    if row_fields is not None:
+        row_cells = table.add_row().cells
+        for cell, field in zip(row_cells, row_fields):
+            cell.text = field
+    
+    return doc
+
+def get_appendix_template(with_attachment=False, consolidated=False):
+    """Шаблон приложения: с таблицей позиций или со ссылкой на XLSX-файл, для письма по заказу или сводного"""
+    key = (with_attachment, consolidated)
+    template = _appendix_templates.get(key)
+    if template is None:
+        fields = {field: placeholder(field) for field in APPENDIX_FIELDS}
+        if with_attachment:
+            document = build_appendix_document(
+                fields, attachment_name=placeholder(APPENDIX_ATTACHMENT_FIELD), consolidated=consolidated
+            )
+            template = DocxTemplate(document)
+        else:
+            row_fields = appendix_row_fields(consolidated)
+            document = build_appendix_document(
+                fields, row_fields=[placeholder(field) for field in row_fields], consolidated=consolidated
+            )
+            template = DocxTemplate(document, row_fields=row_fields)
+        _appendix_templates[key] = template
+    return template
+
+def generate_appendix_document(letter_data, output_path, attachment_name=None):
+    """Генерация приложения к письму
+    
+    Строки таблицы выводятся сразу в XML документа. Если передан attachment_name,
+    таблица не выводится, а в приложении указывается файл с перечнем позиций.
+    """
     try:
-        doc = Document()
-        
-        # Заголовок приложения
-        doc.add_heading(f'Приложение № 1 к письму', 0)
-        doc.add_heading(f'Спецификация по заказу № {letter_data["order_number"]}', 1)
-        
-        # Шапка с жирным выделением
-        header_info = doc.add_paragraph()
-        header_info.add_run(f"Номер заказа: ")
-        run_order = header_info.add_run(letter_data['order_number'])
-        run_order.bold = True
-        header_info.add_run(f"\nКоличество просроченных позиций: ")
-        run_positions = header_info.add_run(str(letter_data['total_positions']))
-        run_positions.bold = True
-        header_info.add_run(f"\nНа сумму: ")
-        run_amount = header_info.add_run(f"{letter_data['total_amount']:.2f} ({format_amount_in_words(letter_data['total_amount'])})")
-        run_amount.bold = True
+        fields = appendix_fields(letter_data)
+        consolidated = is_consolidated(letter_data)
+        if attachment_name is not None:
+            fields[APPENDIX_ATTACHMENT_FIELD] = attachment_name
+            get_appendix_template(with_attachment=True, consolidated=consolidated).save(output_path, fields)
+        else:
+            get_appendix_template(consolidated=consolidated).save(
+                output_path, fields, appendix_rows(letter_data['positions'], consolidated)
+            )
         
-        # Таблица с позициями
-        table = doc.add_table(rows=1, cols=7)
-        table.style = 'Table Grid'
+        return True
         
-        # Заголовки таблицы
-        hdr_cells = table.rows[0].cells
-        hdr_cells[0].text = 'Материал'
-        hdr_cells[1].text = 'Наименование материала'
-        hdr_cells[2].text = 'Количество заказа'
-        hdr_cells[3].text = 'Цена без НДС'
-        hdr_cells[4].text = 'Сумма без НДС'
-        hdr_cells[5].text = 'ППЗ'
-        hdr_cells[6].text = 'Дни просрочки'
-
-        # Добавляем строки с данными
+    except Exception as e:
+        raise Exception(f"Ошибка при генерации приложения: {str(e)}")
+
+# Сколько строк приложения выводится в HTML-просмотре
+PREVIEW_MAX_ROWS = 500
+
+_preview_templates = {}
+
+def get_preview_templates():
+    """HTML-шаблоны письма и приложения: собираются из тех же документов, что и .docx"""
+    if not _preview_templates:
+        _preview_templates['letter'] = HtmlTemplate(
+            build_letter_document({field: placeholder(field) for field in LETTER_FIELDS})
+        )
+        for consolidated in (False, True):
+            row_fields = appendix_row_fields(consolidated)
+            _preview_templates[('appendix', consolidated)] = HtmlTemplate(
+                build_appendix_document(
+                    {field: placeholder(field) for field in APPENDIX_FIELDS},
+                    row_fields=[placeholder(field) for field in row_fields],
+                    consolidated=consolidated
+                ),
+                row_fields=row_fields
+            )
+    return _preview_templates
+
+def render_letter_preview(letter_data, as_of_date=None):
+    """HTML-фрагмент письма и приложения для просмотра без скачивания .docx"""
+    templates = get_preview_templates()
+    positions = letter_data['positions']
+    consolidated = is_consolidated(letter_data)
+    appendix_html = templates[('appendix', consolidated)].render(
+        appendix_fields(letter_data), islice(appendix_rows(positions, consolidated), PREVIEW_MAX_ROWS)
+    )
+    if len(positions) > PREVIEW_MAX_ROWS:
+        appendix_html += f"<p>Показаны первые {PREVIEW_MAX_ROWS} из {len(positions)} позиций</p>"
+    return (
+        '<div class="letter-preview-document">'
+        + templates['letter'].render(letter_fields(letter_data, as_of_date))
+        + '</div><div class="letter-preview-document">'
+        + appendix_html
+        + '</div>'
+    )
+
+def generate_appendix_xlsx(letter_data, output_path):
+    """Перечень позиций приложения в XLSX (потоковая запись)"""
+    try:
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet(title='Позиции')
+        consolidated = is_consolidated(letter_data)
+        sheet.append(appendix_columns(consolidated))
         for position in letter_data['positions']:
-            row_cells = table.add_row().cells
-            row_cells[0].text = str(position['material'])
-            row_cells[1].text = str(position['material_name'])
-            row_cells[2].text = str(position['order_quantity'])
-            row_cells[3].text = f"{position['price_without_vat']:.2f}"
-            row_cells[4].text = f"{position['amount']:.2f}"
-            row_cells[5].text = str(position['ppz'])
-            row_cells[6].text = str(position['days_overdue'])
-        
-        # Сохраняем документ
-        doc.save(output_path)
+            row = [
+                position['material'],
+                position['material_name'],
+                position['order_quantity'],
+                round(position['price_without_vat'], 2),
+                round(position['amount'], 2),
+                position['ppz'],
+                position['days_overdue']
+            ]
+            if consolidated:
+                row.insert(0, position['order_number'])
+            sheet.append([None if pd.isna(value) else value for value in row])
+        workbook.save(output_path)
         
         return True
         
     except Exception as e:
-        raise Exception(f"Ошибка при генерации приложения: {str(e)}")
-
+        raise Exception(f"Ошибка при генерации XLSX-приложения: {str(e)}")
@@ -0,0 +1,120 @@
+import json
+import os
+from datetime import datetime
+
+import numpy as np
+
+SUMMARIES_FILENAME = 'letters.ndjson'
+POSITIONS_FILENAME = 'positions.ndjson'
+INDEX_FILENAME = 'letters.idx.npy'
+META_FILENAME = 'letters.meta.json'
+
+
+def _dumps(value):
+    return json.dumps(value, ensure_ascii=False, default=str)
+
+
+def letter_summary(number, letter_data, files=None, error=None, fingerprint=None):
+    """Краткая запись письма без позиций"""
+    summary = {key: value for key, value in letter_data.items() if key != 'positions'}
+    summary['number'] = number
+    summary['files'] = files or []
+    if fingerprint is not None:
+        summary['fingerprint'] = fingerprint
+    if error is not None:
+        summary['error'] = error
+    return summary
+
+
+def write_letter_store(folder, letters_data, files_by_letter, render_errors=(), fingerprints=None, as_of_date=None):
+    """Сохраняет результат обработки рядом с письмами
+
+    Сводки пишутся в NDJSON по строке на письмо, позиции - отдельным NDJSON,
+    а смещения строк обоих файлов - в индекс, чтобы читать одно письмо или страницу без разбора остальных.
+    """
+    errors = {error['letter_number']: error['error'] for error in render_errors}
+    # Строка 0 - смещения сводок, строка 1 - смещения позиций
+    offsets = np.empty((2, len(letters_data) + 1), dtype=np.int64)
+    with open(os.path.join(folder, SUMMARIES_FILENAME), 'wb') as summaries, \
+            open(os.path.join(folder, POSITIONS_FILENAME), 'wb') as positions:
+        for i, letter_data in enumerate(letters_data):
+            number = i + 1
+            fingerprint = fingerprints[i] if fingerprints is not None else None
+            summary = letter_summary(number, letter_data, files_by_letter.get(i), errors.get(number), fingerprint)
+            offsets[0, i] = summaries.tell()
+            summaries.write((_dumps(summary) + '\n').encode('utf-8'))
+            offsets[1, i] = positions.tell()
+            positions.write((_dumps(letter_data['positions']) + '\n').encode('utf-8'))
+        offsets[:, len(letters_data)] = summaries.tell(), positions.tell()
+    np.save(os.path.join(folder, INDEX_FILENAME), offsets)
+    with open(os.path.join(folder, META_FILENAME), 'w', encoding='utf-8') as f:
+        json.dump({'as_of_date': as_of_date.isoformat() if as_of_date else None}, f)
+
+
+class LetterStore:
+    """Чтение сохраненного результата обработки: сводки писем по страницам и позиции по номеру письма"""
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.summaries_path = os.path.join(folder, SUMMARIES_FILENAME)
+        self.positions_path = os.path.join(folder, POSITIONS_FILENAME)
+        self.index_path = os.path.join(folder, INDEX_FILENAME)
+        self.meta_path = os.path.join(folder, META_FILENAME)
+
+    def exists(self):
+        return os.path.isfile(self.summaries_path) and os.path.isfile(self.index_path)
+
+    def _offsets(self):
+        return np.load(self.index_path, mmap_mode='r')
+
+    def count(self):
+        return self._offsets().shape[1] - 1
+
+    def as_of_date(self):
+        """Дата, на которую составлены письма, или None"""
+        try:
+            with open(self.meta_path, encoding='utf-8') as f:
+                value = json.load(f).get('as_of_date')
+        except (FileNotFoundError, ValueError):
+            return None
+        return datetime.fromisoformat(value) if value else None
+
+    @staticmethod
+    def _read_range(path, start, end):
+        with open(path, 'rb') as f:
+            f.seek(start)
+            return f.read(end - start)
+
+    def iter_lines(self, offset=0, limit=None, chunk_size=1024 * 1024):
+        """Сводки писем offset..offset+limit в NDJSON: куски файла как есть, без повторного кодирования"""
+        offsets = self._offsets()[0]
+        count = len(offsets) - 1
+        offset = min(offset, count)
+        stop = count if limit is None else min(offset + limit, count)
+        start, end = int(offsets[offset]), int(offsets[stop])
+        with open(self.summaries_path, 'rb') as f:
+            f.seek(start)
+            while start < end:
+                chunk = f.read(min(chunk_size, end - start))
+                if not chunk:
+                    break
+                start += len(chunk)
+                yield chunk
+
+    def summaries(self, offset=0, limit=None):
+        data = b''.join(self.iter_lines(offset, limit))
+        return [json.loads(line) for line in data.splitlines()]
+
+    def summary(self, number):
+        """Сводка письма с номером number (с 1) или None"""
+        offsets = self._offsets()[0]
+        if not 1 <= number < len(offsets):
+            return None
+        return json.loads(self._read_range(self.summaries_path, int(offsets[number - 1]), int(offsets[number])))
+
+    def positions(self, number):
+        """Позиции письма с номером number (с 1) или None"""
+        offsets = self._offsets()[1]
+        if not 1 <= number < len(offsets):
+            return None
+        return json.loads(self._read_range(self.positions_path, int(offsets[number - 1]), int(offsets[number])))
@@ -0,0 +1,134 @@
+import math
+import os
+import threading
+import time
+
+# Интервал замеров RSS во время запуска, секунды
+RSS_SAMPLE_INTERVAL = 0.1
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+class StageClock:
+    """Последовательные замеры этапов: lap(name) добавляет к этапу время с предыдущей отметки
+
+    Секунды накапливаются в stats['stage_seconds'], если stats передан.
+    """
+
+    def __init__(self, stats=None):
+        self.stages = stats.setdefault('stage_seconds', {}) if stats is not None else {}
+        self._last = time.perf_counter()
+
+    def lap(self, name):
+        now = time.perf_counter()
+        self.stages[name] = self.stages.get(name, 0.0) + now - self._last
+        self._last = now
+
+
+def _process_rss(pid='self'):
+    try:
+        with open(f'/proc/{pid}/statm') as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _child_pids():
+    """Дочерние процессы (пул генерации документов) по /proc/self/task/*/children"""
+    pids = []
+    try:
+        for task in os.listdir('/proc/self/task'):
+            try:
+                with open(f'/proc/self/task/{task}/children') as f:
+                    pids.extend(f.read().split())
+            except OSError:
+                continue
+    except OSError:
+        pass
+    return pids
+
+
+def current_rss_bytes():
+    """Текущий RSS процесса вместе с дочерними процессами генерации или None, если нет /proc"""
+    own = _process_rss()
+    if own is None:
+        return None
+    return own + sum(rss for rss in map(_process_rss, _child_pids()) if rss)
+
+
+class RssSampler:
+    """Пиковый RSS за время одного запуска
+
+    В отличие от ru_maxrss, который хранит максимум за всю жизнь процесса и в долго работающем
+    сервере после первого большого запуска не меняется, RSS замеряется в фоновом потоке
+    каждые interval секунд между start() и stop(). В значение входит и память других
+    запросов, выполняющихся в том же процессе одновременно с запуском.
+    """
+
+    def __init__(self, interval=RSS_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.peak_bytes = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        rss = current_rss_bytes()
+        if rss is not None and (self.peak_bytes is None or rss > self.peak_bytes):
+            self.peak_bytes = rss
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def start(self):
+        self._sample()
+        if self.peak_bytes is not None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """Останавливает замеры и возвращает пиковый RSS в байтах (None, если замерить нельзя)"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self._sample()
+        return self.peak_bytes
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def _format_value(value):
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return 'NaN'
+    if isinstance(value, float):
+        return repr(value)
+    return str(int(value))
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (
+        (name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in labels.items()
+    )
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+def format_prometheus(metrics):
+    """Текстовый формат Prometheus
+
+    metrics - список (имя, тип, описание, [(метки, значение), ...]).
+    """
+    lines = []
+    for name, metric_type, description, samples in metrics:
+        lines.append(f"# HELP {name} {description}")
+        lines.append(f"# TYPE {name} {metric_type}")
+        for labels, value in samples:
+            lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+    return '\n'.join(lines) + '\n'
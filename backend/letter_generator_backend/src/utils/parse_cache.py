@@ -0,0 +1,112 @@
+import hashlib
+import json
+import os
+import secrets
+import shutil
+
+import numpy as np
+import pandas as pd
+
+META_FILENAME = 'meta.json'
+HASH_CHUNK_SIZE = 1024 * 1024
+# Версия формата: меняется при изменении набора колонок или способа их хранения
+CACHE_FORMAT_VERSION = 3
+# Индекс таблицы (номера строк листа) хранится рядом с колонками
+INDEX_FILENAME = 'index.npy'
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(HASH_CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ParseCache:
+    """Кэш прочитанных колонок Excel-файлов по хешу содержимого
+
+    Каждая колонка хранится в отдельном .npy-файле. Время последнего обращения
+    отмечается через mtime записи, при превышении max_bytes удаляются самые давние записи.
+    """
+
+    def __init__(self, root, max_bytes):
+        self.root = root
+        self.max_bytes = max_bytes
+        os.makedirs(root, exist_ok=True)
+
+    def _entry_path(self, kind, sha256):
+        return os.path.join(self.root, f"{kind}-v{CACHE_FORMAT_VERSION}-{sha256}")
+
+    def load(self, kind, sha256):
+        """Таблица из кэша или None, если записи нет"""
+        entry_path = self._entry_path(kind, sha256)
+        try:
+            with open(os.path.join(entry_path, META_FILENAME), encoding='utf-8') as f:
+                meta = json.load(f)
+            columns = {
+                position: np.load(os.path.join(entry_path, f"{position}.npy"), allow_pickle=True)
+                for position in meta['columns']
+            }
+            index = pd.Index(np.load(os.path.join(entry_path, INDEX_FILENAME)))
+            os.utime(entry_path)
+        except (FileNotFoundError, ValueError, OSError):
+            return None
+        return pd.DataFrame(columns, columns=meta['columns'], index=index)
+
+    def store(self, kind, sha256, df):
+        """Сохраняет колонки таблицы; запись появляется атомарно"""
+        entry_path = self._entry_path(kind, sha256)
+        temp_path = f"{entry_path}.{secrets.token_hex(4)}.tmp"
+        os.makedirs(temp_path)
+        try:
+            for position in df.columns:
+                values = df[position].to_numpy()
+                np.save(os.path.join(temp_path, f"{position}.npy"), values, allow_pickle=values.dtype == object)
+            np.save(os.path.join(temp_path, INDEX_FILENAME), df.index.to_numpy(dtype=np.int64))
+            with open(os.path.join(temp_path, META_FILENAME), 'w', encoding='utf-8') as f:
+                json.dump({'columns': [int(position) for position in df.columns], 'rows': len(df)}, f)
+            os.replace(temp_path, entry_path)
+        except OSError:
+            # Запись уже сохранил другой процесс
+            shutil.rmtree(temp_path, ignore_errors=True)
+        self.evict()
+
+    def load_or_read(self, kind, path, reader, sha256=None):
+        """Возвращает (таблица, взята ли она из кэша); при промахе читает файл через reader
+
+        sha256 - уже известный хеш содержимого файла (например, из манифеста рабочей папки);
+        если не передан, файл хешируется целиком.
+        """
+        if sha256 is None:
+            sha256 = file_sha256(path)
+        df = self.load(kind, sha256)
+        if df is not None:
+            return df, True
+        df = reader(path)
+        self.store(kind, sha256, df)
+        return df, False
+
+    def evict(self):
+        """Удаляет давно не использованные записи, пока кэш больше max_bytes"""
+        entries = []
+        total = 0
+        for name in os.listdir(self.root):
+            entry_path = os.path.join(self.root, name)
+            if name.endswith('.tmp') or not os.path.isdir(entry_path):
+                continue
+            try:
+                size = sum(entry.stat().st_size for entry in os.scandir(entry_path))
+                entries.append((os.path.getmtime(entry_path), size, entry_path))
+            except FileNotFoundError:
+                continue
+            total += size
+
+        for _, size, entry_path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(entry_path, ignore_errors=True)
+            total -= size
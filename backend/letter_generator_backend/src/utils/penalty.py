@@ -0,0 +1,70 @@
+import math
+from decimal import Decimal, Context, ROUND_HALF_EVEN, ROUND_HALF_UP
+from functools import lru_cache
+
+import numpy as np
+
+# Первые 14 дней - 0.1% в день, далее - 0.5% в день (сложный процент)
+FIRST_PERIOD_DAYS = 14
+FIRST_PERIOD_RATE = 0.001
+SECOND_PERIOD_RATE = 0.005
+
+KOPECK = Decimal('0.01')
+
+_LOG_FIRST_GROWTH = math.log1p(FIRST_PERIOD_RATE)
+_LOG_SECOND_GROWTH = math.log1p(SECOND_PERIOD_RATE)
+_DECIMAL_CONTEXT = Context(prec=40, rounding=ROUND_HALF_EVEN)
+_FIRST_GROWTH_EXACT = Decimal(1) + Decimal(str(FIRST_PERIOD_RATE))
+_SECOND_GROWTH_EXACT = Decimal(1) + Decimal(str(SECOND_PERIOD_RATE))
+
+
+def _split_periods(days_overdue):
+    first_period = min(days_overdue, FIRST_PERIOD_DAYS)
+    return first_period, days_overdue - first_period
+
+
+def calculate_penalties(amounts, days_overdue):
+    """Быстрый расчет пени для массивов сумм и дней просрочки (float)"""
+    amounts = np.asarray(amounts, dtype=float)
+    days = np.maximum(np.asarray(days_overdue, dtype=np.int64), 0)
+    first_period = np.minimum(days, FIRST_PERIOD_DAYS)
+    second_period = days - first_period
+
+    # Пени за каждый день увеличивают базу, поэтому итог равен amount * ((1 + r1)^d1 * (1 + r2)^d2 - 1);
+    # expm1 сохраняет точность для малых сроков, когда множитель близок к единице
+    log_growth = first_period * _LOG_FIRST_GROWTH + second_period * _LOG_SECOND_GROWTH
+    return amounts * np.expm1(log_growth)
+
+
+
+def penalty_factors(max_days):
+    """Доли пени от суммы для 0..max_days дней просрочки
+
+    amount * penalty_factors(n)[days] совпадает с calculate_penalties(amount, days); таблица
+    нужна, когда одни и те же сроки считаются многократно (прогноз на ряд дат).
+    """
+    return calculate_penalties(1.0, np.arange(max(int(max_days), 0) + 1))
+
+@lru_cache(maxsize=4096)
+def _growth_factor_exact(days_overdue):
+    first_period, second_period = _split_periods(days_overdue)
+    return _DECIMAL_CONTEXT.multiply(
+        _DECIMAL_CONTEXT.power(_FIRST_GROWTH_EXACT, first_period),
+        _DECIMAL_CONTEXT.power(_SECOND_GROWTH_EXACT, second_period)
+    )
+
+
+def calculate_penalty_exact(amount, days_overdue):
+    """Точный расчет пени в Decimal с округлением до копеек"""
+    days_overdue = int(days_overdue)
+    if days_overdue <= 0:
+        return Decimal('0.00')
+
+    amount = amount if isinstance(amount, Decimal) else Decimal(str(amount))
+    penalty = _DECIMAL_CONTEXT.multiply(amount, _growth_factor_exact(days_overdue) - 1)
+    return penalty.quantize(KOPECK, rounding=ROUND_HALF_UP)
+
+
+def calculate_penalties_exact(amounts, days_overdue):
+    """Точный расчет пени для последовательностей сумм и дней просрочки"""
+    return [calculate_penalty_exact(amount, days) for amount, days in zip(amounts, days_overdue)]
@@ -0,0 +1,89 @@
+import numpy as np
+import pandas as pd
+
+# Причины, по которым строка отчетности не попала в письма; код строки - номер причины в списке (0 - строка принята).
+# Если причин несколько, указывается первая по списку
+REJECTION_REASONS = (
+    'missing_order_number',
+    'missing_contractor',
+    'missing_planned_date',
+    'unparsable_date',
+    'non_positive_amount',
+    'no_sed_match',
+)
+REJECTION_TITLES = {
+    'missing_order_number': 'Нет номера заказа',
+    'missing_contractor': 'Нет наименования поставщика',
+    'missing_planned_date': 'Нет даты поставки по спецификации',
+    'unparsable_date': 'Дата не распознана',
+    'non_positive_amount': 'Сумма не указана или не больше нуля',
+    'no_sed_match': 'Заказ не найден в СЭД',
+}
+REJECTION_CODES = {reason: code for code, reason in enumerate(REJECTION_REASONS, start=1)}
+
+REPORT_COLUMNS = [
+    'Строка', 'Причина', 'Код причины', 'Номер заказа', 'Поставщик',
+    'Дата поставки по спецификации', 'Дата оприходования', 'Сумма без НДС'
+]
+REPORT_FORMATS = ('csv', 'xlsx')
+# Имя отчета в папке с результатом обработки
+REJECTIONS_FILENAME = 'rejections.csv'
+
+
+def rejection_counts(codes):
+    """Количество отброшенных строк по каждой причине"""
+    counts = np.bincount(codes, minlength=len(REJECTION_REASONS) + 1)
+    return {reason: int(counts[code]) for reason, code in REJECTION_CODES.items()}
+
+
+class RejectionReport:
+    """Отброшенные строки отчетности с причинами, собранные за тот же проход, что и письма
+
+    Передается в process_reporting_data; после обработки frame содержит по строке
+    на каждую отброшенную строку исходного файла.
+    """
+
+    def __init__(self):
+        self.frame = pd.DataFrame(columns=REPORT_COLUMNS)
+
+    def __len__(self):
+        return len(self.frame)
+
+    def collect(self, codes, row_numbers, order_number, contractor_name, planned_raw, actual_raw, amount_raw):
+        """Строки с ненулевым кодом причины; колонки берутся только у отброшенных строк
+
+        row_numbers - номера строк листа по позициям таблицы (индекс таблицы из read_reporting_file).
+        """
+        rows = np.flatnonzero(codes)
+        reasons = np.array(('',) + REJECTION_REASONS, dtype=object)[codes[rows]]
+        self.frame = pd.DataFrame({
+            'Строка': np.asarray(row_numbers)[rows],
+            'Причина': [REJECTION_TITLES[reason] for reason in reasons],
+            'Код причины': reasons,
+            'Номер заказа': order_number.iloc[rows].to_numpy(),
+            'Поставщик': contractor_name.iloc[rows].to_numpy(),
+            'Дата поставки по спецификации': planned_raw.iloc[rows].to_numpy(),
+            'Дата оприходования': actual_raw.iloc[rows].to_numpy(),
+            'Сумма без НДС': amount_raw.iloc[rows].to_numpy(),
+        }, columns=REPORT_COLUMNS)
+
+    def counts(self):
+        return {
+            reason: int(count)
+            for reason, count in self.frame['Код причины'].value_counts().reindex(REJECTION_REASONS, fill_value=0).items()
+        }
+
+    def write(self, path):
+        """Запись отчета в CSV или XLSX по расширению файла"""
+        if path.lower().endswith('.xlsx'):
+            self.frame.to_excel(path, index=False, sheet_name='Отброшенные строки')
+        else:
+            # utf-8-sig - чтобы Excel открывал CSV с кириллицей без выбора кодировки
+            self.frame.to_csv(path, index=False, encoding='utf-8-sig', sep=';')
+
+    @classmethod
+    def read(cls, path):
+        """Отчет, ранее записанный в CSV"""
+        report = cls()
+        report.frame = pd.read_csv(path, encoding='utf-8-sig', sep=';', dtype=object, keep_default_na=False)
+        return report
@@ -0,0 +1,97 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from src.utils.letter_generator_utils import (
+    generate_letter_document, generate_appendix_document, generate_appendix_xlsx, is_consolidated
+)
+
+
+def letter_filenames(number, letter_data):
+    """Имена файлов письма и приложения; number - порядковый номер письма с 1"""
+    if is_consolidated(letter_data):
+        # Сводное письмо: вместо перечня заказов - их количество
+        suffix = f"{number}_{letter_data['contractor_short_name']}_заказов_{len(letter_data['orders'])}.docx"
+    else:
+        suffix = f"{number}_{letter_data['contractor_short_name']}_{letter_data['order_number']}.docx"
+    return f"letter_{suffix}", f"appendix_{suffix}"
+
+
+def appendix_xlsx_filename(number, letter_data, xlsx_threshold):
+    """Имя XLSX-файла приложения или None, если перечень позиций остается в DOCX"""
+    if xlsx_threshold and len(letter_data['positions']) > xlsx_threshold:
+        return letter_filenames(number, letter_data)[1][:-len('.docx')] + '.xlsx'
+    return None
+
+
+def letter_output_files(number, letter_data, xlsx_threshold=None):
+    """Имена всех файлов, которые создаются для письма"""
+    files = list(letter_filenames(number, letter_data))
+    xlsx_filename = appendix_xlsx_filename(number, letter_data, xlsx_threshold)
+    if xlsx_filename is not None:
+        files.append(xlsx_filename)
+    return files
+
+
+def _render_letter(task):
+    """Генерация письма и приложения для одного элемента letters_data"""
+    number, letter_data, output_folder, xlsx_threshold, as_of_date = task
+    letter_filename, appendix_filename = letter_filenames(number, letter_data)
+    try:
+        files = [letter_filename, appendix_filename]
+        generate_letter_document(letter_data, os.path.join(output_folder, letter_filename), as_of_date)
+        xlsx_filename = appendix_xlsx_filename(number, letter_data, xlsx_threshold)
+        if xlsx_filename is not None:
+            # Большой перечень позиций выносим в XLSX, а в приложении оставляем ссылку на него
+            generate_appendix_xlsx(letter_data, os.path.join(output_folder, xlsx_filename))
+            generate_appendix_document(letter_data, os.path.join(output_folder, appendix_filename), attachment_name=xlsx_filename)
+            files.append(xlsx_filename)
+        else:
+            generate_appendix_document(letter_data, os.path.join(output_folder, appendix_filename))
+        return number, files, None
+    except Exception as e:
+        return number, [], str(e)
+
+
+def render_letters(letters_data, output_folder, workers=1, xlsx_threshold=None, progress=None,
+                   as_of_date=None, only=None):
+    """Генерация всех писем и приложений, при workers > 1 - в пуле процессов
+
+    Приложения с числом позиций больше xlsx_threshold выводятся в отдельный XLSX-файл.
+    only - индексы писем в letters_data, которые нужно сгенерировать (по умолчанию все);
+    нумерация файлов при этом сохраняется сквозной.
+    progress(rendered, failed) вызывается после каждого письма.
+    Возвращает список сгенерированных файлов в порядке писем и список ошибок по письмам.
+    """
+    indices = range(len(letters_data)) if only is None else sorted(only)
+    tasks = [(i + 1, letters_data[i], output_folder, xlsx_threshold, as_of_date) for i in indices]
+    workers = max(1, min(workers, len(tasks)))
+
+    generated_files = []
+    errors = []
+    rendered = [0]
+
+    def collect(results):
+        for number, files, error in results:
+            if error is None:
+                generated_files.extend(files)
+                rendered[0] += 1
+            else:
+                letter_data = letters_data[number - 1]
+                errors.append({
+                    'letter_number': number,
+                    'order_number': letter_data['order_number'],
+                    'contractor_name': letter_data['contractor_name'],
+                    'error': error
+                })
+            if progress is not None:
+                progress(rendered[0], len(errors))
+
+    if workers == 1:
+        collect(map(_render_letter, tasks))
+    else:
+        # Отдаем письма пачками, чтобы не платить за пересылку каждого отдельно
+        chunksize = max(1, len(tasks) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            collect(executor.map(_render_letter, tasks, chunksize=chunksize))
+
+    return generated_files, errors
@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+
+from src.utils.input_columns import SED_BE_NAME_COL, SED_ORDER_COL, SED_REG_NUMBER_COL, SED_REG_DATE_COL
+
+
+class SedIndex:
+    """Хеш-индекс «номер заказа → первая запись СЭД»
+
+    sed_df - таблица СЭД после select_columns: метки колонок равны их исходным индексам.
+    """
+
+    def __init__(self, sed_df):
+        self.sed_df = sed_df
+        self.positions = {}
+        self.duplicates = []
+        self._records = {}
+
+        if SED_ORDER_COL not in sed_df.columns:
+            return
+
+        order_col = sed_df[SED_ORDER_COL]
+        valid = order_col.notna().to_numpy()
+        repeated = order_col.duplicated(keep='first').to_numpy()
+
+        # Для каждого номера заказа запоминаем только первую строку, как и при поиске по таблице
+        first_positions = np.flatnonzero(valid & ~repeated)
+        self.positions = dict(zip(order_col.to_numpy()[first_positions].tolist(), first_positions.tolist()))
+        self.duplicates = pd.unique(order_col[valid & repeated]).tolist()
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __contains__(self, order_number):
+        return order_number in self.positions
+
+    def get(self, order_number):
+        """Возвращает данные СЭД по номеру заказа или None"""
+        record = self._records.get(order_number)
+        if record is not None:
+            return record
+
+        position = self.positions.get(order_number)
+        if position is None:
+            return None
+
+        record = self._build_record(self.sed_df.iloc[position])
+        self._records[order_number] = record
+        return record
+
+    @staticmethod
+    def _build_record(sed_row):
+        be_name = sed_row.get(SED_BE_NAME_COL, "")
+        reg_number = str(sed_row[SED_REG_NUMBER_COL]) if SED_REG_NUMBER_COL in sed_row.index and pd.notna(sed_row[SED_REG_NUMBER_COL]) else ""
+        reg_date_raw = sed_row.get(SED_REG_DATE_COL)
+        reg_date = pd.to_datetime(reg_date_raw).strftime('%d.%m.%Y') if pd.notna(reg_date_raw) else ""
+        return {
+            'be_name': be_name,
+            'reg_number': reg_number,
+            'reg_date': reg_date
+        }
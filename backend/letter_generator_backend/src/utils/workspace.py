@@ -0,0 +1,341 @@
+import fcntl
+import hashlib
+import json
+import os
+import re
+import secrets
+import shutil
+import time
+from contextlib import contextmanager
+
+from src.utils.parse_cache import file_sha256
+
+WORKSPACE_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+MANIFEST_FILENAME = 'workspace.json'
+# Файл-блокировка обработки: пока задача выполняется, его держит процесс задачи
+JOB_LOCK_FILENAME = '.job.lock'
+HASH_CHUNK_SIZE = 1024 * 1024
+UPLOAD_ROLES = ('reporting', 'sed')
+
+
+class UploadOffsetError(ValueError):
+    """Часть пришла не с того смещения, с которого ожидается продолжение загрузки"""
+
+    def __init__(self, expected):
+        super().__init__(f"Ожидается часть со смещения {expected}")
+        self.expected = expected
+
+
+class UploadChecksumError(ValueError):
+    """Хеш части или всего файла не совпал с переданным клиентом"""
+
+
+@contextmanager
+def _upload_lock(part_path):
+    """Файл загрузки под эксклюзивной блокировкой flock
+
+    Блокировка действует между процессами (несколько воркеров сервера), поэтому части
+    одной загрузки дописываются строго по очереди. Снимается при закрытии файла.
+    """
+    try:
+        f = open(part_path, 'r+b')
+    except FileNotFoundError:
+        raise FileNotFoundError(f"Загрузка не найдена: {os.path.basename(part_path)}") from None
+    with f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        yield f
+
+
+class Workspace:
+    """Рабочая папка сессии: свои загруженные файлы и свои сгенерированные письма
+
+    Загруженные файлы хранятся под именем, равным SHA-256 содержимого, а манифест
+    связывает с ними роли 'reporting' и 'sed'.
+    """
+
+    def __init__(self, root, workspace_id):
+        if not WORKSPACE_ID_PATTERN.match(workspace_id):
+            raise ValueError(f"Некорректный идентификатор рабочей папки: {workspace_id}")
+        self.id = workspace_id
+        self.path = os.path.join(root, workspace_id)
+        self.upload_folder = os.path.join(self.path, 'uploads')
+        self.output_folder = os.path.join(self.path, 'generated_letters')
+
+    @staticmethod
+    def new_id():
+        return secrets.token_hex(16)
+
+    @staticmethod
+    def is_valid_id(workspace_id):
+        return isinstance(workspace_id, str) and WORKSPACE_ID_PATTERN.match(workspace_id) is not None
+
+    def ensure(self):
+        os.makedirs(self.upload_folder, exist_ok=True)
+        os.makedirs(self.output_folder, exist_ok=True)
+        self.touch()
+        return self
+
+    def touch(self):
+        """Отмечает использование рабочей папки, чтобы ее не удалила очистка по TTL"""
+        if os.path.isdir(self.path):
+            os.utime(self.path)
+
+    def read_manifest(self):
+        try:
+            with open(os.path.join(self.path, MANIFEST_FILENAME), encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _write_manifest(self, manifest):
+        manifest_path = os.path.join(self.path, MANIFEST_FILENAME)
+        temp_path = f"{manifest_path}.{secrets.token_hex(4)}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False)
+        os.replace(temp_path, manifest_path)
+
+    def save_upload(self, role, file_storage):
+        """Сохраняет загруженный файл под именем по хешу содержимого"""
+        self.ensure()
+        temp_path = os.path.join(self.upload_folder, f".{role}.{secrets.token_hex(4)}.part")
+
+        digest = hashlib.sha256()
+        with open(temp_path, 'wb') as f:
+            while True:
+                chunk = file_storage.stream.read(HASH_CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                f.write(chunk)
+
+        return self._store_upload(role, temp_path, digest.hexdigest(), file_storage.filename)
+
+    def _store_upload(self, role, temp_path, sha256, filename):
+        """Переносит полностью принятый файл на место и связывает его с ролью в манифесте"""
+        extension = os.path.splitext(filename)[1].lower()
+        stored_name = f"{sha256}{extension}"
+        os.replace(temp_path, os.path.join(self.upload_folder, stored_name))
+
+        manifest = self.read_manifest()
+        manifest[role] = {'sha256': sha256, 'stored_name': stored_name, 'filename': filename}
+        self._write_manifest(manifest)
+        self._remove_unreferenced_uploads(manifest)
+        return manifest[role]
+
+    def _upload_paths(self, upload_id):
+        if not WORKSPACE_ID_PATTERN.match(upload_id):
+            raise ValueError(f"Некорректный идентификатор загрузки: {upload_id}")
+        base = os.path.join(self.upload_folder, f".upload.{upload_id}")
+        return f"{base}.json", f"{base}.part"
+
+    def _write_upload_state(self, state):
+        state_path, _ = self._upload_paths(state['upload_id'])
+        temp_path = f"{state_path}.{secrets.token_hex(4)}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False)
+        os.replace(temp_path, state_path)
+
+    def start_upload(self, role, filename, size, sha256=None):
+        """Начинает загрузку файла по частям; возвращает состояние загрузки
+
+        sha256 - хеш всего файла, если клиент его знает: проверяется по завершении загрузки.
+        """
+        if role not in UPLOAD_ROLES:
+            raise ValueError(f"Неизвестный тип файла: {role}")
+        if size < 0:
+            raise ValueError("Размер файла не может быть отрицательным")
+        self.ensure()
+        state = {
+            'upload_id': secrets.token_hex(16),
+            'role': role,
+            'filename': filename,
+            'size': size,
+            'sha256': sha256.lower() if sha256 else None,
+            'offset': 0,
+            'complete': False
+        }
+        _, part_path = self._upload_paths(state['upload_id'])
+        open(part_path, 'wb').close()
+        self._write_upload_state(state)
+        return state
+
+    def upload_state(self, upload_id):
+        """Состояние загрузки по частям или None"""
+        try:
+            state_path, _ = self._upload_paths(upload_id)
+            with open(state_path, encoding='utf-8') as f:
+                return json.load(f)
+        except (ValueError, FileNotFoundError):
+            return None
+
+    def append_upload_chunk(self, upload_id, offset, stream, chunk_sha256, max_bytes=None):
+        """Дописывает часть файла с позиции offset, читая поток кусками прямо на диск
+
+        Хеш части обязателен: принятыми считаются только проверенные части, при несовпадении
+        хеша, обрыве или превышении размера файл обрезается до прежнего смещения.
+        Возвращает обновленное состояние загрузки.
+        """
+        if not chunk_sha256:
+            raise ValueError("Не указан хеш части")
+        _, part_path = self._upload_paths(upload_id)
+        with _upload_lock(part_path) as f:
+            # Состояние читается под блокировкой: пока ждали, загрузку могли продолжить или завершить
+            state = self.upload_state(upload_id)
+            if state is None:
+                raise FileNotFoundError(f"Загрузка не найдена: {upload_id}")
+            if state['complete'] or offset != state['offset']:
+                raise UploadOffsetError(state['offset'])
+
+            limit = state['size'] - offset
+            if max_bytes is not None:
+                limit = min(limit, max_bytes)
+            digest = hashlib.sha256()
+            written = 0
+            # Непроверенный хвост прерванной части отбрасывается
+            f.truncate(offset)
+            f.seek(offset)
+            try:
+                while True:
+                    chunk = stream.read(HASH_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    written += len(chunk)
+                    if written > limit:
+                        raise ValueError(f"Часть больше допустимого размера: не более {limit} байт")
+                    digest.update(chunk)
+                    f.write(chunk)
+                if digest.hexdigest() != chunk_sha256.lower():
+                    raise UploadChecksumError("Хеш части не совпадает с переданным")
+            except BaseException:
+                f.truncate(offset)
+                raise
+
+            state['offset'] = offset + written
+            self._write_upload_state(state)
+            self.touch()
+            return state
+
+    def finish_upload(self, upload_id):
+        """Завершает полностью принятую загрузку: проверяет хеш файла и связывает его с ролью
+
+        Возвращает (состояние загрузки, запись манифеста).
+        """
+        state_path, part_path = self._upload_paths(upload_id)
+        with _upload_lock(part_path):
+            state = self.upload_state(upload_id)
+            if state is None:
+                raise FileNotFoundError(f"Загрузка не найдена: {upload_id}")
+            if state['offset'] != state['size']:
+                raise UploadOffsetError(state['offset'])
+
+            sha256 = file_sha256(part_path)
+            if state['sha256'] and sha256 != state['sha256']:
+                self._remove_upload(upload_id)
+                raise UploadChecksumError("Хеш загруженного файла не совпадает с переданным")
+            # Файл переносится под блокировкой, а состояние удаляется до ее снятия:
+            # ожидающая часть той же загрузки получит "загрузка не найдена"
+            entry = self._store_upload(state['role'], part_path, sha256, state['filename'])
+            os.remove(state_path)
+        state['complete'] = True
+        return state, entry
+
+    def abort_upload(self, upload_id):
+        """Удаляет незавершенную загрузку; возвращает False, если ее нет"""
+        _, part_path = self._upload_paths(upload_id)
+        try:
+            with _upload_lock(part_path):
+                return self._remove_upload(upload_id)
+        except FileNotFoundError:
+            return self._remove_upload(upload_id)
+
+    def _remove_upload(self, upload_id):
+        state_path, part_path = self._upload_paths(upload_id)
+        existed = os.path.exists(state_path)
+        for path in (state_path, part_path):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        return existed
+
+    def _remove_unreferenced_uploads(self, manifest):
+        referenced = {entry['stored_name'] for entry in manifest.values()}
+        for name in os.listdir(self.upload_folder):
+            if name not in referenced and not name.startswith('.'):
+                os.remove(os.path.join(self.upload_folder, name))
+
+    def input_path(self, role):
+        """Путь к загруженному файлу роли или None"""
+        entry = self.read_manifest().get(role)
+        if entry is None:
+            return None
+        path = os.path.join(self.upload_folder, entry['stored_name'])
+        return path if os.path.exists(path) else None
+
+    def input_hash(self, role):
+        """SHA-256 загруженного файла роли из манифеста или None"""
+        entry = self.read_manifest().get(role)
+        return entry['sha256'] if entry else None
+
+    def _try_job_lock(self):
+        f = open(os.path.join(self.path, JOB_LOCK_FILENAME), 'a+b')
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            f.close()
+            return None
+        return f
+
+    def lock_job(self):
+        """Блокировка обработки в рабочей папке: открытый файл под flock или None, если обработка уже идет
+
+        Файл держит задача до завершения. Блокировка снимается при его закрытии, в том числе
+        при гибели процесса, поэтому по ней же видно, жива ли задача (см. job_active).
+        """
+        self.ensure()
+        return self._try_job_lock()
+
+    def job_active(self):
+        """Выполняется ли сейчас обработка в этой рабочей папке в каком-либо процессе"""
+        if not os.path.isdir(self.path):
+            return False
+        lock = self._try_job_lock()
+        if lock is None:
+            return True
+        lock.close()
+        return False
+
+    def new_output_folder(self, job_id):
+        """Отдельная папка для писем задачи; публикуется через publish_output"""
+        path = os.path.join(self.path, f"generated_{job_id}")
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def publish_output(self, staging_folder):
+        """Заменяет текущие письма рабочей папки результатом задачи"""
+        retired = f"{self.output_folder}.{secrets.token_hex(4)}.old"
+        if os.path.exists(self.output_folder):
+            os.replace(self.output_folder, retired)
+        os.replace(staging_folder, self.output_folder)
+        shutil.rmtree(retired, ignore_errors=True)
+
+
+def cleanup_workspaces(root, ttl_seconds, now=None):
+    """Удаляет рабочие папки, которые не использовались дольше ttl_seconds"""
+    if not os.path.isdir(root):
+        return 0
+    now = time.time() if now is None else now
+    removed = 0
+    for name in os.listdir(root):
+        path = os.path.join(root, name)
+        if not (WORKSPACE_ID_PATTERN.match(name) and os.path.isdir(path)):
+            continue
+        try:
+            expired = now - os.path.getmtime(path) > ttl_seconds
+        except FileNotFoundError:
+            continue
+        if expired:
+            shutil.rmtree(path, ignore_errors=True)
+            removed += 1
+    return removed
+
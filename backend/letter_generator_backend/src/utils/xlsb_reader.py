@@ -0,0 +1,105 @@
+import numpy as np
+import pandas as pd
+from pyxlsb import open_workbook
+
+# Количество строк, которое накапливается перед преобразованием в типизированные массивы
+CHUNK_ROWS = 50_000
+# Начало отсчета дат Excel (система 1900 с учетом несуществующего 29.02.1900)
+EXCEL_EPOCH = np.datetime64('1899-12-30T00:00:00', 'ns')
+NS_PER_SECOND = 10 ** 9
+
+
+def _as_object(array):
+    if np.issubdtype(array.dtype, np.datetime64):
+        # Через pandas, чтобы получить Timestamp, а не целые наносекунды
+        return pd.Series(array).astype(object).to_numpy()
+    return array.astype(object)
+
+
+def _to_object_array(values):
+    """Колонка общего вида: целые числа, сохраненные как float, приводятся к int, как в pandas"""
+    array = np.empty(len(values), dtype=object)
+    for i, value in enumerate(values):
+        if isinstance(value, float) and value.is_integer():
+            value = int(value)
+        array[i] = value
+    return array
+
+
+def _to_float_array(values):
+    return pd.to_numeric(pd.Series(values, dtype=object), errors='coerce').to_numpy(dtype=float)
+
+
+def _to_date_array(values):
+    """Даты: серийные номера Excel переводятся в datetime64, строки остаются для разбора позже"""
+    serials = np.array([value if isinstance(value, (int, float)) and not isinstance(value, bool) else np.nan
+                        for value in values], dtype=float)
+    seconds = np.round(serials * 86400)
+    dates = np.full(len(values), np.datetime64('NaT'), dtype='datetime64[ns]')
+    numeric = ~np.isnan(seconds)
+    dates[numeric] = EXCEL_EPOCH + (seconds[numeric].astype(np.int64) * NS_PER_SECOND).astype('timedelta64[ns]')
+
+    has_text = any(isinstance(value, str) for value in values)
+    if not has_text:
+        return dates
+    mixed = _as_object(dates)
+    for i, value in enumerate(values):
+        if isinstance(value, str):
+            mixed[i] = value
+    return mixed
+
+
+def read_xlsb_columns(path, positions, date_columns=(), float_columns=(), chunk_rows=CHUNK_ROWS):
+    """Потоковое чтение выбранных колонок первого листа .xlsb
+
+    Первая строка листа считается заголовком. Строки накапливаются пачками по chunk_rows
+    и сразу переводятся в компактные массивы: даты - datetime64, числа - float64.
+    Возвращает таблицу, метки колонок которой равны их исходным индексам, а индекс -
+    номера строк листа (с 1, как в Excel): пустые строки не читаются, поэтому номера идут с пропусками.
+    """
+    converters = {}
+    for position in positions:
+        if position in date_columns:
+            converters[position] = _to_date_array
+        elif position in float_columns:
+            converters[position] = _to_float_array
+        else:
+            converters[position] = _to_object_array
+
+    parts = {position: [] for position in positions}
+    buffers = {position: [] for position in positions}
+    row_numbers = []
+
+    def flush(present):
+        for position in present:
+            parts[position].append(converters[position](buffers[position]))
+            buffers[position].clear()
+
+    with open_workbook(path) as workbook:
+        with workbook.get_sheet(1) as sheet:
+            rows = sheet.rows(sparse=True)
+            header = next(rows, None)
+            if header is None:
+                return pd.DataFrame()
+            width = len(header)
+            present = [position for position in positions if position < width]
+
+            buffered = 0
+            for row in rows:
+                row_width = len(row)
+                row_numbers.append(row[0].r + 1)
+                for position in present:
+                    buffers[position].append(row[position].v if position < row_width else None)
+                buffered += 1
+                if buffered >= chunk_rows:
+                    flush(present)
+                    buffered = 0
+            flush(present)
+
+    columns = {}
+    for position in present:
+        chunks = parts[position]
+        if len(chunks) > 1 and len({chunk.dtype for chunk in chunks}) > 1:
+            chunks = [_as_object(chunk) for chunk in chunks]
+        columns[position] = np.concatenate(chunks) if chunks else np.array([], dtype=object)
+    return pd.DataFrame(columns, columns=present, index=pd.Index(np.array(row_numbers, dtype=np.int64)))
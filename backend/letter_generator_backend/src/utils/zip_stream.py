@@ -0,0 +1,50 @@
+import io
+import zipfile
+
+CHUNK_SIZE = 64 * 1024
+
+
+class _ZipStream(io.RawIOBase):
+    """Несмещаемый поток: zipfile пишет в него, а генератор забирает накопленные байты"""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def iter_zip(files, compress_type=zipfile.ZIP_STORED, chunk_size=CHUNK_SIZE):
+    """Отдает ZIP-архив по частям, не создавая файлов на диске
+
+    files - последовательность пар (имя в архиве, путь к файлу). По умолчанию
+    файлы не сжимаются повторно: .docx и .xlsx уже являются ZIP-пакетами.
+    """
+    stream = _ZipStream()
+    with zipfile.ZipFile(stream, 'w', compress_type) as archive:
+        for arcname, path in files:
+            info = zipfile.ZipInfo.from_file(path, arcname)
+            info.compress_type = compress_type
+            with open(path, 'rb') as source, archive.open(info, 'w') as target:
+                while True:
+                    chunk = source.read(chunk_size)
+                    if not chunk:
+                        break
+                    target.write(chunk)
+                    data = stream.drain()
+                    if data:
+                        yield data
+            data = stream.drain()
+            if data:
+                yield data
+    yield stream.drain()
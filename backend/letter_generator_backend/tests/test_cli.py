@@ -0,0 +1,30 @@
+"""Пакетный режим: результат и отчет пишутся в еще не созданные папки"""
+import os
+import sys
+import zipfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+
+from synthetic import make_dataset  # noqa: E402
+from src.cli import EXIT_FAILED, EXIT_OK, main  # noqa: E402
+
+
+def test_zip_and_rejections_into_missing_folders(tmp_path):
+    reporting_path, sed_path = make_dataset(str(tmp_path), orders=5, positions_per_order=2, overdue_ratio=1.0)
+    output = tmp_path / 'out' / 'letters.zip'
+    rejections = tmp_path / 'reports' / 'nested' / 'rejections.csv'
+
+    code = main([reporting_path, sed_path, '-o', str(output), '-w', '1', '--as-of-date', '2026-01-01',
+                 '--rejections', str(rejections), '-q'])
+    assert code == EXIT_OK
+    assert rejections.is_file()
+    with zipfile.ZipFile(output) as archive:
+        assert any(name.endswith('.docx') for name in archive.namelist())
+    # Временная папка с письмами удалена, рядом с архивом ничего не осталось
+    assert os.listdir(output.parent) == ['letters.zip']
+
+
+def test_rejections_path_is_folder(tmp_path):
+    reporting_path, sed_path = make_dataset(str(tmp_path), orders=2, positions_per_order=1)
+    code = main([reporting_path, sed_path, '-o', str(tmp_path / 'out'), '--rejections', str(tmp_path), '-q'])
+    assert code == EXIT_FAILED
@@ -0,0 +1,38 @@
+"""Сводные письма: категория определяется по всем заказам поставщика"""
+from src.utils.letter_generator_utils import MIXED_CATEGORY, consolidate_letters, letter_fields
+
+DELIVERED = 'поставленные просрочки'
+UNDELIVERED = 'просрочено не поставлено'
+
+
+def _letter(order_number, category, contractor='Поставщик'):
+    return {
+        'order_number': str(order_number),
+        'contractor_name': contractor,
+        'contractor_short_name': contractor,
+        'contractor_full_form': 'Общество с ограниченной ответственностью',
+        'be_name': 'БЕ',
+        'reg_number': f'Д-{order_number}',
+        'reg_date': '01.01.2025',
+        'planned_date': '01.02.2025',
+        'total_amount': 100.0,
+        'total_penalty': 1.0,
+        'total_positions': 1,
+        'category': category,
+        'positions': []
+    }
+
+
+def test_mixed_category_when_orders_differ():
+    letters = consolidate_letters([_letter(1, DELIVERED), _letter(2, UNDELIVERED), _letter(3, DELIVERED)])
+    assert len(letters) == 1
+    assert letters[0]['category'] == MIXED_CATEGORY
+    assert letter_fields(letters[0])['delivery_status'] == 'частично поступили с просрочкой, частично отсутствуют'
+
+
+def test_single_category_is_kept():
+    letters = consolidate_letters([
+        _letter(1, UNDELIVERED), _letter(2, UNDELIVERED), _letter(3, DELIVERED, contractor='Другой')
+    ])
+    assert [letter['category'] for letter in letters] == [UNDELIVERED, DELIVERED]
+    assert [letter_fields(letter)['delivery_status'] for letter in letters] == ['отсутствуют', 'поступили с просрочкой']
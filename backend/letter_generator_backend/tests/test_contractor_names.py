@@ -0,0 +1,23 @@
+"""Полная форма организации по названию контрагента"""
+import pytest
+
+from src.utils.contractor_names import DEFAULT_FULL_FORM, ContractorNames, full_form
+
+
+@pytest.mark.parametrize('name, expected', [
+    ('ООО "Ромашка"', 'Обществом с ограниченной ответственностью'),
+    ('Общество с ограниченной ответственностью "Ромашка"', 'Обществом с ограниченной ответственностью'),
+    ('ЗАО "Ромашка"', 'Закрытым акционерным обществом'),
+    ('Закрытое акционерное общество "Ромашка"', 'Закрытым акционерным обществом'),
+    ('АО "Ромашка"', 'Акционерным обществом'),
+    ('Акционерное общество "Ромашка"', 'Акционерным обществом'),
+    ('ИП Иванов', DEFAULT_FULL_FORM),
+])
+def test_full_form(name, expected):
+    assert full_form(name) == expected
+
+
+def test_normalize_strips_code_and_finds_short_name():
+    assert ContractorNames().normalize('1234567890 ЗАО "Ромашка"') == (
+        'ЗАО "Ромашка"', 'Ромашка', 'Закрытым акционерным обществом'
+    )
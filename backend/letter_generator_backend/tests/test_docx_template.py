@@ -0,0 +1,84 @@
+"""Документы из скомпилированных шаблонов совпадают с собранными python-docx напрямую"""
+from datetime import datetime
+
+from docx import Document
+
+from src.utils.letter_generator_utils import (
+    appendix_fields, appendix_rows, build_appendix_document, build_letter_document,
+    generate_appendix_document, generate_letter_document, letter_fields
+)
+
+AS_OF_DATE = datetime(2025, 9, 1)
+# Индексы частей основного текста письма, выделенных жирным, см. build_letter_document
+BOLD_INDICES = [1, 3, 5, 7, 9]
+
+LETTER = {
+    'order_number': '4500000001',
+    'contractor_name': 'ООО "Альфа & Омега <Сервис>"',
+    'contractor_short_name': 'Альфа & Омега <Сервис>',
+    'contractor_full_form': 'Обществом с ограниченной ответственностью',
+    'be_name': 'БЕ "Север"',
+    'reg_number': 'ДП-000001',
+    'reg_date': '10.01.2024',
+    'planned_date': '01.06.2025',
+    'total_amount': 1450.5,
+    'total_penalty': 123.45,
+    'total_positions': 2,
+    'category': 'просрочено не поставлено',
+    'positions': [
+        {'material': 'M00000001', 'material_name': 'Болт М10 <оцинк.>', 'order_quantity': 10,
+         'price_without_vat': 1000.0, 'ppz': 'ППЗ-1', 'amount': 1000.0, 'days_overdue': 92, 'penalty': 100.0},
+        {'material': 'M00000002', 'material_name': 'Гайка & шайба', 'order_quantity': 3,
+         'price_without_vat': 450.5, 'ppz': ' ППЗ-2 ', 'amount': 450.5, 'days_overdue': 20, 'penalty': 23.45},
+    ]
+}
+
+
+def _paragraphs(document):
+    return [
+        (paragraph.style.name, paragraph.alignment, [(run.text, bool(run.bold)) for run in paragraph.runs])
+        for paragraph in document.paragraphs
+    ]
+
+
+def _tables(document):
+    return [
+        (table.style.name if table.style is not None else None, [[cell.text for cell in row.cells] for row in table.rows])
+        for table in document.tables
+    ]
+
+
+def test_letter_matches_python_docx(tmp_path):
+    path = tmp_path / 'letter.docx'
+    generate_letter_document(LETTER, str(path), AS_OF_DATE)
+    rendered = Document(str(path))
+    fields = letter_fields(LETTER, AS_OF_DATE)
+    expected = build_letter_document(fields)
+
+    assert _paragraphs(rendered) == _paragraphs(expected)
+    assert [run.text for run in rendered.sections[0].header.paragraphs[0].runs] == \
+        [run.text for run in expected.sections[0].header.paragraphs[0].runs]
+
+    # Жирным выделены именно подставленные номер заказа, суммы и количество позиций
+    main = next(paragraph for paragraph in rendered.paragraphs if paragraph.text.startswith('Настоящим сообщаем'))
+    bold = [i for i, run in enumerate(main.runs) if run.bold]
+    assert bold == BOLD_INDICES
+    assert [main.runs[i].text for i in bold] == [
+        fields['order_number'], fields['total_amount'], str(fields['total_positions']),
+        fields['total_amount'], fields['total_penalty']
+    ]
+
+
+def test_appendix_matches_python_docx(tmp_path):
+    path = tmp_path / 'appendix.docx'
+    generate_appendix_document(LETTER, str(path))
+    rendered = Document(str(path))
+
+    expected = build_appendix_document(appendix_fields(LETTER))
+    table = expected.tables[0]
+    for row in appendix_rows(LETTER['positions']):
+        for cell, value in zip(table.add_row().cells, row):
+            cell.text = value
+
+    assert _paragraphs(rendered) == _paragraphs(expected)
+    assert _tables(rendered) == _tables(expected)
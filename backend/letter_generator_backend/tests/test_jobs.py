@@ -0,0 +1,90 @@
+"""Фоновые задачи: одна задача на рабочую папку и завершение брошенных задач"""
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+
+from run_benchmarks import create_app  # noqa: E402
+from synthetic import make_dataset  # noqa: E402
+from src.models.job import Job  # noqa: E402
+from src.models.user import db  # noqa: E402
+from src.routes import letter_generator as routes  # noqa: E402
+from src.utils.parse_cache import ParseCache  # noqa: E402
+from src.utils.workspace import Workspace  # noqa: E402
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    app = create_app(str(tmp_path))
+    # Папки берутся из окружения при импорте модуля маршрутов, который мог быть импортирован раньше
+    monkeypatch.setattr(routes, 'WORKSPACES_FOLDER', str(tmp_path / 'workspaces'))
+    monkeypatch.setattr(routes, 'parse_cache', ParseCache(str(tmp_path / 'parse_cache'), 10 ** 9))
+    reporting_path, sed_path = make_dataset(str(tmp_path), orders=5, positions_per_order=2, overdue_ratio=1.0)
+    client = app.test_client()
+    with open(reporting_path, 'rb') as reporting, open(sed_path, 'rb') as sed:
+        response = client.post('/api/letters/upload', data={
+            'reporting_file': (reporting, 'reporting.xlsb'), 'sed_file': (sed, 'sed.xlsx')
+        }, content_type='multipart/form-data')
+    assert response.status_code == 200
+    with client.session_transaction() as session:
+        workspace = Workspace(routes.WORKSPACES_FOLDER, session['workspace_id'])
+    return app, client, workspace
+
+
+def _wait(client, job_id):
+    for _ in range(600):
+        job = client.get(f'/api/letters/jobs/{job_id}').get_json()
+        if job['status'] not in routes.ACTIVE_JOB_STATUSES:
+            return job
+        time.sleep(0.05)
+    raise AssertionError('задача не завершилась')
+
+
+def test_second_job_rejected_while_one_is_active(client):
+    app, client, workspace = client
+    lock = workspace.lock_job()
+    try:
+        assert workspace.job_active()
+        response = client.post('/api/letters/process', json={})
+        assert response.status_code == 409
+    finally:
+        lock.close()
+    assert not workspace.job_active()
+
+    job_id = client.post('/api/letters/process', json={}).get_json()['job_id']
+    assert _wait(client, job_id)['status'] == 'done'
+    # Блокировка снимается сразу после записи итогового статуса
+    for _ in range(100):
+        if not workspace.job_active():
+            break
+        time.sleep(0.01)
+    assert not workspace.job_active()
+    response = client.post('/api/letters/process', json={})
+    assert response.status_code == 202
+    assert _wait(client, response.get_json()['job_id'])['status'] == 'done'
+
+
+def test_abandoned_running_job_is_failed(client):
+    app, client, workspace = client
+    with app.app_context():
+        db.session.add(Job(id='a' * 32, workspace_id=workspace.id, status='running'))
+        db.session.add(Job(id='b' * 32, workspace_id=workspace.id, status='running'))
+        db.session.commit()
+
+    # Пока блокировку держит живой процесс, задача считается выполняющейся
+    lock = workspace.lock_job()
+    try:
+        with app.app_context():
+            assert routes.fail_abandoned_jobs() == 0
+        assert client.get(f"/api/letters/jobs/{'a' * 32}").get_json()['status'] == 'running'
+    finally:
+        lock.close()
+
+    job = client.get(f"/api/letters/jobs/{'a' * 32}").get_json()
+    assert job['status'] == 'failed' and job['error']
+    with app.app_context():
+        assert routes.fail_abandoned_jobs() == 1
+        assert db.session.get(Job, 'b' * 32).status == 'failed'
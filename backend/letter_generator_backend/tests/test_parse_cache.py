@@ -0,0 +1,38 @@
+"""Кэш чтения Excel: известный хеш файла не пересчитывается"""
+import hashlib
+
+import pandas as pd
+
+from src.utils import parse_cache as parse_cache_module
+from src.utils.parse_cache import ParseCache
+
+
+def _reader(path):
+    return pd.DataFrame({5: [4500000001, 4500000002], 15: [100.0, 200.0]}, index=pd.RangeIndex(2, 4))
+
+
+def test_known_hash_skips_file_hashing(tmp_path, monkeypatch):
+    path = tmp_path / 'reporting.xlsb'
+    path.write_bytes(b'reporting')
+    sha256 = hashlib.sha256(b'reporting').hexdigest()
+    cache = ParseCache(str(tmp_path / 'cache'), 10 ** 9)
+
+    def fail(path):
+        raise AssertionError('файл хешируется повторно')
+
+    monkeypatch.setattr(parse_cache_module, 'file_sha256', fail)
+    df, cached = cache.load_or_read('reporting', str(path), _reader, sha256)
+    assert not cached
+    df, cached = cache.load_or_read('reporting', str(path), _reader, sha256)
+    assert cached
+    assert df[15].tolist() == [100.0, 200.0]
+    assert df.index.tolist() == [2, 3]
+
+
+def test_hash_computed_when_unknown(tmp_path):
+    path = tmp_path / 'sed.xlsx'
+    path.write_bytes(b'sed')
+    cache = ParseCache(str(tmp_path / 'cache'), 10 ** 9)
+    cache.load_or_read('sed', str(path), _reader)
+    _, cached = cache.load_or_read('sed', str(path), _reader, hashlib.sha256(b'sed').hexdigest())
+    assert cached
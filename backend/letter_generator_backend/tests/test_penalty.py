@@ -0,0 +1,63 @@
+"""Расчет пени: замкнутая форма и Decimal сверяются с подневным циклом"""
+import random
+from decimal import Decimal
+
+import pytest
+
+from src.utils.penalty import calculate_penalties, calculate_penalties_exact, calculate_penalty_exact
+
+PROPERTY_SAMPLES = 5000
+
+
+def reference_penalty(amount, days_overdue):
+    """Прежний расчет: цикл по каждому дню просрочки"""
+    if days_overdue <= 0:
+        return 0
+
+    penalty = 0
+    current_amount = float(amount)
+    first_period = min(days_overdue, 14)
+    for _ in range(first_period):
+        daily_penalty = current_amount * 0.001
+        penalty += daily_penalty
+        current_amount += daily_penalty
+    for _ in range(days_overdue - first_period):
+        daily_penalty = current_amount * 0.005
+        penalty += daily_penalty
+        current_amount += daily_penalty
+    return penalty
+
+
+@pytest.fixture(scope='module')
+def samples():
+    rng = random.Random(42)
+    amounts = [round(rng.uniform(0.01, 10_000_000), 2) for _ in range(PROPERTY_SAMPLES)]
+    days = [rng.choice([rng.randint(-5, 30), rng.randint(0, 2000)]) for _ in range(PROPERTY_SAMPLES)]
+    return amounts, days
+
+
+def test_float_matches_daily_loop(samples):
+    amounts, days = samples
+    for amount, day, value in zip(amounts, days, calculate_penalties(amounts, days).tolist()):
+        expected = reference_penalty(amount, day)
+        assert abs(value - expected) <= 1e-9 * max(abs(expected), 1.0), (amount, day, value, expected)
+
+
+def test_exact_is_rounded_to_kopecks_and_matches_float(samples):
+    amounts, days = samples
+    for amount, day, exact in zip(amounts, days, calculate_penalties_exact(amounts, days)):
+        assert isinstance(exact, Decimal) and exact == exact.quantize(Decimal('0.01'))
+        # Подневный цикл в float накапливает ошибку округления, поэтому сверяем с допуском в копейку
+        expected = reference_penalty(amount, day)
+        assert abs(float(exact) - expected) <= max(0.01, 1e-9 * abs(expected)), (amount, day, exact, expected)
+
+
+def test_no_penalty_without_overdue():
+    assert calculate_penalty_exact(1000, 0) == Decimal('0.00')
+    assert calculate_penalty_exact(1000, -3) == Decimal('0.00')
+    assert calculate_penalties([1000, 1000], [0, -3]).tolist() == [0.0, 0.0]
+
+
+def test_exact_known_value():
+    # 14 дней по 0.1% и 1 день по 0.5%: 1000 * (1.001^14 * 1.005 - 1) = 19.1582...
+    assert calculate_penalty_exact(Decimal('1000'), 15) == Decimal('19.16')
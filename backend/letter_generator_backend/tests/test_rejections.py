@@ -0,0 +1,76 @@
+"""Отчет об отброшенных строках: причины и номера строк листа"""
+import os
+import sys
+from datetime import datetime
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+
+from synthetic import make_reporting_frame, make_sed_frame, write_reporting_file, write_sed_file  # noqa: E402
+from src.utils.letter_generator_utils import process_reporting_data  # noqa: E402
+from src.utils.parse_cache import ParseCache  # noqa: E402
+from src.utils.rejections import RejectionReport  # noqa: E402
+
+AS_OF_DATE = datetime(2026, 1, 1)
+ORDERS = [4500000000 + i for i in range(4)]
+
+
+@pytest.fixture
+def frames():
+    reporting = make_reporting_frame(ORDERS, positions_per_order=3, overdue_ratio=1.0, seed=1)
+    # К дате AS_OF_DATE просрочены все строки, поэтому каждая испорченная строка отбрасывается
+    reporting.loc[1, 5] = None
+    reporting.loc[4, 16] = None
+    reporting[19] = reporting[19].astype(object)
+    reporting.loc[7, 19] = 'не дата'
+    reporting.loc[9, 15] = 0.0
+    reporting.loc[10, 5] = 4599999999
+    return reporting, make_sed_frame(ORDERS)
+
+
+EXPECTED_REASONS = [
+    'missing_order_number', 'missing_contractor', 'unparsable_date', 'non_positive_amount', 'no_sed_match'
+]
+
+
+def _process(reporting_path, sed_path, parse_cache=None):
+    report = RejectionReport()
+    stats = {}
+    process_reporting_data(
+        reporting_path, sed_path, stats=stats, parse_cache=parse_cache, current_date=AS_OF_DATE, rejections=report
+    )
+    return report, stats
+
+
+def test_xlsb_rows_with_blank_lines(tmp_path, frames):
+    reporting, sed = frames
+    # Между строками данных - пустые строки листа: номера строк идут с пропусками
+    sheet_rows = [1 + 2 * i for i in range(len(reporting))]
+    reporting_path = str(tmp_path / 'reporting.xlsb')
+    sed_path = str(tmp_path / 'sed.xlsx')
+    write_reporting_file(reporting, reporting_path, row_numbers=sheet_rows)
+    write_sed_file(sed, sed_path)
+
+    # В отчете номера строк - как в Excel, с 1
+    expected_rows = [sheet_rows[i] + 1 for i in (1, 4, 7, 9, 10)]
+    cache = ParseCache(str(tmp_path / 'cache'), 10 ** 9)
+    for parse_cache in (None, cache, cache):
+        report, stats = _process(reporting_path, sed_path, parse_cache)
+        assert report.frame['Строка'].tolist() == expected_rows
+        assert report.frame['Код причины'].tolist() == EXPECTED_REASONS
+        assert stats['rows_rejected'] == report.counts()
+    assert stats['parse_cache_hits'] == 2
+
+
+def test_xlsx_rows(tmp_path, frames):
+    reporting, sed = frames
+    reporting_path = str(tmp_path / 'reporting.xlsx')
+    sed_path = str(tmp_path / 'sed.xlsx')
+    reporting.to_excel(reporting_path, index=False)
+    write_sed_file(sed, sed_path)
+
+    report, _ = _process(reporting_path, sed_path)
+    # Первая строка листа - заголовок, строка таблицы i - строка листа i + 2
+    assert report.frame['Строка'].tolist() == [3, 6, 9, 11, 12]
+    assert report.frame['Код причины'].tolist() == EXPECTED_REASONS
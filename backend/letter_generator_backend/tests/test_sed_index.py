@@ -0,0 +1,37 @@
+"""Индекс СЭД: первая запись по номеру заказа, как при поиске по таблице"""
+import pandas as pd
+
+from src.utils.sed_index import SedIndex
+
+
+def _sed_frame():
+    orders = [4500000001, 4500000005, None, 4500000003, 4500000005, 4500000001]
+    sed = pd.DataFrame({i: [None] * len(orders) for i in range(16)})
+    sed[2] = [f"БЕ {i}" for i in range(len(orders))]
+    sed[5] = orders
+    sed[7] = [f"ДП-{i:06d}" if i != 3 else None for i in range(len(orders))]
+    sed[15] = pd.to_datetime(['2024-01-10', '2024-02-10', '2024-03-10', None, '2024-05-10', '2024-06-10'])
+    return sed
+
+
+def test_first_record_wins_for_duplicate_orders():
+    index = SedIndex(_sed_frame())
+    assert len(index) == 3
+    assert index.duplicates == [4500000005, 4500000001]
+    assert index.get(4500000005) == {'be_name': 'БЕ 1', 'reg_number': 'ДП-000001', 'reg_date': '10.02.2024'}
+    assert index.get(4500000001) == {'be_name': 'БЕ 0', 'reg_number': 'ДП-000000', 'reg_date': '10.01.2024'}
+
+
+def test_missing_values_and_unknown_orders():
+    index = SedIndex(_sed_frame())
+    assert index.get(4500000003) == {'be_name': 'БЕ 3', 'reg_number': '', 'reg_date': ''}
+    assert index.get(4500000004) is None
+    assert 4500000004 not in index
+
+
+def test_matches_row_by_row_lookup():
+    sed = _sed_frame()
+    index = SedIndex(sed)
+    for order_number in sed[5].dropna().unique():
+        sed_row = sed[sed.iloc[:, 5] == order_number]
+        assert index.get(order_number)['be_name'] == sed_row.iloc[0, 2]
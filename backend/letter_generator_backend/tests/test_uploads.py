@@ -0,0 +1,66 @@
+"""Загрузка файлов по частям: обязательный хеш части и блокировка между процессами"""
+import hashlib
+import io
+import multiprocessing
+import os
+import time
+
+import pytest
+
+from src.utils.workspace import UploadChecksumError, Workspace, _upload_lock
+
+DATA = os.urandom(10000)
+
+
+def _sha(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+@pytest.fixture
+def workspace(tmp_path):
+    return Workspace(str(tmp_path), Workspace.new_id())
+
+
+def test_chunk_without_hash_is_rejected(workspace):
+    state = workspace.start_upload('reporting', 'rep.xlsb', len(DATA))
+    for chunk_sha256 in (None, ''):
+        with pytest.raises(ValueError):
+            workspace.append_upload_chunk(state['upload_id'], 0, io.BytesIO(DATA), chunk_sha256)
+    assert workspace.upload_state(state['upload_id'])['offset'] == 0
+
+
+def test_chunk_with_wrong_hash_is_truncated(workspace):
+    state = workspace.start_upload('reporting', 'rep.xlsb', len(DATA))
+    upload_id = state['upload_id']
+    workspace.append_upload_chunk(upload_id, 0, io.BytesIO(DATA[:4000]), _sha(DATA[:4000]))
+    with pytest.raises(UploadChecksumError):
+        workspace.append_upload_chunk(upload_id, 4000, io.BytesIO(DATA[4000:]), '00' * 32)
+    _, part_path = workspace._upload_paths(upload_id)
+    assert os.path.getsize(part_path) == 4000
+
+    state = workspace.append_upload_chunk(upload_id, 4000, io.BytesIO(DATA[4000:]), _sha(DATA[4000:]))
+    assert state['offset'] == len(DATA)
+    _, entry = workspace.finish_upload(upload_id)
+    assert entry['sha256'] == _sha(DATA)
+    assert workspace.upload_state(upload_id) is None
+
+
+def _hold_lock(part_path, locked, seconds):
+    with _upload_lock(part_path):
+        locked.set()
+        time.sleep(seconds)
+
+
+def test_lock_is_shared_between_processes(workspace):
+    state = workspace.start_upload('reporting', 'rep.xlsb', len(DATA))
+    _, part_path = workspace._upload_paths(state['upload_id'])
+    locked = multiprocessing.Event()
+    holder = multiprocessing.Process(target=_hold_lock, args=(part_path, locked, 0.5))
+    holder.start()
+    try:
+        assert locked.wait(10)
+        started = time.perf_counter()
+        workspace.append_upload_chunk(state['upload_id'], 0, io.BytesIO(DATA), _sha(DATA))
+        assert time.perf_counter() - started >= 0.3
+    finally:
+        holder.join()
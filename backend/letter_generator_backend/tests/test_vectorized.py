@@ -0,0 +1,165 @@
+"""Векторизованная обработка дает те же письма, что и исходный построчный цикл"""
+import math
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from src.utils.contractor_names import clean_name, full_form, short_name
+from src.utils.letter_generator_utils import process_reporting_frames
+
+CURRENT_DATE = datetime(2025, 9, 1)
+
+
+def _reference_penalty(amount, days_overdue):
+    """Пени по дням, как в исходном calculate_penalty"""
+    penalty = 0
+    current_amount = float(amount)
+    for day in range(max(days_overdue, 0)):
+        daily_penalty = current_amount * (0.001 if day < 14 else 0.005)
+        penalty += daily_penalty
+        current_amount += daily_penalty
+    return penalty
+
+
+def _reference_letters(reporting_df, sed_df, current_date):
+    """Исходный построчный цикл process_reporting_data по уже прочитанным таблицам"""
+    processed_data = {}
+    for _, row in reporting_df.iterrows():
+        order_number = row.iloc[5]
+        contractor_name = row.iloc[16]
+        planned_date = row.iloc[19]
+        actual_date = row.iloc[24]
+        amount = row.iloc[15]
+        if pd.isna(order_number) or pd.isna(planned_date) or pd.isna(contractor_name):
+            continue
+
+        planned_date_dt = pd.to_datetime(planned_date)
+        actual_date_dt = pd.to_datetime(actual_date) if pd.notna(actual_date) else None
+        is_overdue = False
+        days_overdue = 0
+        category = ''
+        if actual_date_dt is None:
+            if current_date > planned_date_dt:
+                is_overdue = True
+                days_overdue = (current_date - planned_date_dt).days
+                category = 'просрочено не поставлено'
+        elif actual_date_dt > planned_date_dt:
+            is_overdue = True
+            days_overdue = (actual_date_dt - planned_date_dt).days
+            category = 'поставленные просрочки'
+        if not (is_overdue and amount > 0):
+            continue
+
+        clean_contractor = clean_name(contractor_name)
+        sed_row = sed_df[sed_df.iloc[:, 5] == order_number]
+        if sed_row.empty:
+            continue
+        reg_date_raw = sed_row.iloc[0, 15]
+        key = f"{clean_contractor}_{order_number}"
+        if key not in processed_data:
+            processed_data[key] = {
+                'order_number': order_number,
+                'contractor_name': clean_contractor,
+                'contractor_short_name': short_name(clean_contractor),
+                'contractor_full_form': full_form(clean_contractor),
+                'be_name': sed_row.iloc[0, 2],
+                'reg_number': str(sed_row.iloc[0, 7]) if pd.notna(sed_row.iloc[0, 7]) else "",
+                'reg_date': pd.to_datetime(reg_date_raw).strftime('%d.%m.%Y') if pd.notna(reg_date_raw) else "",
+                'planned_date': planned_date_dt.strftime('%d.%m.%Y'),
+                'total_amount': 0,
+                'total_penalty': 0,
+                'total_positions': 0,
+                'category': category,
+                'positions': []
+            }
+        penalty = _reference_penalty(amount, days_overdue)
+        letter = processed_data[key]
+        letter['positions'].append({
+            'material': row.iloc[9],
+            'material_name': row.iloc[10],
+            'order_quantity': row.iloc[13],
+            'price_without_vat': row.iloc[15],
+            'ppz': row.iloc[11],
+            'amount': amount,
+            'days_overdue': days_overdue,
+            'penalty': penalty
+        })
+        letter['total_amount'] += amount
+        letter['total_penalty'] += penalty
+        letter['total_positions'] += 1
+    return list(processed_data.values())
+
+
+def _assert_same(expected, actual, path='letters'):
+    if isinstance(expected, dict):
+        assert isinstance(actual, dict) and expected.keys() == actual.keys(), path
+        for key in expected:
+            _assert_same(expected[key], actual[key], f"{path}.{key}")
+    elif isinstance(expected, list):
+        assert isinstance(actual, list) and len(expected) == len(actual), path
+        for i, (left, right) in enumerate(zip(expected, actual)):
+            _assert_same(left, right, f"{path}[{i}]")
+    elif isinstance(expected, (float, np.floating)) or isinstance(actual, (float, np.floating)):
+        assert math.isclose(expected, actual, rel_tol=1e-9, abs_tol=1e-9), f"{path}: {expected} != {actual}"
+    else:
+        assert expected == actual, f"{path}: {expected!r} != {actual!r}"
+
+
+def _frames():
+    """Отчетность и СЭД со всеми случаями, которые различает отбор просрочек"""
+    rows = [
+        # заказ, поставщик, сумма, плановая дата, фактическая дата
+        (4500000001, '7700000001 ООО "Альфа"', 1000.0, '2025-06-01', None),          # не поставлено
+        (4500000001, '7700000001 ООО "Альфа"', 250.5, '2025-06-01', '2025-06-20'),   # поставлено с просрочкой
+        (4500000002, '7700000002 АО "Бета"', 0.0, '2025-05-01', None),                # сумма не больше нуля
+        (4500000002, '7700000002 АО "Бета"', -10.0, '2025-05-01', None),
+        (4500000002, '7700000002 АО "Бета"', 0.01, '2025-05-01', None),               # минимальная сумма
+        (4500000003, '7700000003 ЗАО "Гамма"', 500.0, '2025-08-01', '2025-07-30'),    # поставлено в срок
+        (4500000003, '7700000003 ЗАО "Гамма"', 700.0, '2025-10-01', None),            # срок не наступил
+        (4500000004, '7700000004 ООО "Дельта"', 300.0, '2025-07-01', None),           # нет в СЭД
+        (4500000005, '7700000005 ИП Иванов', 900.0, '2025-08-25', '2025-08-31'),      # дубль в СЭД
+        (4500000001, '7700000001 ООО "Альфа"', 1200.0, '2025-02-01', '2025-08-01'),   # заказ повторяется ниже
+        (None, '7700000006 ООО "Эпсилон"', 100.0, '2025-06-01', None),                # нет номера заказа
+        (4500000006, None, 100.0, '2025-06-01', None),                                 # нет поставщика
+        (4500000006, '7700000006 ООО "Эпсилон"', 100.0, None, None),                  # нет плановой даты
+        (4500000001, '7700000009 ООО "Другой"', 400.0, '2025-06-01', None),           # тот же заказ, другой поставщик
+    ]
+    n = len(rows)
+    reporting = pd.DataFrame({i: [None] * n for i in range(25)})
+    reporting[5] = [row[0] for row in rows]
+    reporting[16] = [row[1] for row in rows]
+    reporting[15] = [row[2] for row in rows]
+    reporting[19] = pd.to_datetime([row[3] for row in rows])
+    reporting[24] = pd.to_datetime([row[4] for row in rows])
+    reporting[9] = [f"M{i:08d}" for i in range(n)]
+    reporting[10] = [f"Материал {i}" for i in range(n)]
+    reporting[11] = [f"ППЗ-{i % 3}" for i in range(n)]
+    reporting[13] = list(range(1, n + 1))
+
+    sed_orders = [4500000001, 4500000002, 4500000003, 4500000005, 4500000005, 4500000006]
+    sed = pd.DataFrame({i: [None] * len(sed_orders) for i in range(16)})
+    sed[2] = [f"БЕ {i}" for i in range(len(sed_orders))]
+    sed[5] = sed_orders
+    sed[7] = [f"ДП-{i:06d}" if i != 2 else None for i in range(len(sed_orders))]
+    sed[15] = pd.to_datetime(['2024-01-10', '2024-02-10', None, '2024-04-10', '2024-05-10', '2024-06-10'])
+    return reporting, sed
+
+
+def test_vectorized_letters_match_row_loop():
+    reporting, sed = _frames()
+    expected = _reference_letters(reporting, sed, CURRENT_DATE)
+    actual = process_reporting_frames(reporting, sed, CURRENT_DATE)
+
+    # Кадр покрывает все случаи: заказ Альфы повторяется в разных местах и смешивает категории,
+    # тот же заказ у другого поставщика - отдельное письмо, Дельты нет в СЭД
+    assert [(letter['order_number'], letter['contractor_name'], letter['total_positions']) for letter in expected] == [
+        (4500000001, 'ООО "Альфа"', 3),
+        (4500000002, 'АО "Бета"', 1),
+        (4500000005, 'ИП Иванов', 1),
+        (4500000001, 'ООО "Другой"', 1),
+    ]
+    assert expected[0]['category'] == 'просрочено не поставлено'
+    assert expected[2]['category'] == 'поставленные просрочки'
+    _assert_same(expected, actual)
+